@@ -0,0 +1,210 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+import db
+import matrices as mx
+import schema
+import sketches
+import trip_queries as tq
+
+# --- Partition-parallel aggregation ---
+#   aggregate(group_by=['hour'], metrics=['count', 'mean(fare_amount)'], filters=...)
+# The filtered date range is split into calendar months and each month is
+# aggregated by a worker process over its own read-only connection. Workers
+# return partial aggregates only -- counts, sums, minima/maxima and sparse
+# quantile sketch buckets per group -- which the parent merges, so no raw
+# rows cross process boundaries and a full year scales with the number of
+# cores. Metrics:
+#   count             trips per group
+#   sum(col)          sum of a trip column
+#   mean(col)         mean over non-null values
+#   min(col), max(col)
+#   median(col), p90(col), ...   within sketches.ALPHA relative error
+# Result columns are named count, sum_<col>, mean_<col>, p90_<col>, ...
+# group_by=[] gives one row of overall totals.
+# filters uses trip_queries.make_filters() keys; dates may also be given as
+# 'YYYY-MM-DD' strings.
+
+METRIC_PATTERN = re.compile(r"^(count|sum|mean|min|max|median|p\d{1,2})(?:\((\w+)\))?$")
+GROUP_COLUMNS = ['pickup_date', 'hour', 'weekday', 'day_type', 'passenger_count',
+                 'PULocationID', 'DOLocationID']
+
+
+class Metric:
+    def __init__(self, spec):
+        match = METRIC_PATTERN.match(spec.replace(" ", ""))
+        if not match:
+            raise ValueError(f"Unknown metric {spec!r}")
+        self.func, self.column = match.groups()
+        if (self.func == 'count') != (self.column is None):
+            raise ValueError(f"{spec!r}: count takes no column, every other metric needs one")
+        if self.column is not None and self.column not in schema.TRIP_COLUMNS:
+            raise ValueError(f"{spec!r}: {self.column} is not a trips column")
+        self.name = self.func if self.column is None else f"{self.func}_{self.column}"
+
+    @property
+    def quantile(self):
+        if self.func == 'median':
+            return 0.5
+        return int(self.func[1:]) / 100 if self.func.startswith('p') else None
+
+    def partials(self):
+        # SQL aggregate -> partial column name, merged by summing/min/max
+        if self.func == 'count':
+            return {'n': "COUNT(*)"}
+        c = self.column
+        if self.func == 'sum':
+            return {f"sum__{c}": f"SUM({c})"}
+        if self.func == 'mean':
+            return {f"sum__{c}": f"SUM({c})", f"count__{c}": f"COUNT({c})"}
+        if self.func in ('min', 'max'):
+            return {f"{self.func}__{c}": f"{self.func.upper()}({c})"}
+        return {}
+
+
+# ---------------- Workers ----------------
+def partial_aggregate(db_path, filters, group_by, partials, sketch_columns):
+    # One month: (scalar partials per group, {column: (keys, cells, counts)})
+    where, params = tq.build_where(filters)
+    keys = "".join(f"{c}, " for c in group_by)
+    group_clause = f"GROUP BY {', '.join(group_by)}" if group_by else ""
+    conn = db.connect_readonly(db_path)
+    try:
+        select = ", ".join(f"{sql} AS {name}" for name, sql in partials.items())
+        scalars = pd.read_sql(f"SELECT {keys}{select} FROM trips {where} {group_clause}",
+                              conn, params=params)
+        sketched = {}
+        for column in sketch_columns:
+            rows = pd.read_sql(f"SELECT {keys}{column} FROM trips {where}", conn, params=params)
+            if group_by:
+                grouped = rows.groupby(group_by, dropna=False, sort=False)
+                codes = grouped.ngroup().to_numpy()
+                group_keys = grouped.size().reset_index()[group_by]
+            else:
+                codes = np.zeros(len(rows), dtype='int64')
+                group_keys = pd.DataFrame(index=[0])
+            slots = sketches.quantile_slots(rows[column].to_numpy(dtype='float64'))
+            valid = slots >= 0
+            # Sparse (group, slot) -> count: only occupied buckets travel back
+            cells, counts = np.unique(codes[valid] * sketches.QUANTILE_SLOTS + slots[valid],
+                                      return_counts=True)
+            sketched[column] = (group_keys, cells, counts)
+    finally:
+        conn.close()
+    return scalars, sketched
+
+
+# ---------------- Merging ----------------
+def _merge_scalars(parts, group_by, partials):
+    frame = pd.concat(parts, ignore_index=True)
+    how = {name: ('min' if name.startswith('min__') else
+                  'max' if name.startswith('max__') else 'sum') for name in partials}
+    if not group_by:
+        return pd.DataFrame([{name: frame[name].agg(func) for name, func in how.items()}])
+    return frame.groupby(group_by, dropna=False, sort=True).agg(how).reset_index()
+
+
+def _merge_sketch(parts, group_index, group_by):
+    # Maps each worker's local group codes onto the merged result's rows
+    size = sketches.QUANTILE_SLOTS
+    merged = np.zeros(len(group_index) * size, dtype='int64')
+    if group_by:
+        lookup = pd.Series(np.arange(len(group_index)),
+                           index=pd.MultiIndex.from_frame(group_index[group_by]))
+    for group_keys, cells, counts in parts:
+        if not len(cells):
+            continue
+        if group_by:
+            rows = lookup.reindex(pd.MultiIndex.from_frame(group_keys)).to_numpy()[
+                cells // size]
+        else:
+            rows = np.zeros(len(cells))
+        # Groups with a NULL key do not survive the MultiIndex lookup
+        found = ~np.isnan(rows)
+        merged += np.bincount(rows[found].astype('int64') * size + cells[found] % size,
+                              weights=counts[found], minlength=len(merged)).astype('int64')
+    return merged.reshape(len(group_index), size)
+
+
+def _finish(scalars, metrics, sketched):
+    out = scalars[[c for c in scalars.columns if '__' not in c and c != 'n']].copy()
+    for metric in metrics:
+        c = metric.column
+        if metric.func == 'count':
+            out[metric.name] = scalars['n'].astype('int64')
+        elif metric.func == 'sum':
+            out[metric.name] = scalars[f"sum__{c}"]
+        elif metric.func == 'mean':
+            out[metric.name] = scalars[f"sum__{c}"] / scalars[f"count__{c}"].where(
+                scalars[f"count__{c}"] > 0)
+        elif metric.func in ('min', 'max'):
+            out[metric.name] = scalars[f"{metric.func}__{c}"]
+        else:
+            out[metric.name] = [sketches.quantile(row, metric.quantile) for row in sketched[c]]
+    return out
+
+
+# ---------------- Entry point ----------------
+def filter_date(filters, key):
+    # Callers may pass dates, datetimes/Timestamps or 'YYYY-MM-DD' strings
+    value = filters.get(key)
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"filters[{key!r}] must be a date or a 'YYYY-MM-DD' string, "
+                         f"not {value!r}") from None
+
+
+def month_filters(conn, filters):
+    # The filters split per calendar month of data (domain dates fill gaps)
+    domains = tq.filter_domains(conn)
+    start = max(filter_date(filters, 'start_date') or domains['min_date'], domains['min_date'])
+    end = min(filter_date(filters, 'end_date') or domains['max_date'], domains['max_date'])
+    if start > end:
+        return []
+    return mx.month_segments(dict(filters, start_date=start, end_date=end))
+
+
+def aggregate(group_by, metrics, filters=None, db_path=None, workers=None):
+    # -> DataFrame sorted by group_by with one column per metric
+    group_by = list(group_by)
+    unknown = [c for c in group_by if c not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Cannot group by {unknown}; choose from {GROUP_COLUMNS}")
+    metrics = [Metric(spec) for spec in metrics]
+    partials = {'n': "COUNT(*)"}
+    for metric in metrics:
+        partials.update(metric.partials())
+    sketch_columns = list(dict.fromkeys(m.column for m in metrics if m.quantile is not None))
+
+    db_path = db_path or db.DB_PATH
+    with db.read_connection(db_path) as conn:
+        segments = month_filters(conn, dict(filters or {}))
+    if not segments:
+        # No groups, or the single overall row with a count of zero
+        empty = (pd.DataFrame(columns=group_by + list(partials)) if group_by else
+                 pd.DataFrame([{name: 0 if name == 'n' else np.nan for name in partials}]))
+        return _finish(empty, metrics, {c: np.zeros((len(empty), sketches.QUANTILE_SLOTS))
+                                        for c in sketch_columns})
+
+    workers = min(workers or os.cpu_count() or 1, len(segments))
+    args = [(db_path, segment, group_by, partials, sketch_columns) for segment in segments]
+    if workers == 1:
+        results = [partial_aggregate(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(partial_aggregate, *zip(*args)))
+
+    scalars = _merge_scalars([r[0] for r in results], group_by, partials)
+    sketched = {c: _merge_sketch([r[1][c] for r in results], scalars, group_by)
+                for c in sketch_columns}
+    return _finish(scalars, metrics, sketched)
@@ -1,66 +1,90 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import numpy as np
-import plotly.express as px
+import trip_queries as tq
+import db
+import result_cache as rc
+import trip_store
+import scatter_layer
+import matrices as mx
+from chart_registry import ChartRegistry, lazy_import
+import exports
+import perf
+import schema
+import zones
+import prefetch
 import os
+import json
 
-# Debug prints to help check working directory and files
-st.write("Current working directory:", os.getcwd())
-st.write("DB file exists:", os.path.exists("db/nyc_mobility.db"))
-st.write("Lookup CSV exists:", os.path.exists("data/lookup/taxi_zone_lookup.csv"))
-
-# --- Caching data load for speed ---
-@st.cache_data(show_spinner=True)
-def load_data():
-    db_path = "db/nyc_mobility.db"
-    lookup_path = "data/lookup/taxi_zone_lookup.csv"
-    
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql("SELECT * FROM trips LIMIT 10000", conn)
-    conn.close()
-    
-    try:
-        zone_lookup = pd.read_csv(lookup_path)
-        df = df.merge(
-            zone_lookup[['LocationID', 'Zone']],
-            how='left',
-            left_on='PULocationID',
-            right_on='LocationID'
-        ).rename(columns={'Zone': 'pickup_zone'}).drop(columns=['LocationID'])
-    except Exception as e:
-        st.warning(f"Could not load zone lookup file: {e}")
-        df['pickup_zone'] = df['PULocationID'].astype(str)
-
-    df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
-    df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
-    df['hour'] = df['pickup_datetime'].dt.hour
-    df['trip_duration_mins'] = (
-        df['dropoff_datetime'] - df['pickup_datetime']
-    ).dt.total_seconds() / 60
-    df['weekday'] = df['pickup_datetime'].dt.weekday
-    df['day_type'] = df['weekday'].apply(lambda x: 'Weekend' if x >= 5 else 'Weekday')
-    df['fare_per_mile'] = df['fare_amount'] / df['trip_distance'].replace(0, np.nan)
-    df['speed_mph'] = df['trip_distance'] / (df['trip_duration_mins'] / 60).replace(0, np.nan)
-    df['no_tip'] = df['tip_amount'] == 0
-    df['trip_date'] = df['pickup_datetime'].dt.date
-    return df
-
-df = load_data()
+# Plotting modules load when the first chart renders, not before the sidebar
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
 
 st.set_page_config(
     page_title="NYC Taxi Dashboard - Industry Level",
     layout="wide",
     initial_sidebar_state="expanded"
 )
+
+# Timings, SQL and cache counters for this rerun (shown in the Performance panel)
+profile = perf.Profile()
+perf.activate(profile)
+
+# Background warm-ups queued by the previous rerun were for its filters
+for future in st.session_state.pop('warm_futures', []):
+    future.cancel()
+
+# --- Filter domains and the zone dimension are small, so cache them ---
+# Domains are read from dataset_meta (kept current by the loaders), so the
+# sidebar draws without scanning trips
+@st.cache_data(show_spinner=True)
+def load_domains(dataset_version):
+    with db.read_connection() as conn:
+        return tq.filter_domains(conn)
+
+# LocationID-indexed name/borough arrays, read once per process
+@st.cache_resource
+def get_zones():
+    return zones.get()
+
+# --- Aggregate results are shared by every session through one LRU cache ---
+RESULT_CACHE_MB = 256
+
+@st.cache_resource
+def get_result_cache():
+    return rc.ResultCache(RESULT_CACHE_MB * 2**20)
+
+# Raw trip rows (samples, export) come from the store chosen by TRIP_STORE
+@st.cache_resource
+def get_store():
+    return trip_store.open_store()
+
+# Every read goes through the shared pool of read-only connections (db.py)
+with profile.stage('startup'):
+    store = get_store()
+    with db.read_connection() as conn:
+        dataset_version = schema.dataset_version(conn)
+        result_cache = get_result_cache()
+        changed = (None if result_cache.version in (None, dataset_version)
+                   else schema.changed_ranges(conn, result_cache.version))
+    if result_cache.version != dataset_version:
+        exports.prune_exports(dataset_version)
+    # Cached charts for dates an incremental load did not touch stay valid
+    result_cache.sync_version(dataset_version, changed)
+
+    domains = load_domains(dataset_version)
+    zone_dim = get_zones()
+    if not len(zone_dim):
+        st.warning(f"No zone lookup found (zones table or {zones.LOOKUP_PATH}); "
+                   f"zones are shown by LocationID")
+
 st.title("🚕 NYC Yellow Taxi Trips Dashboard")
 
 # ---------------- Sidebar ----------------
 st.sidebar.header("🔍 Filters & Settings")
 
-min_date, max_date = df['trip_date'].min(), df['trip_date'].max()
-zones_all = sorted(df['pickup_zone'].dropna().unique())
-max_passenger_count = int(df['passenger_count'].max())
+min_date, max_date = domains['min_date'], domains['max_date']
+zones_all = sorted(set(zone_dim.name(domains['zone_ids'])))
+max_passenger_count = domains['max_passengers']
 
 if 'date_range' not in st.session_state:
     st.session_state.date_range = (min_date, max_date)
@@ -103,15 +127,58 @@ selected_zones = st.sidebar.multiselect(
 )
 
 # ---------------- Data Filter ----------------
-filtered_df = df[
-    (df['trip_date'] >= filter_start_date) &
-    (df['trip_date'] <= filter_end_date) &
-    (df['hour'].between(hour_range[0], hour_range[1])) &
-    (df['passenger_count'] >= min_passengers) &
-    (df['pickup_zone'].isin(selected_zones))
-].copy()
-
-st.markdown(f"### Data Overview: Showing {len(filtered_df):,} trips after filtering")
+# All zones selected means no zone predicate, so the query stays a range scan
+zone_ids = None
+if set(selected_zones) != set(zones_all):
+    zone_ids = zone_dim.ids_named(selected_zones, domains['zone_ids'])
+
+filters = tq.make_filters(filter_start_date, filter_end_date, hour_range,
+                          min_passengers, zone_ids)
+# Queries still running for this session's previous filters are interrupted,
+# and so are prefetches of states the user did not pick
+request = prefetch.Request(filters)
+previous_request = prefetch.supersede(st.session_state, request)
+profile.mark('sidebar_ready')
+
+def active_request():
+    # This rerun's request, or a neighbouring state being prefetched
+    return prefetch.current() or request
+
+def query(compute, *args):
+    # Charts compute on pool threads, each on a pooled connection of its own
+    active = active_request()
+    with active.connection() as conn:
+        return compute(conn, active.filters, *args)
+
+def cached(name, compute, *args):
+    # Cached results are shared across sessions and must not be modified
+    active = active_request()
+    foreground = active is request
+    def miss():
+        if foreground:
+            profile.count('cache_misses')
+        return query(compute, *args)
+    if foreground:
+        profile.count('cache_lookups')
+    return result_cache.get_or_compute(name, [active.filters, list(args)], miss)
+
+def matrix(kind):
+    # Cached month by month inside matrices.build
+    return query(mx.build, kind, result_cache)
+
+def scatter_data(x, y):
+    # Exact points, a random sample or a density raster, by matching trip count
+    active = active_request()
+    n_rows = cached('kpis', tq.kpis).total_trips
+    scans = store.using(active.connection)
+    return result_cache.get_or_compute(
+        'scatter', [active.filters, x, y],
+        lambda: scatter_layer.scatter_data(scans, active.filters, x, y, n_rows))
+
+with profile.stage('kpis'):
+    kpi = cached('kpis', tq.kpis)
+
+st.markdown(f"### Data Overview: Showing {kpi.total_trips:,} trips after filtering")
 
 # ---------------- Key Metrics ----------------
 col1, col2, col3, col4, col5, col6, col7 = st.columns(7, gap="large")
@@ -119,21 +186,15 @@ col1, col2, col3, col4, col5, col6, col7 = st.columns(7, gap="large")
 fmt_money   = lambda x: f"${x:,.2f}".rjust(12)
 fmt_percent = lambda x: f"{x:.2f}%".rjust(8)
 fmt_number  = lambda x: f"{x:,}".rjust(10)
+fmt_decimal = lambda x: f"{x:,.2f}".rjust(10)
 
-col1.markdown(f"**Total Trips**\n\n`{fmt_number(len(filtered_df))}`")
-col2.markdown(f"**Median Fare ($)**\n\n`{fmt_money(filtered_df['fare_amount'].median())}`")
-col3.markdown(f"**Total Revenue ($)**\n\n`{fmt_money(filtered_df['total_amount'].sum())}`")
-col4.markdown(f"**Total Tips ($)**\n\n`{fmt_money(filtered_df['tip_amount'].sum())}`")
-
-avg_tip_pct = ((filtered_df['tip_amount'] / filtered_df['fare_amount'])
-               .replace([np.inf, -np.inf], 0).fillna(0)*100).mean()
-col5.markdown(f"**Avg Tip %**\n\n`{fmt_percent(avg_tip_pct)}`")
-
-no_tip_pct = filtered_df['no_tip'].mean()*100
-col6.markdown(f"**Trips Without Tip (%)**\n\n`{fmt_percent(no_tip_pct)}`")
-
-avg_speed = filtered_df['speed_mph'].replace([np.inf, -np.inf], np.nan).mean()
-col7.markdown(f"**Avg Speed (mph)**\n\n`{fmt_money(avg_speed)}`")
+col1.markdown(f"**Total Trips**\n\n`{fmt_number(kpi.total_trips)}`")
+col2.markdown(f"**Median Fare ($)**\n\n`{fmt_money(kpi.median_fare)}`")
+col3.markdown(f"**Total Revenue ($)**\n\n`{fmt_money(kpi.total_revenue)}`")
+col4.markdown(f"**Total Tips ($)**\n\n`{fmt_money(kpi.total_tips)}`")
+col5.markdown(f"**Avg Tip %**\n\n`{fmt_percent(kpi.avg_tip_pct)}`")
+col6.markdown(f"**Trips Without Tip (%)**\n\n`{fmt_percent(kpi.no_tip_pct)}`")
+col7.markdown(f"**Avg Speed (mph)**\n\n`{fmt_decimal(kpi.avg_speed)}`")
 
 st.markdown("---")
 
@@ -144,162 +205,327 @@ plotly_config = {
     'doubleClick': 'reset'
 }
 
-# ---------------- Tabs ----------------
-tab1, tab2, tab3 = st.tabs(["📊 Overview", "📍 Insights", "📥 Export"])
-
-# ----- Overview Tab -----
-with tab1:
-    trip_counts_day = filtered_df.groupby('trip_date').size().reset_index(name='trip_count')
-    st.plotly_chart(
-        px.line(trip_counts_day, x='trip_date', y='trip_count',
-                title="Daily Trip Counts Over Time",
-                labels={'trip_date': 'Date', 'trip_count': 'Number of Trips'}),
-        use_container_width=True, config=plotly_config
-    )
-
-    trip_hour_daytype = filtered_df.groupby(['hour', 'day_type']).size().reset_index(name='count')
-    st.plotly_chart(
-        px.bar(trip_hour_daytype, x='hour', y='count', color='day_type',
-               title="Trips by Hour and Day Type",
-               labels={'hour': 'Hour', 'count': 'Trips'}, barmode='stack'),
-        use_container_width=True, config=plotly_config
-    )
-
-    st.plotly_chart(
-        px.box(filtered_df, x='passenger_count', y='fare_amount', points="outliers",
-               title="Fare Amount Distribution by Passenger Count",
-               labels={'passenger_count': 'Passengers', 'fare_amount': 'Fare ($)'}),
-        use_container_width=True, config=plotly_config
-    )
-
-    st.plotly_chart(
-        px.histogram(filtered_df, x='fare_per_mile', nbins=40, marginal="box",
-                     title="Fare per Mile Distribution",
-                     labels={'fare_per_mile': 'Fare per Mile ($/mile)'}),
-        use_container_width=True, config=plotly_config
-    )
-
-    # Revenue by Hour
-    revenue_hour = filtered_df.groupby('hour')['total_amount'].sum().reset_index()
-    st.plotly_chart(
-        px.bar(revenue_hour, x='hour', y='total_amount',
-               title="Total Revenue by Hour",
-               labels={'hour': 'Hour', 'total_amount': 'Revenue ($)'}),
-        use_container_width=True, config=plotly_config
-    )
-
-    # Passenger Count Distribution
-    passenger_counts = filtered_df['passenger_count'].value_counts().sort_index()
-    st.plotly_chart(
-        px.bar(x=passenger_counts.index, y=passenger_counts.values,
-               title="Passenger Count Distribution",
-               labels={'x': 'Passenger Count', 'y': 'Trips'}),
-        use_container_width=True, config=plotly_config
-    )
-
-# ----- Insights Tab -----
-with tab2:
+def zone_labels(ids):
+    # Names are gathered after aggregation: one array read per result row
+    return zone_dim.name(ids)
+
+# LocationID-indexed zone names for the dense matrices
+zone_name_array = zone_dim.names
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def plot(fig):
+    st.plotly_chart(fig, use_container_width=True, config=plotly_config)
+
+def histogram_chart(bins, x_label, title):
+    bins = bins.assign(bin_mid=(bins['bin_start'] + bins['bin_end']) / 2)
+    return px.bar(bins, x='bin_mid', y='count', title=title,
+                  labels={'bin_mid': x_label, 'count': 'count'})
+
+# ---------------- Charts ----------------
+# Declared once here and computed only when their tab or expander is shown
+charts = ChartRegistry(profile)
+
+# ----- Overview -----
+@charts.chart('overview', lambda: cached('daily_counts', tq.daily_counts))
+def daily_counts_chart(trip_counts_day):
+    plot(px.line(trip_counts_day, x='trip_date', y='trip_count',
+                 title="Daily Trip Counts Over Time",
+                 labels={'trip_date': 'Date', 'trip_count': 'Number of Trips'}))
+
+@charts.chart('overview', lambda: cached('hour_daytype_counts', tq.hour_daytype_counts))
+def hour_daytype_chart(trip_hour_daytype):
+    plot(px.bar(trip_hour_daytype, x='hour', y='count', color='day_type',
+                title="Trips by Hour and Day Type",
+                labels={'hour': 'Hour', 'count': 'Trips'}, barmode='stack'))
+
+# Box statistics come precomputed from the fare sketches, not raw points
+@charts.chart('overview',
+              lambda: cached('box_stats', tq.box_stats, 'passenger_count', 'fare_amount'))
+def fare_box_chart(fare_box):
+    fare_box_fig = go.Figure(go.Box(
+        x=fare_box['passenger_count'], q1=fare_box['q1'], median=fare_box['median'],
+        q3=fare_box['q3'], lowerfence=fare_box['lowerfence'],
+        upperfence=fare_box['upperfence'], name='fare_amount'))
+    fare_box_fig.update_layout(title="Fare Amount Distribution by Passenger Count",
+                               xaxis_title='Passengers', yaxis_title='Fare ($)')
+    plot(fare_box_fig)
+
+@charts.chart('overview', lambda: cached('histogram', tq.histogram, tq.FARE_PER_MILE_EXPR, 40))
+def fare_per_mile_chart(bins):
+    plot(histogram_chart(bins, 'Fare per Mile ($/mile)', "Fare per Mile Distribution"))
+
+@charts.chart('overview', lambda: cached('revenue_by_hour', tq.revenue_by_hour))
+def revenue_by_hour_chart(revenue_hour):
+    plot(px.bar(revenue_hour, x='hour', y='total_amount',
+                title="Total Revenue by Hour",
+                labels={'hour': 'Hour', 'total_amount': 'Revenue ($)'}))
+
+@charts.chart('overview', lambda: cached('passenger_counts', tq.passenger_counts))
+def passenger_count_chart(passenger_counts):
+    plot(px.bar(x=passenger_counts['passenger_count'], y=passenger_counts['trips'],
+                title="Passenger Count Distribution",
+                labels={'x': 'Passenger Count', 'y': 'Trips'}))
+
+# ----- Insights -----
+@charts.chart('insights', lambda: cached('top_zones', tq.top_zones, 'PULocationID'))
+def top_pickups_chart(top_pickups):
     st.markdown("### 🏙️ Top 10 Pickup Zones by Trip Count")
-    st.bar_chart(filtered_df['pickup_zone'].value_counts().head(10))
-
-    st.markdown("### 🎯 Top 10 Dropoff Locations by Trip Count")
-    st.bar_chart(filtered_df['DOLocationID'].value_counts().head(10))
-
-    st.markdown("### 📉 Fare vs Distance Scatter (first 1000 trips)")
-    st.plotly_chart(
-        px.scatter(filtered_df.head(1000), x='trip_distance', y='fare_amount',
-                   title="Fare vs Distance",
-                   labels={'trip_distance': 'Distance (miles)', 'fare_amount': 'Fare ($)'},
-                   opacity=0.5),
-        use_container_width=True, config=plotly_config
-    )
-
+    st.bar_chart(pd.Series(top_pickups['trip_count'].values,
+                           index=zone_labels(top_pickups['location_id'])))
+
+# Dropoff totals are the column sums of the origin-destination matrix
+@charts.chart('insights', lambda: matrix('od'))
+def top_dropoffs_chart(od):
+    st.markdown("### 🎯 Top 10 Dropoff Zones by Trip Count")
+    top_dropoffs = od.top(1, 10)
+    st.bar_chart(pd.Series(top_dropoffs.counts.sum(axis=0),
+                           index=zone_name_array[top_dropoffs.labels[1]]))
+
+@charts.chart('insights', lambda: scatter_data('trip_distance', 'fare_amount'),
+              expander="📉 Fare vs Distance Scatter")
+def fare_distance_scatter(data):
+    plot(scatter_layer.scatter_figure(
+        data, 'trip_distance', 'fare_amount', "Fare vs Distance",
+        {'trip_distance': 'Distance (miles)', 'fare_amount': 'Fare ($)'}, 0.5))
+
+@charts.chart('insights', lambda: cached('histogram', tq.histogram, tq.SPEED_EXPR, 50))
+def speed_chart(bins):
     st.markdown("### 🚦 Trip Speed Distribution")
-    st.plotly_chart(
-        px.histogram(filtered_df.replace([np.inf, -np.inf], np.nan), x='speed_mph', nbins=50,
-                     title="Speed Distribution (mph)", labels={'speed_mph': 'Speed (mph)'}),
-        use_container_width=True, config=plotly_config
-    )
+    plot(histogram_chart(bins, 'Speed (mph)', "Speed Distribution (mph)"))
 
+@charts.chart('insights', lambda: matrix('hour_pu'))
+def hour_zone_heatmap(hour_zone):
     st.markdown("### 🔥 Heatmap: Trips by Hour and Pickup Zone")
-    heatmap = filtered_df.groupby(['hour', 'pickup_zone']).size().unstack(fill_value=0)
-    st.plotly_chart(
-        px.imshow(heatmap.T, labels=dict(x="Hour", y="Pickup Zone", color="Trips"),
-                  aspect="auto", title="Trips Heatmap (Hour vs Zone)"),
-        use_container_width=True, config=plotly_config
-    )
-
-    # Tip vs Fare Scatter
-    st.markdown("### 💸 Tip vs Fare")
-    st.plotly_chart(
-        px.scatter(filtered_df, x='fare_amount', y='tip_amount',
-                   title="Tip vs Fare",
-                   labels={'fare_amount': 'Fare ($)', 'tip_amount': 'Tip ($)'},
-                   opacity=0.6),
-        use_container_width=True, config=plotly_config
-    )
-
-    # Duration vs Distance with correlation
-    corr = filtered_df[['trip_duration_mins', 'trip_distance']].corr().iloc[0, 1]
+    hour_zone = hour_zone.nonzero(1)
+    # Zones sharing a name (e.g. the three Governor's Island IDs) are summed
+    heatmap = (hour_zone.to_frame(col_labels=zone_name_array[hour_zone.labels[1]]).T
+               .groupby(level=0).sum())
+    plot(px.imshow(heatmap, labels=dict(x="Hour", y="Pickup Zone", color="Trips"),
+                   aspect="auto", title="Trips Heatmap (Hour vs Zone)"))
+
+@charts.chart('insights', lambda: matrix('od'))
+def od_flow_heatmap(od):
+    st.markdown("### 🔀 Origin-Destination Flows")
+    boroughs = [b for b in zone_dim.borough_list if b != zones.UNKNOWN]
+    od_borough = st.selectbox("Borough", ["All boroughs"] + boroughs, key='od_borough')
+    if od_borough == "All boroughs":
+        plot(px.imshow(mx.borough_rollup(od, zone_dim).to_frame(),
+                       labels=dict(x="Dropoff Borough", y="Pickup Borough", color="Trips"),
+                       aspect="auto", title="Trips between boroughs"))
+    flows = od if od_borough == "All boroughs" else mx.by_borough(od, zone_dim, [od_borough])
+    flows = flows.top(0, 15).top(1, 15)
+    plot(px.imshow(flows.to_frame(row_labels=zone_name_array[flows.labels[0]],
+                                  col_labels=zone_name_array[flows.labels[1]]),
+                   labels=dict(x="Dropoff Zone", y="Pickup Zone", color="Trips"),
+                   aspect="auto", title="Trips between the 15 busiest pickup and dropoff zones"))
+
+@charts.chart('insights', lambda: matrix('weekday_hour'))
+def weekday_hour_heatmap(weekday_hour):
+    st.markdown("### 📅 Trips by Weekday and Hour")
+    plot(px.imshow(weekday_hour.to_frame(row_labels=WEEKDAY_NAMES),
+                   labels=dict(x="Hour", y="Weekday", color="Trips"), aspect="auto",
+                   title="Trips by Weekday and Hour"))
+
+@charts.chart('insights', lambda: scatter_data('fare_amount', 'tip_amount'),
+              expander="💸 Tip vs Fare")
+def tip_fare_scatter(data):
+    plot(scatter_layer.scatter_figure(
+        data, 'fare_amount', 'tip_amount', "Tip vs Fare",
+        {'fare_amount': 'Fare ($)', 'tip_amount': 'Tip ($)'}, 0.6))
+
+# Duration vs Distance with correlation
+@charts.chart('insights',
+              lambda: (cached('correlation', tq.correlation, tq.DURATION_EXPR, 'trip_distance'),
+                       scatter_data('trip_distance', 'trip_duration_mins')),
+              expander="⏱️ Duration vs Distance")
+def duration_distance_scatter(value):
+    corr, data = value
     st.markdown(f"**Correlation (Duration vs Distance):** {corr:.2f}")
-    st.plotly_chart(
-        px.scatter(filtered_df, x='trip_distance', y='trip_duration_mins',
-                   title="Duration vs Distance",
-                   labels={'trip_distance': 'Distance (miles)', 'trip_duration_mins': 'Duration (mins)'},
-                   opacity=0.5),
-        use_container_width=True, config=plotly_config
-    )
-
-    # Avg Revenue per Trip by Zone
+    plot(scatter_layer.scatter_figure(
+        data, 'trip_distance', 'trip_duration_mins', "Duration vs Distance",
+        {'trip_distance': 'Distance (miles)', 'trip_duration_mins': 'Duration (mins)'}, 0.5))
+
+@charts.chart('insights', lambda: cached('avg_revenue_by_zone', tq.avg_revenue_by_zone))
+def avg_revenue_chart(rev_zone):
     st.markdown("### 💰 Avg Revenue per Trip (Top 10 Zones)")
-    rev_zone = (filtered_df.groupby('pickup_zone')['total_amount']
-                .mean().sort_values(ascending=False).head(10))
-    st.plotly_chart(
-        px.bar(rev_zone, x=rev_zone.index, y=rev_zone.values,
-               labels={'x': 'Pickup Zone', 'y': 'Avg Revenue ($)'},
-               title="Avg Revenue per Trip by Zone"),
-        use_container_width=True, config=plotly_config
-    )
-
-    # Weekday vs Weekend
+    rev_zone = pd.Series(rev_zone['avg_revenue'].values,
+                         index=zone_labels(rev_zone['location_id']))
+    plot(px.bar(rev_zone, x=rev_zone.index, y=rev_zone.values,
+                labels={'x': 'Pickup Zone', 'y': 'Avg Revenue ($)'},
+                title="Avg Revenue per Trip by Zone"))
+
+# Weekday vs Weekend
+@charts.chart('insights', lambda: cached('day_type_summary', tq.day_type_summary))
+def day_type_charts(d_rt):
     st.markdown("### 📅 Weekday vs Weekend Performance")
-    d_rt = (filtered_df.groupby('day_type')
-            .agg(revenue=('total_amount', 'sum'),
-                 trips=('trip_date', 'count'))
-            .reset_index())
-    st.plotly_chart(
-        px.bar(d_rt, x='day_type', y='revenue',
-               title="Revenue: Weekday vs Weekend",
-               labels={'day_type': 'Day', 'revenue': 'Revenue ($)'}),
-        use_container_width=True, config=plotly_config
-    )
-    st.plotly_chart(
-        px.bar(d_rt, x='day_type', y='trips',
-               title="Trips: Weekday vs Weekend",
-               labels={'day_type': 'Day', 'trips': 'Trips'}),
-        use_container_width=True, config=plotly_config
-    )
-
-    # Fare Anomalies
-    thresh = filtered_df['fare_per_mile'].quantile(0.99)
-    anomalies = filtered_df[filtered_df['fare_per_mile'] > thresh]
+    plot(px.bar(d_rt, x='day_type', y='revenue',
+                title="Revenue: Weekday vs Weekend",
+                labels={'day_type': 'Day', 'revenue': 'Revenue ($)'}))
+    plot(px.bar(d_rt, x='day_type', y='trips',
+                title="Trips: Weekday vs Weekend",
+                labels={'day_type': 'Day', 'trips': 'Trips'}))
+
+def fare_anomalies():
+    thresh = cached('quantile', tq.quantile, tq.FARE_PER_MILE_EXPR, 0.99)
+    return thresh, cached('fare_anomalies', tq.fare_anomalies, thresh)
+
+@charts.chart('insights', fare_anomalies)
+def fare_anomalies_table(value):
+    thresh, anomalies = value
+    anomalies = (anomalies.assign(PULocationID=zone_labels(anomalies['PULocationID']))
+                 .rename(columns={'PULocationID': 'pickup_zone'}))
     st.markdown(f"### ⚠️ Fare Anomalies (Fare/Mile > {thresh:.2f})")
-    st.dataframe(anomalies[['pickup_datetime', 'pickup_zone',
-                            'trip_distance', 'fare_amount', 'fare_per_mile']].head(10))
+    st.dataframe(anomalies)
+
+# Flags written at load time by timeseries.py
+@charts.chart('insights', lambda: cached('anomaly_cells', tq.anomaly_cells))
+def anomaly_heatmap(cells):
+    st.markdown("### 🚨 Volume and Fare Anomalies (Hour vs Zone)")
+    if cells.empty:
+        st.info("No anomalies flagged for these filters.")
+        return
+    kind = st.selectbox("Anomaly", ["volume", "fare"], key='anomaly_kind',
+                        format_func=lambda k: {'volume': "Trip volume vs same weekday/hour",
+                                               'fare': "Fare per mile vs its EWMA"}[k])
+    cells = cells[cells['kind'] == kind]
+    if cells.empty:
+        st.info(f"No {kind} anomalies flagged for these filters.")
+        return
+    days = cells.pivot_table(index='PULocationID', columns='hour', values='days',
+                             aggfunc='sum', fill_value=0).reindex(columns=range(24), fill_value=0)
+    days = days.loc[days.sum(axis=1).nlargest(20).index]
+    days.index = zone_name_array[days.index.to_numpy(dtype='int64')]
+    plot(px.imshow(days.groupby(level=0).sum(),
+                   labels=dict(x="Hour", y="Pickup Zone", color="Flagged days"),
+                   aspect="auto", title="Flagged days per hour (20 most flagged zones)"))
+
+@charts.chart('insights', lambda: cached('top_anomalies', tq.top_anomalies),
+              expander="🚨 Strongest anomalies")
+def top_anomalies_table(anomalies):
+    ids = anomalies.pop('PULocationID')
+    st.dataframe(anomalies.assign(pickup_zone=zone_labels(ids), borough=zone_dim.borough(ids)))
+
+# ---------------- Tabs ----------------
+# on_change='rerun' makes tab selection part of the script state, so only the
+# selected tab's charts run
+tab1, tab2, tab3 = st.tabs(["📊 Overview", "📍 Insights", "📥 Export"],
+                           key='tab', on_change='rerun')
+
+# ----- Overview Tab -----
+if tab1.open:
+    with tab1:
+        charts.render('overview')
+
+# ----- Insights Tab -----
+if tab2.open:
+    with tab2:
+        charts.render('insights')
 
 # ----- Export Tab -----
-with tab3:
-    st.markdown("### ⬇️ Download Data")
-    st.download_button(
-        "Filtered Trips CSV",
-        filtered_df.to_csv(index=False).encode('utf-8'),
-        "nyc_taxi_filtered_trips.csv",
-        "text/csv"
-    )
-    summary_csv = filtered_df.describe(include='all').T.to_csv().encode('utf-8')
-    st.download_button(
-        "Data Summary CSV",
-        summary_csv,
-        "nyc_taxi_data_summary.csv",
-        "text/csv"
-    )
+if tab3.open:
+    with tab3:
+        st.markdown("### ⬇️ Download Data")
+        # Files are streamed to disk only when a download is clicked, then reused
+        # for the same filters until the data changes
+        export_format = st.selectbox("Format", list(exports.EXPORT_FORMATS),
+                                     format_func=lambda f: f.upper(), key='export_format')
+        extension, mime = exports.EXPORT_FORMATS[export_format]
+        export_filters = dict(filters)
+
+        def export_file():
+            path, _ = exports.prepare_export(store, export_filters, export_format, dataset_version)
+            return open(path, 'rb')
+
+        def summary_file():
+            _, summary_path = exports.prepare_export(store, export_filters, export_format,
+                                                     dataset_version)
+            return open(summary_path, 'rb')
+
+        st.download_button(
+            f"Filtered Trips {export_format.upper()}",
+            export_file,
+            f"nyc_taxi_filtered_trips{extension}",
+            mime,
+            on_click='ignore'
+        )
+        st.download_button(
+            "Data Summary CSV",
+            summary_file,
+            "nyc_taxi_data_summary.csv",
+            "text/csv",
+            on_click='ignore'
+        )
+
+# Compute the hidden tabs' charts in the background while the user reads
+hidden_sections = [section for section, tab in (('overview', tab1), ('insights', tab2))
+                   if not tab.open]
+st.session_state.warm_futures = charts.warm(hidden_sections)
+
+# Then the likely next filter states: hour range and dates moved by one step
+# (continuing the last move first) and each of the busiest pickup zones alone
+if prefetch.enabled():
+    top_ids = cached('top_zones', tq.top_zones, 'PULocationID')['location_id']
+    zone_choices = [zone_dim.ids_named([name], domains['zone_ids'])
+                    for name in zone_labels(top_ids[:prefetch.TOP_ZONES])]
+    states = prefetch.neighbors(filters, domains,
+                                previous_request.filters if previous_request else None,
+                                zone_choices)
+    open_sections = [s for s, tab in (('overview', tab1), ('insights', tab2)) if tab.open]
+    computes = ([lambda: cached('kpis', tq.kpis)]
+                + charts.computes(open_sections + hidden_sections))
+    st.session_state.prefetches = prefetch.prefetch(states, computes)
+    profile.count('prefetch_states', len(st.session_state.prefetches))
+
+# ---------------- Performance ----------------
+# Hidden unless the URL has ?perf=1 or DASHBOARD_PERF=1 is set
+PERF_HISTORY = 20
+
+profile.finish()
+perf.publish(profile)
+
+# Timings of the charts drawn in this run (hidden charts keep their last)
+chart_metrics = st.session_state.setdefault('chart_metrics', {})
+chart_metrics.update(charts.metrics)
+perf_history = st.session_state.setdefault('perf_history', [])
+perf_history.append({'started_at': profile.to_dict()['started_at'], 'seconds': profile.seconds,
+                     'queries': len(profile.queries),
+                     'query_s': round(sum(q['seconds'] for q in profile.queries), 4),
+                     **profile.counters})
+del perf_history[:-PERF_HISTORY]
+# Fully cached reruns only run the startup lookups, so keep the last
+# queries that did chart work
+if any(q['stage'] != 'startup' for q in profile.queries):
+    st.session_state.perf_queries = profile.queries
+
+if st.query_params.get('perf') == '1' or os.environ.get('DASHBOARD_PERF') == '1':
+    with st.expander("⚙️ Performance"):
+        misses = profile.counters['cache_misses']
+        st.markdown(f"**This rerun:** {profile.seconds:.2f}s, {len(profile.queries)} SQL queries, "
+                    f"{profile.counters['cache_lookups'] - misses} cache hits / {misses} misses")
+        st.dataframe(pd.DataFrame(profile.stage_frame_rows()))
+        st.markdown("**Recent reruns**")
+        st.dataframe(pd.DataFrame(perf_history))
+        if chart_metrics:
+            st.markdown("**Charts (last time each was drawn)**")
+            st.dataframe(pd.DataFrame.from_dict(chart_metrics, orient='index'))
+
+        recent_queries = st.session_state.get('perf_queries', [])
+        if recent_queries:
+            st.markdown("**SQL (last rerun that queried the database)**")
+            st.dataframe(pd.DataFrame(recent_queries).assign(
+                sql=lambda q: q['sql'].map(perf.preview)).drop(columns='params'))
+            chosen = st.selectbox(
+                "EXPLAIN QUERY PLAN", range(len(recent_queries)), key='perf_explain',
+                format_func=lambda i: f"{recent_queries[i]['stage']}: "
+                                      f"{perf.preview(recent_queries[i]['sql'])}")
+            if chosen is not None and chosen < len(recent_queries):
+                q = recent_queries[chosen]
+                st.code(q['sql'].strip(), language='sql')
+                plan = perf.explain(q['sql'], q['params'])
+                st.code("\n".join(f"{row[0]:>3} {row[1]:>3}  {row[3]}" for row in plan),
+                        language=None)
+
+        st.download_button("Metrics JSON", json.dumps(profile.to_dict(), default=str, indent=2),
+                           "dashboard_metrics.json", "application/json")
+        st.download_button("Prometheus text", perf.TOTALS.prometheus(), "dashboard.prom",
+                           "text/plain")
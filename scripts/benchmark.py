@@ -0,0 +1,253 @@
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import aggregate
+import exports
+import ingest
+import matrices as mx
+import memory
+import rollups
+import scatter_layer
+import synthetic_trips
+import trip_frames
+import trip_queries as tq
+import trip_store
+
+# ✅ Reproducible benchmark of the dashboard's data paths on synthetic data.
+# Each stage (ingest, rollups, full load, filtering, every Overview/Insights
+# chart query, CSV export) is timed separately and written to JSON with
+# throughput and peak RSS, so two commits can be compared offline:
+#   python scripts/benchmark.py --rows 1000000 10000000 --output bench.json
+
+DEFAULT_ROWS_PER_MONTH = 3_000_000
+
+
+class PeakRss:
+    # Samples RSS in a background thread while the block runs
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+
+    def _observe(self):
+        rss = memory.current_rss_mb()
+        if rss is not None:
+            self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._observe()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = None
+        self._observe()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._observe()
+
+
+def timed(stages, name, rows, fn):
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        value = fn()
+        seconds = time.perf_counter() - start
+    stages.append({
+        'stage': name,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds) if seconds and rows else None,
+        'peak_rss_mb': None if rss.peak_mb is None else round(rss.peak_mb, 1),
+    })
+    print(f"   ⏱️  {name:<48} {seconds:9.3f}s  peak RSS {memory.format_mb(rss.peak_mb):>11}")
+    return value
+
+
+# Chart queries in the order the Overview and Insights tabs issue them
+CHART_QUERIES = [
+    ('kpis', tq.kpis, ()),
+    ('daily_counts', tq.daily_counts, ()),
+    ('hour_daytype_counts', tq.hour_daytype_counts, ()),
+    ('fare_box_stats', tq.box_stats, ('passenger_count', 'fare_amount')),
+    ('fare_per_mile_histogram', tq.histogram, (tq.FARE_PER_MILE_EXPR, 40)),
+    ('revenue_by_hour', tq.revenue_by_hour, ()),
+    ('passenger_counts', tq.passenger_counts, ()),
+    ('top_pickup_zones', tq.top_zones, ('PULocationID',)),
+    ('speed_histogram', tq.histogram, (tq.SPEED_EXPR, 50)),
+    ('hour_zone_matrix', mx.build, ('hour_pu',)),
+    ('od_matrix', mx.build, ('od',)),
+    ('weekday_hour_matrix', mx.build, ('weekday_hour',)),
+    ('duration_distance_correlation', tq.correlation, (tq.DURATION_EXPR, 'trip_distance')),
+    ('avg_revenue_by_zone', tq.avg_revenue_by_zone, ()),
+    ('day_type_summary', tq.day_type_summary, ()),
+    ('fare_per_mile_p99', tq.quantile, (tq.FARE_PER_MILE_EXPR, 0.99)),
+    ('anomaly_cells', tq.anomaly_cells, ()),
+]
+# What the EDA scripts ask the partition-parallel engine for
+AGGREGATE_GROUPS = ['hour', 'PULocationID']
+AGGREGATE_METRICS = ['count', 'mean(fare_amount)', 'mean(tip_amount)', 'median(fare_amount)']
+SCATTERS = [
+    ('scatter_distance_fare', 'trip_distance', 'fare_amount'),
+    ('scatter_fare_tip', 'fare_amount', 'tip_amount'),
+    ('scatter_distance_duration', 'trip_distance', 'trip_duration_mins'),
+]
+
+
+def benchmark_filters(conn):
+    # 'all' is the dashboard's opening state; 'typical' narrows every filter
+    domains = tq.filter_domains(conn)
+    all_trips = tq.make_filters(domains['min_date'], domains['max_date'], (0, 23), 0)
+    busiest = tq.top_zones(conn, all_trips, limit=20)['location_id'].tolist()
+    typical = tq.make_filters(max(domains['min_date'], domains['max_date'] - timedelta(days=6)),
+                              domains['max_date'], (7, 19), 1, busiest)
+    return {'all': all_trips, 'typical': typical}
+
+
+def run_size(rows, workdir, rows_per_month, seed, columnar, in_memory):
+    stages = []
+    raw_dir = os.path.join(workdir, "raw")
+    db_path = os.path.join(workdir, "db", "nyc_mobility.db")
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    n_months = max(1, math.ceil(rows / rows_per_month))
+    months = [str(p) for p in pd.period_range("2023-01", periods=n_months, freq='M')]
+    per_month = [rows // n_months + (i < rows % n_months) for i in range(n_months)]
+
+    fmt = 'parquet' if _has_pyarrow() else 'csv'
+    paths = [synthetic_trips.month_file(raw_dir, m, fmt) for m in months]
+    timed(stages, 'generate', rows, lambda: [
+        synthetic_trips.write_month(path, month, n, seed)
+        for path, month, n in zip(paths, months, per_month)])
+
+    # Ingest through the same path as load_trips.py
+    conn = ingest.open_for_load(db_path)
+    loads = timed(stages, 'ingest', rows, lambda: [
+        ingest.load_file(conn, path, progress=None) for path in paths])
+    first = min(s['first_date'] for s in loads if s['first_date'])
+    last = max(s['last_date'] for s in loads if s['last_date'])
+    timed(stages, 'rollups', rows, lambda: rollups.refresh_after_load(conn, first, last))
+    conn.close()
+
+    conn = tq.connect(db_path)
+    filter_sets = benchmark_filters(conn)
+    stores = [trip_store.SqliteStore(db_path)]
+    if columnar:
+        root = os.path.join(workdir, "db", "columnar")
+        timed(stages, 'export_columnar', rows,
+              lambda: [trip_store.write_month(conn, m, root) for m in trip_store.sqlite_months(conn)])
+        stores.append(trip_store.ColumnarStore(root, db_path))
+    if in_memory:
+        store = trip_store.MemoryStore(db_path)
+        timed(stages, 'index[memory]', rows, lambda: store.select())
+        stores.append(store)
+
+    # Serial versus one worker per core, to check how the engine scales
+    for workers in sorted({1, os.cpu_count() or 1}):
+        timed(stages, f'aggregate[{workers} worker(s)]', rows,
+              lambda: aggregate.aggregate(AGGREGATE_GROUPS, AGGREGATE_METRICS,
+                                          db_path=db_path, workers=workers))
+
+    for store in stores:
+        # The old load_data(): every row and column in memory
+        timed(stages, f'load_data[{store.backend}]', rows,
+              lambda: trip_frames.compact(store.scan()))
+
+    for label, filters in filter_sets.items():
+        matched = tq.count_trips(conn, filters)
+        for store in stores:
+            timed(stages, f'filter[{label},{store.backend}]', matched,
+                  lambda: store.scan(['fare_amount'], filters))
+        for name, fn, args in CHART_QUERIES:
+            timed(stages, f'chart:{name}[{label}]', matched,
+                  lambda: fn(conn, filters, *args))
+        for store in stores:
+            for name, x, y in SCATTERS:
+                timed(stages, f'chart:{name}[{label},{store.backend}]', matched,
+                      lambda: scatter_layer.scatter_data(store, filters, x, y, matched))
+            # The Export tab's path: streamed in chunks, with its summary
+            export_path = os.path.join(workdir, f"export_{label}_{store.backend}.csv")
+            timed(stages, f'csv_export[{label},{store.backend}]', matched,
+                  lambda: exports.write_export(store, filters, export_path,
+                                               export_path + ".summary.csv", 'csv'))
+    conn.close()
+    return {
+        'rows': rows,
+        'months': months,
+        'db_bytes': os.path.getsize(db_path),
+        'stages': stages,
+    }
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark load, filter, aggregate and export paths")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000],
+                        help="dataset sizes to run, e.g. 1000000 10000000 50000000")
+    parser.add_argument("--rows-per-month", type=int, default=DEFAULT_ROWS_PER_MONTH)
+    parser.add_argument("--workdir", default="bench", help="scratch directory (wiped per size)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--columnar", action="store_true",
+                        help="also benchmark the columnar trip store")
+    parser.add_argument("--memory", action="store_true",
+                        help="also benchmark the in-memory indexed trip store")
+    parser.add_argument("--keep", action="store_true", help="keep generated data and databases")
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'runs': [],
+    }
+    for rows in args.rows:
+        workdir = os.path.join(args.workdir, f"rows_{rows}")
+        shutil.rmtree(workdir, ignore_errors=True)
+        print(f"🧮 Benchmarking {rows:,} rows in {workdir}")
+        results['runs'].append(run_size(rows, workdir, args.rows_per_month, args.seed,
+                                        args.columnar, args.memory))
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        # Written after every size so a long run still leaves partial results
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import sys
+import time
+
+import db
+import rollups
+import timeseries
+
+# Builds (or with --pending, incrementally refreshes) the rollup cubes that
+# back the dashboard's KPI cards and grouped charts, and the anomaly flags
+conn = db.connect(isolation_level=None)
+start = time.perf_counter()
+
+if "--pending" in sys.argv:
+    ranges = rollups.refresh_pending(conn)
+    print(f"✅ Refreshed {len(ranges)} date range(s) in {time.perf_counter() - start:.1f}s.")
+else:
+    rollups.build_rollups(conn)
+    cells = conn.execute(f"SELECT COUNT(*) FROM {rollups.ROLLUP_TABLE}").fetchone()[0]
+    print(f"✅ Built rollups ({cells:,} cells) in {time.perf_counter() - start:.1f}s.")
+    flagged = conn.execute(f"SELECT COUNT(*) FROM {timeseries.ANOMALY_TABLE}").fetchone()[0]
+    print(f"🚨 {flagged:,} zone/hour anomalies flagged.")
+
+conn.close()
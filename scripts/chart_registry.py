@@ -0,0 +1,124 @@
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import streamlit as st
+
+# --- Lazy chart registry ---
+# Each chart declares the section (tab) it belongs to, optionally an expander
+# label, a compute function that only touches data (SQLite, the trip store,
+# the result cache) and a render function that draws the computed value with
+# Streamlit. Rendering a section computes only the charts that are visible:
+# hidden tabs are never rendered, and closed expanders skip their compute.
+# Visible charts compute concurrently on a shared thread pool and are drawn
+# in declaration order on the script thread as soon as each one is ready, so
+# Streamlit calls never leave that thread. Compute and render times are
+# recorded per chart, and as compute:/render: stages of a perf.Profile when
+# one is given.
+
+MAX_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    # One pool for every session; threads are reused across reruns
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix="chart")
+        return _executor
+
+
+class lazy_import:
+    # Module stand-in that imports on first attribute access, so plotting
+    # libraries load when the first chart renders rather than at startup
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+class Chart:
+    def __init__(self, name, section, compute, render, expander=None):
+        self.name = name
+        self.section = section
+        self.compute = compute
+        self.render = render
+        self.expander = expander
+
+
+class ChartRegistry:
+
+    def __init__(self, profile=None):
+        self.charts = []
+        self.metrics = {}  # chart name -> timings of its last render
+        self.profile = profile
+
+    def chart(self, section, compute, expander=None):
+        # Decorator: registers the decorated function as the chart's renderer
+        def register(render):
+            self.charts.append(Chart(render.__name__, section, compute, render, expander))
+            return render
+        return register
+
+    def _stage(self, name, **fields):
+        return self.profile.stage(name, **fields) if self.profile else nullcontext()
+
+    def _timed_compute(self, chart):
+        start = time.perf_counter()
+        with self._stage(f"compute:{chart.name}", section=chart.section):
+            value = chart.compute()
+        return value, time.perf_counter() - start
+
+    def computes(self, sections):
+        # Compute functions of the sections' charts, in section order;
+        # expanders are left out since they are usually closed
+        return [chart.compute for section in sections for chart in self.charts
+                if chart.section == section and not chart.expander]
+
+    def warm(self, sections):
+        # Computes the charts of sections not shown in this run into the
+        # caches, so switching tabs finds them ready
+        return [executor().submit(compute) for compute in self.computes(sections)]
+
+    def render(self, section):
+        # Containers are laid out first so expander state is known before any
+        # compute is submitted and charts keep their order on the page
+        slots = []
+        for chart in [c for c in self.charts if c.section == section]:
+            if chart.expander:
+                container = st.expander(chart.expander, key=f"expander_{chart.name}",
+                                        on_change='rerun')
+                shown = container.open
+            else:
+                container, shown = st.container(), True
+            slots.append((chart, container, shown))
+
+        start = time.perf_counter()
+        futures = [executor().submit(self._timed_compute, chart) if shown else None
+                   for chart, _, shown in slots]
+        try:
+            for (chart, container, _), future in zip(slots, futures):
+                if future is None:
+                    continue
+                value, compute_s = future.result()
+                render_start = time.perf_counter()
+                with container, self._stage(f"render:{chart.name}", section=section):
+                    chart.render(value)
+                self.metrics[chart.name] = {
+                    'section': section,
+                    'compute_s': round(compute_s, 4),
+                    'render_s': round(time.perf_counter() - render_start, 4),
+                    'shown_after_s': round(time.perf_counter() - start, 4),
+                }
+        finally:
+            # A rerun interrupts rendering; queued charts are no longer needed
+            for future in futures:
+                if future is not None:
+                    future.cancel()
@@ -1,14 +1,15 @@
-import sqlite3
 import os
 
-# Step 1: Make sure 'db' folder exists
-os.makedirs("db", exist_ok=True)
+import db
+
+# Step 1: Make sure the database folder exists
+os.makedirs(os.path.dirname(db.DB_PATH) or ".", exist_ok=True)
 
 # Step 2: Create/connect to SQLite database file
-conn = sqlite3.connect("db/nyc_mobility.db")
+conn = db.connect()
 cursor = conn.cursor()
 
-print("✅ SQLite database created at db/nyc_mobility.db")
+print(f"✅ SQLite database created at {db.DB_PATH}")
 
 # Step 3: Close connection
 conn.close()
@@ -1,37 +1,24 @@
-import sqlite3
+import os
+import sys
+
+import db
+import schema
+import zones
+
+# Pass --partitioned to store trips in per-month tables behind a `trips` view
+partitioned = "--partitioned" in sys.argv
 
 # Connect to existing database
-conn = sqlite3.connect("db/nyc_mobility.db")
-cursor = conn.cursor()
+conn = db.connect()
 
-# Create 'zones' table
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS zones (
-    LocationID INTEGER PRIMARY KEY,
-    Borough TEXT,
-    Zone TEXT,
-    service_zone TEXT
-)
-""")
+# Create 'zones', 'trips' (schema v2 with indexes) and 'dataset_meta' tables
+schema.create_schema(conn, partitioned=partitioned)
 
-# Create 'trips' table
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS trips (
-    trip_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    pickup_datetime TEXT,
-    dropoff_datetime TEXT,
-    passenger_count INTEGER,
-    trip_distance REAL,
-    fare_amount REAL,
-    tip_amount REAL,
-    total_amount REAL,
-    PULocationID INTEGER,
-    DOLocationID INTEGER,
-    FOREIGN KEY(PULocationID) REFERENCES zones(LocationID),
-    FOREIGN KEY(DOLocationID) REFERENCES zones(LocationID)
-)
-""")
+# Fill 'zones' from the lookup CSV when it is there (load_zones.py reloads it)
+if os.path.exists(zones.LOOKUP_PATH):
+    zones.load_zone_table(conn, zones.read_lookup())
 
 conn.commit()
-print("✅ Tables 'zones' and 'trips' created successfully.")
+layout = "monthly partitions" if schema.is_partitioned(conn) else "a single table"
+print(f"✅ Tables 'zones' and 'trips' (schema v{schema.SCHEMA_VERSION}, {layout}) created successfully.")
 conn.close()
@@ -0,0 +1,150 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+# --- Shared SQLite access ---
+# One place that knows where the database is and how to open it. The path
+# defaults to db/nyc_mobility.db relative to the project root and can be
+# moved with the NYC_MOBILITY_DB environment variable.
+#
+# Readers (the dashboard, EDA and verify scripts) take read-only connections
+# tuned for analytical scans from a small thread-safe pool. Each pooled
+# connection keeps its own prepared-statement cache, so the dashboard's
+# parameterized queries are compiled once per connection, not per rerun.
+# Readers never take write locks, so concurrent sessions read in parallel
+# (the loaders switch the file to WAL, which lets reads continue during an
+# ingest too). Loaders keep opening their own writable connections.
+
+DB_PATH = os.environ.get("NYC_MOBILITY_DB", "db/nyc_mobility.db")
+
+POOL_SIZE = 8
+STATEMENT_CACHE = 256
+READ_PRAGMAS = {
+    'query_only': 'ON',
+    'cache_size': -65536,       # KiB, i.e. 64 MB of page cache per connection
+    'mmap_size': 512 * 2**20,
+    'temp_store': 'MEMORY',     # GROUP BY / ORDER BY spill to RAM, not temp files
+}
+
+# Callables receiving (sql, params, seconds) after every pooled query
+_query_hooks = []
+
+
+def add_query_hook(hook):
+    _query_hooks.append(hook)
+
+
+def remove_query_hook(hook):
+    if hook in _query_hooks:
+        _query_hooks.remove(hook)
+
+
+class _TimedCursor(sqlite3.Cursor):
+    # Times execute(), i.e. until the first row is ready; for the GROUP BY
+    # queries behind the charts that is nearly all of the work
+    def execute(self, sql, params=()):
+        if not _query_hooks:
+            return super().execute(sql, params)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            seconds = time.perf_counter() - start
+            for hook in list(_query_hooks):
+                hook(sql, params, seconds)
+
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+
+def connect(db_path=None, **kwargs):
+    # Plain writable connection for loaders and schema scripts
+    return sqlite3.connect(db_path or DB_PATH, **kwargs)
+
+
+def connect_readonly(db_path=None):
+    path = os.path.abspath(db_path or DB_PATH)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"SQLite database not found: {path}")
+    conn = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True,
+                           check_same_thread=False, cached_statements=STATEMENT_CACHE,
+                           factory=_TimedConnection)
+    for name, value in READ_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+class ConnectionPool:
+
+    def __init__(self, db_path=None, size=POOL_SIZE):
+        self.db_path = db_path or DB_PATH
+        self.size = size
+        self._idle = queue.LifoQueue()  # most recently used first: warmest cache
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return connect_readonly(self.db_path)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool(db_path=None):
+    # One shared pool per database file
+    path = os.path.abspath(db_path or DB_PATH)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path)
+        return _pools[path]
+
+
+def read_connection(db_path=None):
+    # with db.read_connection() as conn: ...
+    return pool(db_path).connection()
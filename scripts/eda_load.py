@@ -1,17 +1,21 @@
-import pandas as pd
-import sqlite3
+import trip_frames
+import trip_store
 
-# Connect to DB
-conn = sqlite3.connect(r"C:\Users\Ashwini\urban-mobility-dashboard\db\nyc_mobility.db")
-
-# Load the trips table into a DataFrame
-query = "SELECT * FROM trips"
-df = pd.read_sql(query, conn)
-
-conn.close()
+# Load the trips table into a DataFrame (TRIP_STORE=columnar reads the
+# memory-mapped Parquet copy instead of SQLite)
+store = trip_store.open_store()
+raw = store.scan()
+df = trip_frames.compact(raw)
 
 # Preview the data
-print("✅ DataFrame loaded:")
+print(f"✅ DataFrame loaded from the {store.backend} store:")
 print(df.head())
 print("\n📊 DataFrame info:")
 print(df.info())
+
+# Memory before/after compaction
+report = trip_frames.memory_report(raw, df)
+del raw
+print("\n🧮 Memory per row (bytes):")
+print(report[['before_per_row', 'after_per_row']].round(1))
+print(f"\n✅ {report.loc['TOTAL', 'before_bytes'] / max(report.loc['TOTAL', 'after_bytes'], 1):.1f}x smaller")
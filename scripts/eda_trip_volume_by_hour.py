@@ -1,32 +1,27 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import sqlite3
+import aggregate
 
-# Set Seaborn style
-sns.set_style("whitegrid")
 
-# Load data from SQLite
-conn = sqlite3.connect(r"C:\Users\Ashwini\urban-mobility-dashboard\db\nyc_mobility.db")
-df = pd.read_sql("SELECT pickup_datetime FROM trips", conn)
-conn.close()
+def main():
+    # Set Seaborn style
+    sns.set_style("whitegrid")
 
-# Convert pickup_datetime to datetime
-df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
+    # Count trips per hour, month by month across CPU cores
+    trip_counts = aggregate.aggregate(['hour'], ['count']).set_index('hour')['count']
 
-# Extract hour
-df['hour'] = df['pickup_datetime'].dt.hour
+    # Plot with Seaborn
+    plt.figure(figsize=(12, 6))
+    sns.barplot(x=trip_counts.index, y=trip_counts.values, palette="Blues_d")
+    plt.title("🕒 NYC Yellow Taxi Trips by Hour of Day", fontsize=16)
+    plt.xlabel("Hour of Day", fontsize=14)
+    plt.ylabel("Number of Trips", fontsize=14)
+    plt.xticks(rotation=0)
+    plt.tight_layout()
 
-# Count trips per hour
-trip_counts = df['hour'].value_counts().sort_index()
+    plt.show()
 
-# Plot with Seaborn
-plt.figure(figsize=(12, 6))
-sns.barplot(x=trip_counts.index, y=trip_counts.values, palette="Blues_d")
-plt.title("🕒 NYC Yellow Taxi Trips by Hour of Day", fontsize=16)
-plt.xlabel("Hour of Day", fontsize=14)
-plt.ylabel("Number of Trips", fontsize=14)
-plt.xticks(rotation=0)
-plt.tight_layout()
 
-plt.show()
+# Worker processes re-import this module, so nothing runs at import time
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import argparse
+import time
+
+import trip_queries as tq
+import trip_store
+
+# ✅ Writes (or refreshes) the month-partitioned Parquet copy of 'trips' that
+# the columnar store reads: db/columnar/month=YYYY-MM/trips.parquet
+parser = argparse.ArgumentParser(description="Export trips to the columnar store")
+parser.add_argument("--db", default=tq.DB_PATH, help="SQLite database path")
+parser.add_argument("--root", default=trip_store.COLUMNAR_ROOT, help="columnar store directory")
+parser.add_argument("--months", nargs="*", help="months to (re)write as YYYY-MM (default: all)")
+parser.add_argument("--row-group-rows", type=int, default=trip_store.ROW_GROUP_ROWS)
+args = parser.parse_args()
+
+conn = tq.connect(args.db)
+months = args.months or trip_store.sqlite_months(conn)
+
+for month in months:
+    start = time.perf_counter()
+    rows = trip_store.write_month(conn, month, args.root, args.row_group_rows)
+    print(f"✅ {month}: wrote {rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+conn.close()
@@ -0,0 +1,216 @@
+import gzip
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import result_cache
+import sketches
+import trip_store
+
+# --- Streaming exports ---
+# Filtered trips are written to disk chunk by chunk straight from the trip
+# store, so an export never holds the whole file (or the whole frame) in
+# memory. Finished files are kept under db/exports/ keyed by filter hash,
+# format and dataset version, and reused until the data changes. The data
+# summary is accumulated during the same pass.
+
+EXPORT_DIR = "db/exports"
+
+# Format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+SUMMARY_STATS = ['count', 'unique', 'top', 'freq', 'mean', 'std',
+                 'min', '25%', '50%', '75%', 'max']
+# Distinct values tracked per text column before 'unique' stops counting
+MAX_TRACKED_VALUES = 10_000
+# Level 9 (gzip's default) is ~3x slower for a few percent smaller files
+GZIP_LEVEL = 5
+
+
+class SummaryAccumulator:
+    # describe(include='all') in one pass: exact counts/mean/std/min/max,
+    # quartiles from quantile sketches (within sketches.ALPHA), value counts
+    # for text columns
+    def __init__(self):
+        self.columns = {}
+
+    def _column(self, name, kind):
+        if name not in self.columns:
+            self.columns[name] = {'kind': kind, 'count': 0, 'sum': 0.0, 'sumsq': 0.0,
+                                  'min': None, 'max': None, 'values': {},
+                                  'slots': np.zeros(sketches.QUANTILE_SLOTS, dtype='int64')}
+        return self.columns[name]
+
+    def update(self, chunk):
+        for name in chunk.columns:
+            series = chunk[name]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                self._update_datetime(self._column(name, 'datetime'), series)
+            elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                col = self._column(name, 'numeric')
+                col['integer'] = col.get('integer', True) and pd.api.types.is_integer_dtype(series)
+                self._update_numeric(col, series)
+            else:
+                self._update_text(self._column(name, 'text'), series)
+
+    def _update_bounds(self, col, lo, hi):
+        col['min'] = lo if col['min'] is None else min(col['min'], lo)
+        col['max'] = hi if col['max'] is None else max(col['max'], hi)
+
+    def _update_numeric(self, col, series):
+        values = series.dropna().to_numpy(dtype='float64')
+        if not len(values):
+            return
+        col['count'] += len(values)
+        col['sum'] += values.sum()
+        col['sumsq'] += np.square(values).sum()
+        self._update_bounds(col, values.min(), values.max())
+        col['slots'] += np.bincount(sketches.quantile_slots(values),
+                                    minlength=sketches.QUANTILE_SLOTS)
+
+    def _update_datetime(self, col, series):
+        values = series.dropna()
+        if not len(values):
+            return
+        col['count'] += len(values)
+        seconds = (values - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+        col['sum'] += float(seconds.sum())
+        self._update_bounds(col, values.min(), values.max())
+
+    def _update_text(self, col, series):
+        values = series.dropna()
+        col['count'] += len(values)
+        if col['values'] is None:
+            return
+        for value, n in values.astype(str).value_counts().items():
+            col['values'][value] = col['values'].get(value, 0) + n
+        if len(col['values']) > MAX_TRACKED_VALUES:
+            col['values'] = None
+
+    def frame(self):
+        rows = {}
+        for name, col in self.columns.items():
+            row = dict.fromkeys(SUMMARY_STATS, np.nan)
+            row['count'] = col['count']
+            n = col['count']
+            if col['kind'] == 'text' and col['values']:
+                top = max(col['values'], key=col['values'].get)
+                row.update(unique=len(col['values']), top=top, freq=col['values'][top])
+            elif col['kind'] == 'datetime' and n:
+                row.update(mean=pd.Timestamp(col['sum'] / n, unit='s'),
+                           min=col['min'], max=col['max'])
+            elif col['kind'] == 'numeric' and n:
+                mean = col['sum'] / n
+                var = (col['sumsq'] - n * mean * mean) / (n - 1) if n > 1 else np.nan
+                row.update(mean=mean, std=np.sqrt(max(var, 0)), min=col['min'], max=col['max'])
+                # Sketch quartiles only mean something inside the sketched range
+                if max(abs(col['min']), abs(col['max'])) <= sketches.MAX_VALUE:
+                    for q in (0.25, 0.5, 0.75):
+                        value = min(max(sketches.quantile(col['slots'], q), col['min']), col['max'])
+                        row[f"{int(q * 100)}%"] = round(value) if col['integer'] else value
+            rows[name] = row
+        return pd.DataFrame.from_dict(rows, orient='index', columns=SUMMARY_STATS)
+
+
+# ---------------- Writers ----------------
+class _CsvWriter:
+    def __init__(self, path, compress):
+        if compress:
+            self.file = gzip.open(path, 'wt', compresslevel=GZIP_LEVEL, newline='')
+        else:
+            self.file = open(path, 'w', newline='')
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)") from e
+        self.path = path
+        self.writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is None:
+            # No rows matched: still produce a valid, empty file
+            import pyarrow.parquet as pq
+            pq.write_table(trip_store.arrow_schema().empty_table(), self.path)
+        else:
+            self.writer.close()
+
+
+def _writer(path, fmt):
+    if fmt == 'parquet':
+        return _ParquetWriter(path)
+    return _CsvWriter(path, compress=(fmt == 'csv.gz'))
+
+
+# ---------------- Export cache ----------------
+def export_paths(filters, fmt, dataset_version, backend, export_dir=EXPORT_DIR):
+    key = result_cache.filter_key([filters, backend])[:16]
+    base = os.path.join(export_dir, f"trips_{key}_v{dataset_version}")
+    return base + EXPORT_FORMATS[fmt][0], base + ".summary.csv"
+
+
+def write_export(store, filters, path, summary_path, fmt,
+                 chunk_rows=trip_store.SCAN_CHUNK_ROWS):
+    # Streams the filtered rows into path and the summary into summary_path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Per-writer temp names: two sessions may export the same filters at once
+    tmp_suffix = f".{os.getpid()}-{threading.get_ident()}.tmp"
+    tmp = path + tmp_suffix
+    writer = _writer(tmp, fmt)
+    summary = SummaryAccumulator()
+    rows = 0
+    try:
+        for chunk in store.iter_scan(trip_store.EXPORT_COLUMNS, filters, chunk_rows):
+            writer.write(chunk)
+            summary.update(chunk)
+            rows += len(chunk)
+    finally:
+        writer.close()
+    summary.frame().to_csv(summary_path + tmp_suffix)
+    os.replace(summary_path + tmp_suffix, summary_path)
+    os.replace(tmp, path)
+    return rows
+
+
+def prepare_export(store, filters, fmt, dataset_version, export_dir=EXPORT_DIR):
+    # Reuses a finished file for the same filters and data; returns both paths
+    path, summary_path = export_paths(filters, fmt, dataset_version, store.backend, export_dir)
+    if not (os.path.exists(path) and os.path.exists(summary_path)):
+        write_export(store, filters, path, summary_path, fmt)
+    return path, summary_path
+
+
+def prune_exports(dataset_version, export_dir=EXPORT_DIR):
+    # Files for older dataset versions can never be served again
+    if not os.path.isdir(export_dir):
+        return
+    suffix = f"_v{dataset_version}"
+    for name in os.listdir(export_dir):
+        stem = name.split('.', 1)[0]
+        if name.startswith("trips_") and not stem.endswith(suffix):
+            os.remove(os.path.join(export_dir, name))
@@ -0,0 +1,507 @@
+import glob
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import datetime
+from queue import Full
+
+import pandas as pd
+
+import memory
+import quality
+import rollups
+import schema
+
+# --- Streaming ingestion of monthly TLC files ---
+# Files are read in fixed-size chunks (CSV) or record batches (Parquet), only
+# the nine schema columns are projected, and each chunk is coerced, derived
+# and bulk-inserted before the next one is read, so memory stays bounded.
+# Rows failing the checks in quality.py are diverted to trips_quarantine.
+#
+# Loads are append-only and idempotent. Every trip carries a fingerprint of
+# its natural key (schema.trip_key) under a unique index, and rows go in with
+# INSERT OR IGNORE, so loading a file twice adds nothing. Each source file
+# also keeps a watermark, the latest pickup already loaded from it, and a
+# re-run skips older rows before they reach SQLite. Dataset version bumps
+# record the pickup dates that received rows, so rollups and caches refresh
+# only those dates.
+
+# TLC source column -> trips column
+SOURCE_COLUMNS = {
+    'tpep_pickup_datetime': 'pickup_datetime',
+    'tpep_dropoff_datetime': 'dropoff_datetime',
+    'passenger_count': 'passenger_count',
+    'trip_distance': 'trip_distance',
+    'fare_amount': 'fare_amount',
+    'tip_amount': 'tip_amount',
+    'total_amount': 'total_amount',
+    'PULocationID': 'PULocationID',
+    'DOLocationID': 'DOLocationID',
+}
+
+# Numeric columns are read as float64 so missing values survive as NaN (NULL)
+CSV_DTYPES = {
+    'passenger_count': 'float64',
+    'trip_distance': 'float64',
+    'fare_amount': 'float64',
+    'tip_amount': 'float64',
+    'total_amount': 'float64',
+    'PULocationID': 'float64',
+    'DOLocationID': 'float64',
+    'tpep_pickup_datetime': 'string',
+    'tpep_dropoff_datetime': 'string',
+}
+
+DEFAULT_CHUNK_ROWS = 250_000
+DEFAULT_MEMORY_BUDGET_MB = 512
+DEFAULT_COMMIT_ROWS = 2_000_000
+MIN_CHUNK_ROWS = 10_000
+
+# Rough transient cost of one row while it is parsed, derived and bound
+BYTES_PER_ROW_ESTIMATE = 1_500
+
+
+# ---------------- Memory ----------------
+def chunk_rows_for_budget(memory_budget_mb, requested=DEFAULT_CHUNK_ROWS):
+    # Leave half the budget for the interpreter, pandas and SQLite's page cache
+    affordable = int(memory_budget_mb * 2**20 * 0.5 / BYTES_PER_ROW_ESTIMATE)
+    return max(MIN_CHUNK_ROWS, min(requested, affordable))
+
+
+class ChunkSizer:
+    # Shrinks the chunk size whenever RSS after a chunk goes over the budget
+
+    def __init__(self, memory_budget_mb, chunk_rows):
+        self.memory_budget_mb = memory_budget_mb
+        self.rows = chunk_rows_for_budget(memory_budget_mb, chunk_rows)
+        self.peak_rss_mb = memory.current_rss_mb()
+
+    def observe(self):
+        # Without an RSS reading the chunk size stays as planned
+        rss = memory.current_rss_mb()
+        if rss is None:
+            return None
+        self.peak_rss_mb = rss if self.peak_rss_mb is None else max(self.peak_rss_mb, rss)
+        if rss > self.memory_budget_mb and self.rows > MIN_CHUNK_ROWS:
+            self.rows = max(MIN_CHUNK_ROWS, self.rows // 2)
+        return rss
+
+
+# ---------------- Readers ----------------
+def file_format(path):
+    return 'parquet' if str(path).lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+def iter_csv_chunks(path, sizer):
+    # get_chunk() lets the sizer change the chunk size between reads
+    reader = pd.read_csv(path, usecols=list(SOURCE_COLUMNS), dtype=CSV_DTYPES,
+                         chunksize=sizer.rows)
+    with reader:
+        while True:
+            try:
+                yield reader.get_chunk(sizer.rows)
+            except StopIteration:
+                return
+
+
+def iter_parquet_chunks(path, sizer):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow)") from e
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=sizer.rows, columns=list(SOURCE_COLUMNS)):
+        yield batch.to_pandas()
+
+
+def iter_chunks(path, sizer):
+    if file_format(path) == 'parquet':
+        return iter_parquet_chunks(path, sizer)
+    return iter_csv_chunks(path, sizer)
+
+
+def coerce_chunk(chunk):
+    # Project, rename and type one raw chunk, then materialize derived columns
+    chunk = chunk[list(SOURCE_COLUMNS)].rename(columns=SOURCE_COLUMNS)
+    for column in CSV_DTYPES:
+        name = SOURCE_COLUMNS[column]
+        if CSV_DTYPES[column] == 'float64':
+            chunk[name] = pd.to_numeric(chunk[name], errors='coerce').astype('float64')
+    return schema.derive_columns(chunk)
+
+
+def dates_span(dates):
+    return (min(dates), max(dates)) if dates else (None, None)
+
+
+def widen_range(date_range, trips):
+    # date_range is [first, last] of 'YYYY-MM-DD' strings, or None
+    if trips.empty:
+        return date_range
+    first, last = trips['pickup_date'].min(), trips['pickup_date'].max()
+    if date_range is None:
+        return [first, last]
+    return [min(date_range[0], first), max(date_range[1], last)]
+
+
+# ---------------- Writer ----------------
+def tune_for_bulk_load(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+
+
+def open_for_load(db_path, partitioned=False):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    if schema.schema_version(conn) == 1:
+        conn.close()
+        raise RuntimeError(f"{db_path} uses the v1 trips schema; run migrate_schema.py first")
+    tune_for_bulk_load(conn)
+    conn.execute("BEGIN")
+    removed = schema.create_schema(conn, partitioned=partitioned)
+    if removed:
+        # Databases loaded before trip keys existed may hold duplicate trips
+        print(f"♻️  Removed {removed:,} duplicate trips")
+        schema.refresh_filter_domains(conn)
+        schema.bump_dataset_version(conn)
+        if rollups.rollups_ready(conn):
+            rollups.build_rollups(conn)
+    conn.execute("COMMIT")
+    return conn
+
+
+# ---------------- Watermarks ----------------
+def source_name(path):
+    # Watermarks follow the file name, so a re-downloaded month keeps its own
+    return os.path.basename(str(path))
+
+
+def read_watermark(conn, source):
+    # The latest pickup_ts loaded from source, or None. A watermark whose
+    # fingerprint trip is gone (rows deleted or rolled back) is not trusted.
+    row = conn.execute("SELECT max_pickup_ts, max_trip_key FROM ingest_watermarks "
+                       "WHERE source = ?", (source,)).fetchone()
+    if row is None:
+        return None
+    if conn.execute("SELECT 1 FROM trips WHERE trip_key = ?", (row[1],)).fetchone() is None:
+        return None
+    return row[0]
+
+
+def past_watermark(trips, watermark):
+    # Rows at the watermark itself still go through INSERT OR IGNORE
+    if watermark is None:
+        return trips
+    return trips[trips['pickup_ts'].to_numpy() >= watermark]
+
+
+def advance_watermark(mark, trips):
+    # mark is (max_pickup_ts, trip_key of that trip), or None
+    if trips.empty:
+        return mark
+    i = trips['pickup_ts'].to_numpy().argmax()
+    latest = (int(trips['pickup_ts'].iat[i]), int(trips[schema.KEY_COLUMN].iat[i]))
+    return latest if mark is None or latest[0] > mark[0] else mark
+
+
+def save_watermark(conn, source, mark, rows_loaded):
+    # Only after the whole source has been read: rows are not in pickup order
+    if mark is None:
+        return
+    conn.execute("""
+        INSERT INTO ingest_watermarks VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(source) DO UPDATE SET
+            max_pickup_ts = MAX(max_pickup_ts, excluded.max_pickup_ts),
+            max_trip_key = CASE WHEN excluded.max_pickup_ts >= max_pickup_ts
+                                THEN excluded.max_trip_key ELSE max_trip_key END,
+            rows_loaded = rows_loaded + excluded.rows_loaded,
+            updated_at = excluded.updated_at
+    """, (source, mark[0], mark[1], rows_loaded, datetime.now().isoformat(timespec='seconds')))
+
+
+def load_file(conn, path, chunk_rows=DEFAULT_CHUNK_ROWS,
+              memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+              commit_rows=DEFAULT_COMMIT_ROWS, max_rows=None, progress=print,
+              use_watermark=True, zone_ids=None):
+    # conn must come from open_for_load(); returns a stats dict. 'dates' are
+    # the pickup dates that received new rows; first_date/last_date span them.
+    # zone_ids: valid LocationIDs (default: the zone lookup CSV)
+    sizer = ChunkSizer(memory_budget_mb, chunk_rows)
+    start = time.perf_counter()
+    read_rows = loaded = skipped = unparsed = pending = 0
+    rejected_by_reason = {}
+    source = source_name(path)
+    if zone_ids is None:
+        zone_ids = quality.known_zone_ids()
+    period = quality.source_period(path)
+    watermark = read_watermark(conn, source) if use_watermark else None
+    mark = None
+    dates, uncommitted = set(), set()
+    complete = True
+    conn.execute("BEGIN")
+    for chunk in iter_chunks(path, sizer):
+        if max_rows is not None:
+            chunk = chunk.head(max_rows - read_rows)
+        read_rows += len(chunk)
+        trips = coerce_chunk(chunk)
+        unparsed += len(chunk) - len(trips)
+        del chunk
+        mark = advance_watermark(mark, trips)
+        fresh = past_watermark(trips, watermark)
+        skipped += len(trips) - len(fresh)
+        clean, rejected = quality.validate(fresh, zone_ids, period)
+        quality.quarantine(conn, rejected, source)
+        for reason, n in quality.reason_counts(rejected).items():
+            rejected_by_reason[reason] = rejected_by_reason.get(reason, 0) + n
+        loaded += schema.insert_trips(conn, clean, dates=uncommitted)
+        pending += len(fresh)
+        del trips, fresh, clean, rejected
+        if pending >= commit_rows:
+            if uncommitted:
+                schema.bump_dataset_version(conn, *dates_span(uncommitted))
+            conn.execute("COMMIT")
+            conn.execute("BEGIN")
+            dates |= uncommitted
+            uncommitted, pending = set(), 0
+        rss = sizer.observe()
+        if progress:
+            elapsed = time.perf_counter() - start
+            progress(f"   {loaded:,} rows  {loaded / elapsed:,.0f} rows/s  "
+                     f"RSS {memory.format_mb(rss)}  chunk {sizer.rows:,}")
+        if max_rows is not None and read_rows >= max_rows:
+            complete = False
+            break
+    if uncommitted:
+        schema.bump_dataset_version(conn, *dates_span(uncommitted))
+    if complete:
+        save_watermark(conn, source, mark, loaded)
+    conn.execute("COMMIT")
+    dates |= uncommitted
+    elapsed = time.perf_counter() - start
+    first_date, last_date = dates_span(dates)
+    return {
+        'path': str(path),
+        'rows_read': read_rows,
+        'rows_loaded': loaded,
+        'rows_skipped': skipped,
+        'rows_unparsed': unparsed,
+        'rows_rejected': sum(rejected_by_reason.values()),
+        'rejected_reasons': rejected_by_reason,
+        'rows_duplicate': (read_rows - loaded - skipped - unparsed
+                           - sum(rejected_by_reason.values())),
+        'seconds': elapsed,
+        'rows_per_sec': read_rows / elapsed if elapsed else 0.0,
+        'peak_rss_mb': sizer.peak_rss_mb,
+        'dates': sorted(dates),
+        'first_date': first_date,
+        'last_date': last_date,
+    }
+
+
+# ---------------- Source discovery ----------------
+# TLC monthly file names seen in data/raw/, keyed by 'YYYY-MM'
+MONTH_FILE_PATTERNS = [
+    "yellow-tripdata-{month}.csv",
+    "yellow_tripdata_{month}.csv",
+    "yellow_tripdata_{month}.parquet",
+    "{month}-yellow.parquet",
+    "{month}-yellow.csv",
+]
+
+
+def month_range(spec):
+    # 'YYYY-MM' or 'YYYY-MM:YYYY-MM' (inclusive)
+    first, _, last = spec.partition(':')
+    months = pd.period_range(first, last or first, freq='M')
+    return [str(m) for m in months]
+
+
+def resolve_sources(patterns=(), months=None, raw_dir="data/raw"):
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern)))
+    for month in month_range(months) if months else []:
+        found = [os.path.join(raw_dir, name.format(month=month)) for name in MONTH_FILE_PATTERNS]
+        found = [path for path in found if os.path.exists(path)]
+        if not found:
+            print(f"⚠️  No file found for {month} in {raw_dir}")
+        # Prefer Parquet over a CSV converted from it
+        paths.extend(sorted(found, key=lambda path: file_format(path) != 'parquet')[:1])
+    # De-duplicate while keeping order
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def file_hash(path, block_size=2**20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ---------------- Manifest ----------------
+def loaded_hashes(conn):
+    return {h for (h,) in conn.execute(
+        "SELECT file_hash FROM ingest_manifest WHERE status = 'loaded'")}
+
+
+def discard_file_rows(conn, digest):
+    for table, first_id, last_id in conn.execute(
+            "SELECT table_name, first_id, last_id FROM ingest_batches WHERE file_hash = ?",
+            (digest,)).fetchall():
+        conn.execute(f"DELETE FROM {table} WHERE trip_id BETWEEN ? AND ?", (first_id, last_id))
+    conn.execute("DELETE FROM ingest_batches WHERE file_hash = ?", (digest,))
+    conn.execute("DELETE FROM ingest_manifest_dates WHERE file_hash = ?", (digest,))
+    conn.execute("DELETE FROM ingest_manifest WHERE file_hash = ?", (digest,))
+
+
+def recover_partial_loads(conn):
+    # Files left in 'loading' by a crashed run are rolled back and reloaded
+    partial = conn.execute(
+        "SELECT file_hash, file_path FROM ingest_manifest WHERE status != 'loaded'").fetchall()
+    conn.execute("BEGIN")
+    for digest, path in partial:
+        print(f"♻️  Rolling back partial load of {path}")
+        discard_file_rows(conn, digest)
+    if partial:
+        # Their watermarks may point past rows that are now gone
+        conn.executemany("DELETE FROM ingest_watermarks WHERE source = ?",
+                         [(source_name(path),) for _, path in partial])
+        schema.refresh_filter_domains(conn)
+        schema.bump_dataset_version(conn)
+        if rollups.rollups_ready(conn):
+            # Rolled-back rows may already have been folded into the cubes
+            rollups.build_rollups(conn)
+    conn.execute("COMMIT")
+    return len(partial)
+
+
+# ---------------- Parallel ingest ----------------
+# Workers parse and clean files in a process pool and push chunks through a
+# bounded queue to a single writer process, since SQLite allows one writer.
+# The parent sets the abort event if the writer dies, so a parser blocked on
+# the full queue gives up instead of waiting forever.
+PUT_TIMEOUT_S = 1.0
+_queue = None
+_abort = None
+
+
+class WriterFailed(Exception):
+    pass
+
+
+def _init_worker(queue, abort):
+    global _queue, _abort
+    _queue, _abort = queue, abort
+
+
+def put_message(queue, message, writer_alive):
+    # put() in short waits, so a writer that has died is noticed instead of
+    # blocking on the full queue forever
+    while writer_alive():
+        try:
+            queue.put(message, timeout=PUT_TIMEOUT_S)
+            return
+        except Full:
+            pass
+    raise WriterFailed("the writer process exited")
+
+
+def parse_file(path, digest, chunk_rows, memory_budget_mb, zone_ids=None):
+    # Runs in a pool worker; put_message() blocks when the writer falls behind.
+    # Validation happens here too, so it runs in parallel.
+    put = lambda message: put_message(_queue, message, lambda: not _abort.is_set())
+    sizer = ChunkSizer(memory_budget_mb, chunk_rows)
+    period = quality.source_period(path)
+    rows = 0
+    put(('start', digest, path, None))
+    try:
+        for chunk in iter_chunks(path, sizer):
+            rows += len(chunk)
+            put(('rows', digest, path, quality.validate(coerce_chunk(chunk), zone_ids, period)))
+            del chunk
+            sizer.observe()
+    except WriterFailed:
+        # Chunks still buffered for the dead writer would block this process's exit
+        _queue.cancel_join_thread()
+        raise
+    except Exception as e:
+        put(('error', digest, path, f"{type(e).__name__}: {e}"))
+        raise
+    put(('done', digest, path, rows))
+    return rows
+
+
+def writer_main(queue, db_path, commit_rows, expected_files, use_watermark=True):
+    # Single writer process. It stops once every expected file has sent 'done'
+    # or 'error': a sentinel from the parent could overtake chunks still
+    # sitting in a parser's queue feeder thread.
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    tune_for_bulk_load(conn)
+    start = time.perf_counter()
+    loaded = pending = 0
+    finished = set()
+    watermarks, marks, file_rows, file_rejected, file_dates = {}, {}, {}, {}, {}
+    uncommitted = set()
+    conn.execute("BEGIN")
+    while len(finished) < expected_files:
+        message = queue.get()
+        kind, digest, path, payload = message
+        if kind == 'start':
+            conn.execute("INSERT OR REPLACE INTO ingest_manifest (file_hash, file_path, status) "
+                         "VALUES (?, ?, 'loading')", (digest, path))
+            watermarks[digest] = read_watermark(conn, source_name(path)) if use_watermark else None
+        elif kind == 'rows':
+            record = lambda table, first_id, last_id: conn.execute(
+                "INSERT INTO ingest_batches VALUES (?, ?, ?, ?)", (digest, table, first_id, last_id))
+            clean, rejected = payload
+            marks[digest] = advance_watermark(advance_watermark(marks.get(digest), clean), rejected)
+            watermark = watermarks.get(digest)
+            rejected = past_watermark(rejected, watermark)
+            quality.quarantine(conn, rejected, source_name(path))
+            file_rejected[digest] = file_rejected.get(digest, 0) + len(rejected)
+            fresh = past_watermark(clean, watermark)
+            dates = file_dates.setdefault(digest, set())
+            inserted = schema.insert_trips(conn, fresh, on_insert=record, dates=dates)
+            loaded += inserted
+            file_rows[digest] = file_rows.get(digest, 0) + inserted
+            pending += len(fresh)
+            uncommitted |= dates
+        elif kind == 'done':
+            dates = file_dates.pop(digest, set())
+            first_date, last_date = dates_span(dates)
+            inserted = file_rows.pop(digest, 0)
+            # rollups.refresh_pending() refreshes exactly these dates
+            conn.executemany("INSERT OR IGNORE INTO ingest_manifest_dates VALUES (?, ?)",
+                             [(digest, d) for d in sorted(dates)])
+            conn.execute("UPDATE ingest_manifest SET status = 'loaded', row_count = ?, loaded_at = ?, "
+                         "first_date = ?, last_date = ?, rolled_up = 0 WHERE file_hash = ?",
+                         (inserted, datetime.now().isoformat(timespec='seconds'),
+                          first_date, last_date, digest))
+            save_watermark(conn, source_name(path), marks.pop(digest, None), inserted)
+            conn.execute("DELETE FROM ingest_batches WHERE file_hash = ?", (digest,))
+            finished.add(digest)
+            elapsed = time.perf_counter() - start
+            rejected = file_rejected.pop(digest, 0)
+            print(f"   ✅ {os.path.basename(path)}: {inserted:,} new of {payload:,} rows"
+                  + (f", {rejected:,} rejected" if rejected else "")
+                  + f" ({loaded / elapsed:,.0f} rows/s overall)", flush=True)
+        elif kind == 'error' and digest not in finished:
+            print(f"   ❌ {os.path.basename(path)}: {payload}", flush=True)
+            discard_file_rows(conn, digest)
+            schema.refresh_filter_domains(conn)
+            schema.bump_dataset_version(conn, *dates_span(file_dates.pop(digest, None)))
+            finished.add(digest)
+        if pending >= commit_rows:
+            # Committed rows are visible to readers, so caches must see a new version
+            if uncommitted:
+                schema.bump_dataset_version(conn, *dates_span(uncommitted))
+            conn.execute("COMMIT")
+            conn.execute("BEGIN")
+            uncommitted, pending = set(), 0
+    if uncommitted:
+        schema.bump_dataset_version(conn, *dates_span(uncommitted))
+    conn.execute("COMMIT")
+    conn.close()
@@ -0,0 +1,136 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import db
+import ingest
+import quality
+import rollups
+
+# ✅ Loads many monthly TLC files in parallel: a process pool parses files and
+# a single writer process inserts them. Files already recorded in the
+# ingest_manifest table (by content hash) are skipped, so re-runs are cheap;
+# a changed file with the same name only adds trips not stored yet.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel multi-month trip ingestion")
+    parser.add_argument("patterns", nargs="*", help="file globs, e.g. 'data/raw/*.parquet'")
+    parser.add_argument("--months", help="month range YYYY-MM[:YYYY-MM] looked up in --raw-dir")
+    parser.add_argument("--raw-dir", default="data/raw")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="parser processes")
+    parser.add_argument("--queue-batches", type=int, default=8,
+                        help="parsed chunks buffered between parsers and the writer")
+    parser.add_argument("--chunk-rows", type=int, default=ingest.DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--memory-budget-mb", type=int, default=ingest.DEFAULT_MEMORY_BUDGET_MB,
+                        help="target peak RSS per parser process")
+    parser.add_argument("--commit-rows", type=int, default=ingest.DEFAULT_COMMIT_ROWS)
+    parser.add_argument("--partitioned", action="store_true",
+                        help="create per-month trip tables if the database is new")
+    parser.add_argument("--ignore-watermark", action="store_true",
+                        help="check every row of changed files, not only rows newer than "
+                             "their last load")
+    args = parser.parse_args()
+
+    sources = ingest.resolve_sources(args.patterns, args.months, args.raw_dir)
+    if not sources:
+        parser.error("no input files; pass globs or --months")
+
+    # Schema setup and crash recovery happen before any worker starts
+    conn = ingest.open_for_load(args.db, partitioned=args.partitioned)
+    ingest.recover_partial_loads(conn)
+    already_loaded = ingest.loaded_hashes(conn)
+    conn.close()
+
+    start = time.perf_counter()
+    queue = mp.Queue(maxsize=args.queue_batches)
+    abort = mp.Event()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=ingest._init_worker,
+                             initargs=(queue, abort)) as pool:
+        hashes = dict(zip(sources, pool.map(ingest.file_hash, sources)))
+        # The writer tracks files by content hash, so identical copies load once
+        first_copy = {}
+        for path in sources:
+            first_copy.setdefault(hashes[path], path)
+        pending = []
+        for path in sources:
+            if hashes[path] in already_loaded:
+                print(f"⏭️  {os.path.basename(path)} already loaded, skipping")
+            elif first_copy[hashes[path]] != path:
+                print(f"⏭️  {os.path.basename(path)} has the same contents as "
+                      f"{os.path.basename(first_copy[hashes[path]])}, skipping")
+            else:
+                pending.append(path)
+        if not pending:
+            print("✅ Nothing to load.")
+            return
+
+        print(f"📥 Loading {len(pending)} file(s) with {args.workers} parser(s)")
+        writer = mp.Process(target=ingest.writer_main,
+                            args=(queue, args.db, args.commit_rows, len(pending),
+                                  not args.ignore_watermark))
+        writer.start()
+        zone_ids = quality.known_zone_ids()
+        futures = [pool.submit(ingest.parse_file, path, hashes[path],
+                               args.chunk_rows, args.memory_budget_mb, zone_ids)
+                   for path in pending]
+        # If the writer dies, parsers waiting on the full queue are told to stop
+        running = set(futures)
+        while running:
+            _, running = wait(running, timeout=ingest.PUT_TIMEOUT_S)
+            if not writer.is_alive():
+                abort.set()
+                queue.cancel_join_thread()
+        parsed_rows, failed = 0, 0
+        for path, future in zip(pending, futures):
+            try:
+                parsed_rows += future.result()
+            except ingest.WriterFailed:
+                failed += 1
+            except BrokenProcessPool as e:
+                # The parser died without reporting; tell the writer ourselves
+                try:
+                    ingest.put_message(queue, ('error', hashes[path], path,
+                                               f"parser process died: {e}"), writer.is_alive)
+                except ingest.WriterFailed:
+                    pass
+                failed += 1
+            except Exception:
+                # parse_file already sent an 'error' message for this file
+                failed += 1
+        writer.join()
+
+    if writer.exitcode != 0:
+        # Files it had not finished stay in 'loading' and are rolled back by the next run
+        raise SystemExit(f"❌ The writer process failed (exit code {writer.exitcode}); "
+                         f"re-run to roll back and reload the unfinished files.")
+
+    # Fold the newly loaded months into the rollup cubes
+    conn = ingest.open_for_load(args.db)
+    ranges = rollups.refresh_pending(conn)
+    if ranges and ranges[0][0] is None:
+        print("🧮 Rollups built for all dates")
+    elif ranges:
+        print(f"🧮 Rollups refreshed for {len(ranges)} date range(s) "
+              f"from {ranges[0][0]} to {ranges[-1][1]}")
+    digests = [hashes[path] for path in pending]
+    inserted = conn.execute(
+        f"SELECT COALESCE(SUM(row_count), 0) FROM ingest_manifest WHERE status = 'loaded' "
+        f"AND file_hash IN ({', '.join('?' * len(digests))})", digests).fetchone()[0]
+    conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Inserted {inserted:,} new rows from {len(pending) - failed} file(s) in {elapsed:.1f}s "
+          f"({parsed_rows / elapsed:,.0f} rows/s parsed)."
+          + (f" ❌ {failed} file(s) failed." if failed else ""))
+    if parsed_rows > inserted:
+        print(f"⏭️  {parsed_rows - inserted:,} of {parsed_rows:,} parsed rows were already stored, "
+              f"behind the watermark or rejected.")
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,54 @@
-import pandas as pd
-import sqlite3
+import argparse
 
-# ✅ Path to your CSV file (adjust if needed)
-csv_path = r"C:\Users\Ashwini\urban-mobility-dashboard\data\raw\yellow-tripdata-2023-03.csv"
+import db
+import ingest
+import memory
+import rollups
 
-# ✅ Path to your SQLite database
-db_path = r"C:\Users\Ashwini\urban-mobility-dashboard\db\nyc_mobility.db"
+# ✅ Streams a monthly TLC file (CSV or Parquet) into the 'trips' table in
+# fixed-size chunks, so a full month loads in bounded memory. Re-running it is
+# safe: trips already stored are skipped, not loaded twice.
+parser = argparse.ArgumentParser(description="Load a TLC trip file into the trips table")
+parser.add_argument("path", nargs="?", default="data/raw/yellow-tripdata-2023-03.csv",
+                    help="CSV or Parquet trip file")
+parser.add_argument("--db", default=db.DB_PATH, help="SQLite database path")
+parser.add_argument("--chunk-rows", type=int, default=ingest.DEFAULT_CHUNK_ROWS,
+                    help="rows per chunk / record batch (shrunk to fit the memory budget)")
+parser.add_argument("--memory-budget-mb", type=int, default=ingest.DEFAULT_MEMORY_BUDGET_MB,
+                    help="target peak RSS for the loader process")
+parser.add_argument("--commit-rows", type=int, default=ingest.DEFAULT_COMMIT_ROWS,
+                    help="rows per transaction")
+parser.add_argument("--max-rows", type=int, default=None,
+                    help="stop after this many source rows (default: whole file)")
+parser.add_argument("--partitioned", action="store_true",
+                    help="create per-month trip tables if the database is new")
+parser.add_argument("--ignore-watermark", action="store_true",
+                    help="check every row against the stored trips, not only rows newer than "
+                         "the file's last load (for late-arriving records)")
+args = parser.parse_args()
 
-# ✅ Load the CSV (first 50,000 rows), handle memory warning
-df = pd.read_csv(csv_path, low_memory=False).head(50000)
+# ✅ Connect with bulk-load pragmas (WAL, synchronous=OFF) and ensure schema v2
+conn = ingest.open_for_load(args.db, partitioned=args.partitioned)
 
-# ✅ Select and rename columns to match your trips table schema
-df = df[[
-    'tpep_pickup_datetime',
-    'tpep_dropoff_datetime',
-    'passenger_count',
-    'trip_distance',
-    'fare_amount',
-    'tip_amount',
-    'total_amount',
-    'PULocationID',
-    'DOLocationID'
-]].rename(columns={
-    'tpep_pickup_datetime': 'pickup_datetime',
-    'tpep_dropoff_datetime': 'dropoff_datetime'
-})
+print(f"📥 Loading {args.path}")
+stats = ingest.load_file(conn, args.path, chunk_rows=args.chunk_rows,
+                         memory_budget_mb=args.memory_budget_mb,
+                         commit_rows=args.commit_rows, max_rows=args.max_rows,
+                         use_watermark=not args.ignore_watermark)
 
-# ✅ Connect to the SQLite database
-conn = sqlite3.connect(db_path)
+print(f"✅ Successfully loaded {stats['rows_loaded']:,} new rows into 'trips' table "
+      f"in {stats['seconds']:.1f}s ({stats['rows_per_sec']:,.0f} rows/s read, "
+      f"peak RSS {memory.format_mb(stats['peak_rss_mb'])}).")
+if stats['rows_skipped'] or stats['rows_duplicate']:
+    print(f"⏭️  Skipped {stats['rows_skipped']:,} rows behind the watermark and "
+          f"{stats['rows_duplicate']:,} already-loaded trips.")
+if stats['rows_rejected']:
+    reasons = ", ".join(f"{reason} {n:,}" for reason, n in stats['rejected_reasons'].items())
+    print(f"⚠️  Rejected {stats['rows_rejected']:,} rows failing quality checks ({reasons}); "
+          f"see the trips_quarantine table.")
 
-# ✅ Load data into 'trips' table
-df.to_sql('trips', conn, if_exists='append', index=False)
-
-print(f"✅ Successfully loaded {len(df)} rows into 'trips' table.")
+# ✅ Refresh the rollup cubes for the dates that received rows
+ranges = rollups.refresh_after_load(conn, stats['first_date'], stats['last_date'], stats['dates'])
+if ranges:
+    print(f"🧮 Rollups refreshed for {len(stats['dates'])} date(s).")
 conn.close()
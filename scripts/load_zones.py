@@ -1,36 +1,20 @@
-import pandas as pd
-import sqlite3
+import sys
 
-# ✅ Path to your CSV file (adjust if needed)
-csv_path = r"C:\Users\Ashwini\urban-mobility-dashboard\data\raw\yellow-tripdata-2023-03.csv"
+import db
+import zones
 
-# ✅ Path to your SQLite database
-db_path = r"C:\Users\Ashwini\urban-mobility-dashboard\db\nyc_mobility.db"
+# Loads the TLC zone lookup into the `zones` table, which the dashboard, the
+# EDA scripts and load-time validation read through zones.py
+lookup_path = sys.argv[1] if len(sys.argv) > 1 else zones.LOOKUP_PATH
 
-# ✅ Load the CSV (first 50,000 rows), handle memory warning
-df = pd.read_csv(csv_path, low_memory=False).head(50000)
+# ✅ Load the lookup CSV (LocationID, Borough, Zone, service_zone)
+lookup = zones.read_lookup(lookup_path)
 
-# ✅ Select and rename columns to match your trips table schema
-df = df[[
-    'tpep_pickup_datetime',
-    'tpep_dropoff_datetime',
-    'passenger_count',
-    'trip_distance',
-    'fare_amount',
-    'tip_amount',
-    'total_amount',
-    'PULocationID',
-    'DOLocationID'
-]].rename(columns={
-    'tpep_pickup_datetime': 'pickup_datetime',
-    'tpep_dropoff_datetime': 'dropoff_datetime'
-})
+# ✅ Replace the zones table in one transaction
+conn = db.connect()
+with conn:
+    rows = zones.load_zone_table(conn, lookup)
 
-# ✅ Connect to the SQLite database
-conn = sqlite3.connect(db_path)
-
-# ✅ Load data into 'trips' table
-df.to_sql('trips', conn, if_exists='append', index=False)
-
-print(f"✅ Successfully loaded {len(df)} rows into 'trips' table.")
+boroughs = lookup['Borough'].nunique()
+print(f"✅ Successfully loaded {rows} zones ({boroughs} boroughs) into 'zones' table.")
 conn.close()
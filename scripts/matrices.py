@@ -0,0 +1,161 @@
+import calendar
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import trip_queries as tq
+from zones import ZONE_SLOTS
+
+# --- Dense count/sum matrices over small-integer dimensions ---
+# LocationIDs are 1..265, hours 0..23 and weekdays 0..6, so every grouping
+# the dashboard needs fits in a small dense array indexed directly by those
+# values. Rows come from the rollup cubes (or any frame) and are scattered
+# with np.bincount. Matrices for different months add element-wise, so a
+# date range is built month by month and each month can be cached on its
+# own; zone axes can be sliced or summed by borough with the zone
+# dimension (zones.py).
+
+# Matrix kind -> ((column, size), (column, size))
+KINDS = {
+    'hour_pu': (('hour', 24), ('PULocationID', ZONE_SLOTS)),
+    'od': (('PULocationID', ZONE_SLOTS), ('DOLocationID', ZONE_SLOTS)),
+    'weekday_hour': (('weekday', 7), ('hour', 24)),
+}
+ZONE_COLUMNS = ('PULocationID', 'DOLocationID')
+
+
+class Matrix:
+    # Trip counts and revenue sums over named axes; labels[i] holds the value
+    # each position on axis i stands for
+    def __init__(self, dims, counts, revenue, labels=None):
+        self.dims = tuple(dims)
+        self.counts = counts
+        self.revenue = revenue
+        self.labels = labels or [np.arange(n) for n in counts.shape]
+
+    @classmethod
+    def empty(cls, kind):
+        (d0, n0), (d1, n1) = KINDS[kind]
+        return cls((d0, d1), np.zeros((n0, n1), dtype='int64'), np.zeros((n0, n1)))
+
+    def __add__(self, other):
+        return Matrix(self.dims, self.counts + other.counts, self.revenue + other.revenue,
+                      self.labels)
+
+    def __sizeof__(self):
+        # Lets the result cache account for the arrays
+        return object.__sizeof__(self) + self.counts.nbytes + self.revenue.nbytes
+
+    def take(self, axis, positions):
+        labels = list(self.labels)
+        labels[axis] = labels[axis][positions]
+        return Matrix(self.dims, np.take(self.counts, positions, axis),
+                      np.take(self.revenue, positions, axis), labels)
+
+    def nonzero(self, axis):
+        # Drop positions on axis that have no trips at all
+        other = 1 - axis
+        return self.take(axis, np.flatnonzero(self.counts.sum(axis=other)))
+
+    def top(self, axis, n):
+        # The n busiest positions on axis, busiest first
+        totals = self.counts.sum(axis=1 - axis)
+        return self.take(axis, np.argsort(totals, kind='stable')[::-1][:n])
+
+    def group(self, axis, codes, labels):
+        # Sums positions on axis into groups: position p goes to
+        # codes[labels[axis][p]], and the new axis is labelled by labels
+        groups = codes[self.labels[axis]]
+        totals = []
+        for data in (self.counts, self.revenue):
+            data = np.moveaxis(data, axis, 0)
+            out = np.zeros((len(labels),) + data.shape[1:], dtype=data.dtype)
+            np.add.at(out, groups, data)
+            totals.append(np.moveaxis(out, 0, axis))
+        new_labels = list(self.labels)
+        new_labels[axis] = np.asarray(labels)
+        return Matrix(self.dims, *totals, new_labels)
+
+    def to_frame(self, values='counts', row_labels=None, col_labels=None):
+        data = self.counts if values == 'counts' else self.revenue
+        return pd.DataFrame(data,
+                            index=row_labels if row_labels is not None else self.labels[0],
+                            columns=col_labels if col_labels is not None else self.labels[1])
+
+
+def from_rows(kind, rows, count_col='trips', revenue_col='revenue'):
+    # rows has the two dimension columns plus count/revenue weights per row
+    (d0, n0), (d1, n1) = KINDS[kind]
+    i = _index(rows[d0], n0)
+    j = _index(rows[d1], n1)
+    flat = i * n1 + j
+    size = n0 * n1
+    counts = np.bincount(flat, weights=rows[count_col], minlength=size) if count_col else \
+        np.bincount(flat, minlength=size)
+    revenue = np.bincount(flat, weights=rows[revenue_col].fillna(0), minlength=size) \
+        if revenue_col in rows else np.zeros(size)
+    return Matrix((d0, d1), counts.reshape(n0, n1).astype('int64'), revenue.reshape(n0, n1))
+
+
+def from_trips(kind, trips):
+    # Raw trip frame (e.g. a trip store scan): one count per row
+    return from_rows(kind, trips, count_col=None, revenue_col='total_amount')
+
+
+def _index(values, size):
+    # Missing or out-of-range values land in slot 0
+    idx = pd.to_numeric(values, errors='coerce').fillna(0).to_numpy().astype('int64')
+    return np.where((idx >= 0) & (idx < size), idx, 0)
+
+
+# ---------------- Building from the cubes ----------------
+def month_segments(filters):
+    # The filter split into one copy per calendar month it touches
+    start, end = filters.get('start_date'), filters.get('end_date')
+    if start is None or end is None:
+        return [filters]
+    segments = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        first = max(start, date(year, month, 1))
+        last = min(end, date(year, month, calendar.monthrange(year, month)[1]))
+        segments.append(dict(filters, start_date=first, end_date=last))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return segments
+
+
+def query_matrix(conn, filters, kind):
+    (d0, _), (d1, _) = KINDS[kind]
+    return from_rows(kind, tq.grouped_totals(conn, filters, [d0, d1]))
+
+
+def build(conn, filters, kind, cache=None):
+    # Month-by-month so a changed date range reuses the months it kept
+    total = Matrix.empty(kind)
+    for segment in month_segments(filters):
+        if cache is None:
+            part = query_matrix(conn, segment, kind)
+        else:
+            part = cache.get_or_compute(f'matrix:{kind}', segment,
+                                        lambda: query_matrix(conn, segment, kind))
+        total = total + part
+    return total
+
+
+# ---------------- Boroughs ----------------
+def by_borough(matrix, zone_dim, boroughs):
+    # Keeps only zones in the given boroughs on every zone axis
+    mask = zone_dim.borough_mask(boroughs)
+    for axis, dim in enumerate(matrix.dims):
+        if dim in ZONE_COLUMNS:
+            matrix = matrix.take(axis, np.flatnonzero(mask[matrix.labels[axis]]))
+    return matrix
+
+
+def borough_rollup(matrix, zone_dim):
+    # Every zone axis summed into boroughs (labelled by borough name)
+    for axis, dim in enumerate(matrix.dims):
+        if dim in ZONE_COLUMNS:
+            matrix = matrix.group(axis, zone_dim.borough_codes, zone_dim.borough_list)
+    return matrix
@@ -0,0 +1,35 @@
+import os
+import sys
+
+# --- Process memory ---
+# Resident set size of this process, shared by the loaders, the benchmark and
+# the dashboard profiler. Linux reads /proc; elsewhere psutil is used when it
+# is installed, then the standard library's peak RSS on other Unix systems.
+# Where none of these is available (Windows without psutil) the size is None
+# and callers report it as unknown.
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def format_mb(mb):
+    return "n/a" if mb is None else f"{mb:,.0f} MB"
@@ -0,0 +1,50 @@
+import sys
+import time
+
+import db
+import quality
+import rollups
+import schema
+
+# Upgrades an existing database (db.DB_PATH) from the v1 TEXT-datetime layout to
+# schema v2. Pass --partitioned to split the migrated trips into monthly tables.
+# Pass --quarantine to move trips loaded before quality checks existed and
+# failing them into trips_quarantine (the loaders do this for new rows).
+partitioned = "--partitioned" in sys.argv
+
+# Autocommit connection: migrate_v1 runs its DDL and copy in one explicit
+# transaction and rolls all of it back on failure
+conn = db.connect(isolation_level=None)
+version = schema.schema_version(conn)
+
+if version == 1:
+    start = time.perf_counter()
+    stats = schema.migrate_v1(conn, partitioned=partitioned)
+    print(f"✅ Migrated {stats['copied']:,} of {stats['source_rows']:,} trips to schema "
+          f"v{schema.SCHEMA_VERSION} in {time.perf_counter() - start:.1f}s.")
+    if stats['unparsed']:
+        print(f"⚠️  {stats['unparsed']:,} trips have a pickup or dropoff time that does not "
+              f"parse; they are kept in trips_v1_unparsed.")
+    if stats['duplicates']:
+        print(f"⚠️  {stats['duplicates']:,} trips repeated a stored trip and were merged.")
+    conn.execute("VACUUM")
+elif version == 0:
+    print("❌ No trips table found; run create_tables.py first.")
+elif "--quarantine" not in sys.argv:
+    print(f"✅ Database already at schema v{version}, nothing to do.")
+
+if version >= 1 and "--quarantine" in sys.argv:
+    start = time.perf_counter()
+    with schema.transaction(conn):
+        schema.create_schema(conn)
+        moved = quality.quarantine_stored(conn, quality.known_zone_ids())
+        if moved:
+            schema.refresh_filter_domains(conn)
+            schema.bump_dataset_version(conn)
+            if rollups.rollups_ready(conn):
+                rollups.build_rollups(conn)
+    reasons = ", ".join(f"{reason} {n:,}" for reason, n in moved.items()) or "none failed"
+    print(f"✅ Quarantined {sum(moved.values()):,} stored trips ({reasons}) "
+          f"in {time.perf_counter() - start:.1f}s.")
+
+conn.close()
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import db
+import memory
+
+# --- Dashboard instrumentation ---
+# A Profile collects one rerun's timings: named stages (with RSS before and
+# after), every SQL statement run through the db.py pool (via its query hook)
+# and counters such as result-cache lookups and misses. The thread computing
+# a chart binds the profile (and the chart's name) so queries issued on pool
+# threads land in the right rerun and stage. Finished profiles feed
+# process-wide totals that can be written as JSON lines or as a
+# Prometheus textfile.
+#
+#   DASHBOARD_METRICS_LOG=logs/perf.jsonl    one JSON object per rerun
+#   DASHBOARD_METRICS_PROM=logs/dashboard.prom  totals, rewritten per rerun
+
+METRICS_LOG = os.environ.get("DASHBOARD_METRICS_LOG")
+METRICS_PROM = os.environ.get("DASHBOARD_METRICS_PROM")
+
+# Statements that are bookkeeping rather than chart work
+IGNORED_STATEMENTS = ("PRAGMA", "EXPLAIN")
+SQL_PREVIEW_CHARS = 120
+
+_local = threading.local()
+
+
+class Profile:
+
+    def __init__(self, label="rerun"):
+        self.label = label
+        self.started_at = time.time()
+        self.stages = []
+        self.queries = []
+        self.counters = Counter()
+        self.seconds = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        rss_before = memory.current_rss_mb()
+        start = time.perf_counter()
+        try:
+            with bound(self, name):
+                yield
+        finally:
+            self.add(name, time.perf_counter() - start, rss_before=rss_before, **fields)
+
+    def add(self, name, seconds, rss_before=None, **fields):
+        rss = memory.current_rss_mb()
+        known = rss is not None and rss_before is not None
+        record = {'stage': name, 'seconds': round(seconds, 4),
+                  'rss_mb': None if rss is None else round(rss, 1),
+                  'rss_delta_mb': round(rss - rss_before, 1) if known else None}
+        record.update(fields)
+        with self._lock:
+            self.stages.append(record)
+
+    def mark(self, name):
+        # A point in the rerun, recorded as the time since it started
+        self.add(name, time.perf_counter() - self._start, kind='mark')
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def record_query(self, sql, params, seconds, stage=None):
+        with self._lock:
+            self.queries.append({'stage': stage, 'sql': sql, 'params': list(params),
+                                 'seconds': round(seconds, 4),
+                                 'thread': threading.current_thread().name})
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self._start, 4)
+        return self
+
+    def stage_frame_rows(self):
+        # Stages with the SQL time and statement count attributed to each
+        by_stage = {}
+        for q in self.queries:
+            n, s = by_stage.get(q['stage'], (0, 0.0))
+            by_stage[q['stage']] = (n + 1, s + q['seconds'])
+        rows = []
+        for record in self.stages:
+            n, s = by_stage.get(record['stage'], (0, 0.0))
+            rows.append(dict(record, queries=n, query_s=round(s, 4)))
+        return rows
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'started_at': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            'seconds': self.seconds,
+            'counters': dict(self.counters),
+            'stages': self.stage_frame_rows(),
+            'queries': [dict(q, sql=preview(q['sql'])) for q in self.queries],
+        }
+
+
+def preview(sql):
+    text = " ".join(sql.split())
+    return text if len(text) <= SQL_PREVIEW_CHARS else text[:SQL_PREVIEW_CHARS] + "..."
+
+
+# ---------------- Binding profiles to threads ----------------
+def activate(profile, stage=None):
+    # The script thread's profile for the rest of the rerun
+    _local.profile, _local.stage = profile, stage
+
+
+@contextmanager
+def bound(profile, stage=None):
+    # Pool threads: queries inside the block count toward profile/stage
+    previous = getattr(_local, 'profile', None), getattr(_local, 'stage', None)
+    activate(profile, stage)
+    try:
+        yield profile
+    finally:
+        activate(*previous)
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def _on_query(sql, params, seconds):
+    profile = current()
+    if profile is None or sql.lstrip().upper().startswith(IGNORED_STATEMENTS):
+        return
+    profile.record_query(sql, params, seconds, getattr(_local, 'stage', None))
+
+
+db.add_query_hook(_on_query)
+
+
+def explain(sql, params=(), db_path=None):
+    # EXPLAIN QUERY PLAN rows (id, parent, notused, detail) for a recorded query
+    with db.read_connection(db_path) as conn:
+        return [tuple(row) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+# ---------------- Process-wide totals ----------------
+class Totals:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reruns = 0
+        self.rerun_seconds = 0.0
+        self.stage_seconds = Counter()
+        self.stage_count = Counter()
+        self.query_seconds = 0.0
+        self.query_count = 0
+        self.counters = Counter()
+
+    def observe(self, profile):
+        with self._lock:
+            self.reruns += 1
+            self.rerun_seconds += profile.seconds or 0.0
+            for record in profile.stages:
+                self.stage_seconds[record['stage']] += record['seconds']
+                self.stage_count[record['stage']] += 1
+            self.query_count += len(profile.queries)
+            self.query_seconds += sum(q['seconds'] for q in profile.queries)
+            self.counters.update(profile.counters)
+
+    def prometheus(self):
+        with self._lock:
+            lines = [
+                "# TYPE dashboard_reruns_total counter",
+                f"dashboard_reruns_total {self.reruns}",
+                "# TYPE dashboard_rerun_seconds summary",
+                f"dashboard_rerun_seconds_sum {self.rerun_seconds:.6f}",
+                f"dashboard_rerun_seconds_count {self.reruns}",
+                "# TYPE dashboard_stage_seconds summary",
+            ]
+            for stage in sorted(self.stage_seconds):
+                label = stage.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'dashboard_stage_seconds_sum{{stage="{label}"}} '
+                             f'{self.stage_seconds[stage]:.6f}')
+                lines.append(f'dashboard_stage_seconds_count{{stage="{label}"}} '
+                             f'{self.stage_count[stage]}')
+            lines += [
+                "# TYPE dashboard_query_seconds summary",
+                f"dashboard_query_seconds_sum {self.query_seconds:.6f}",
+                f"dashboard_query_seconds_count {self.query_count}",
+            ]
+            for name in sorted(self.counters):
+                lines.append(f"# TYPE dashboard_{name}_total counter")
+                lines.append(f"dashboard_{name}_total {self.counters[name]}")
+            rss = memory.current_rss_mb()
+            if rss is not None:
+                lines += [
+                    "# TYPE dashboard_rss_bytes gauge",
+                    f"dashboard_rss_bytes {int(rss * 2**20)}",
+                ]
+        return "\n".join(lines) + "\n"
+
+
+TOTALS = Totals()
+
+
+def publish(profile, log_path=METRICS_LOG, prom_path=METRICS_PROM):
+    # Called once per finished rerun
+    TOTALS.observe(profile)
+    if log_path:
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        with open(log_path, "a") as f:
+            f.write(json.dumps(profile.to_dict(), default=str) + "\n")
+    if prom_path:
+        # Written then renamed so a scraper never reads half a file
+        os.makedirs(os.path.dirname(prom_path) or ".", exist_ok=True)
+        tmp = f"{prom_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(TOTALS.prometheus())
+        os.replace(tmp, prom_path)
@@ -0,0 +1,208 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+import db
+import result_cache as rc
+import rollups
+
+# --- Cancellable requests and speculative prefetch ---
+# A Request is one filter state's data work: every query it runs goes through
+# Request.connection(), so cancel() can interrupt the SQLite statements still
+# in flight (sqlite3's interrupt) and refuse new ones. The dashboard cancels a
+# session's previous request as soon as the filters change, so a quickly
+# dragged slider does not leave a queue of superseded chart queries ahead of
+# the current one.
+#
+# After a rerun has drawn its charts, the states a user is likely to ask for
+# next -- the hour slider moved by one, the date range moved by a day, one of
+# the busiest pickup zones on its own -- are computed on a background thread
+# by running the same chart computes with the neighbouring filters bound to
+# the thread. Results land in the shared result cache, so scrubbing a slider
+# mostly reads finished results. Prefetches for states the user did not pick
+# are cancelled by the next rerun; the one they did pick keeps running and
+# the rerun waits on it through the cache's in-flight de-duplication.
+# Without the rollup cubes every state is a set of scans over trips, so
+# prefetching is off until they are built.
+#
+#   DASHBOARD_PREFETCH_STATES=2    neighbouring states per rerun (0 disables)
+
+PREFETCH_STATES = int(os.environ.get("DASHBOARD_PREFETCH_STATES", 2))
+PREFETCH_WORKERS = 1
+TOP_ZONES = 3
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Request:
+
+    def __init__(self, filters):
+        self.filters = filters
+        self.key = rc.filter_key(filters)
+        self.cancelled = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with db.read_connection() as conn:
+            with self._lock:
+                if self.cancelled:
+                    raise Cancelled()
+                self._connections.add(conn)
+            try:
+                yield conn
+            except Exception as e:
+                # An interrupted statement surfaces as whatever the caller's
+                # library wraps it in (sqlite3 or pandas errors)
+                if self.cancelled:
+                    raise Cancelled() from e
+                raise
+            finally:
+                with self._lock:
+                    self._connections.discard(conn)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            for conn in self._connections:
+                conn.interrupt()
+
+
+# ---------------- Binding requests to threads ----------------
+@contextmanager
+def bound(request):
+    # Chart computes on this thread read request.filters instead of the rerun's
+    previous = getattr(_local, 'request', None)
+    _local.request = request
+    try:
+        yield request
+    finally:
+        _local.request = previous
+
+
+def current():
+    return getattr(_local, 'request', None)
+
+
+# ---------------- Neighbouring filter states ----------------
+def _moves(current, previous, steps):
+    # The previous move repeated comes first: a dragged slider keeps going
+    moves = list(steps)
+    if previous is not None:
+        repeat = (current[0] - previous[0], current[1] - previous[1])
+        if any(repeat):
+            moves.insert(0, repeat)
+    return [(current[0] + a, current[1] + b) for a, b in moves]
+
+
+def neighbors(filters, domains, previous=None, zone_choices=()):
+    # Likely next filter states, most likely first; zone_choices are zone_ids
+    # lists (one per busy zone) as the sidebar would produce them. Hour, date
+    # and zone moves are interleaved, starting with whichever the user changed
+    # last, so a small limit still covers each of them.
+    day = timedelta(days=1)
+    unit_steps = [(0, 1), (0, -1), (-1, 0), (1, 0), (1, 1), (-1, -1)]
+    hour_states, date_states, zone_states = [], [], []
+
+    lo, hi = filters['hour_range']
+    previous_hours = previous['hour_range'] if previous else None
+    for a, b in _moves((lo, hi), previous_hours, unit_steps):
+        if 0 <= a <= b <= 23:
+            hour_states.append(dict(filters, hour_range=(a, b)))
+
+    start, end = filters.get('start_date'), filters.get('end_date')
+    previous_days = None
+    if start is not None and end is not None:
+        # Day offsets from the current range; the previous range sits at
+        # previous_days, so repeating its move continues away from it
+        if previous and previous.get('start_date') is not None:
+            previous_days = ((previous['start_date'] - start).days,
+                             (previous['end_date'] - end).days)
+        for a, b in _moves((0, 0), previous_days, unit_steps):
+            first, last = start + a * day, end + b * day
+            if domains['min_date'] <= first <= last <= domains['max_date']:
+                date_states.append(dict(filters, start_date=first, end_date=last))
+
+    for zone_ids in zone_choices:
+        zone_states.append(dict(filters, zone_ids=sorted(int(z) for z in zone_ids)))
+
+    groups = [hour_states, date_states, zone_states]
+    if previous_days is not None and any(previous_days):
+        groups = [date_states, hour_states, zone_states]
+    elif previous and previous.get('zone_ids') != filters.get('zone_ids'):
+        groups = [zone_states, hour_states, date_states]
+    states = [group[i] for i in range(max(map(len, groups))) for group in groups
+              if i < len(group)]
+
+    seen, unique = {rc.filter_key(filters)}, []
+    for state in states:
+        key = rc.filter_key(state)
+        if key not in seen:
+            seen.add(key)
+            unique.append(state)
+    return unique
+
+
+# ---------------- Background prefetch ----------------
+def executor():
+    # One low-priority thread per process, apart from the chart pool
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS,
+                                           thread_name_prefix="prefetch")
+        return _executor
+
+
+def _run(request, computes):
+    with bound(request):
+        for compute in computes:
+            if request.cancelled:
+                return
+            try:
+                compute()
+            except Cancelled:
+                return
+            except Exception:
+                # Speculative: a failing chart fails again, visibly, if the
+                # user does pick this state
+                continue
+
+
+def enabled():
+    if not PREFETCH_STATES:
+        return False
+    with db.read_connection() as conn:
+        return rollups.rollups_ready(conn)
+
+
+def prefetch(states, computes, limit=PREFETCH_STATES):
+    # -> {filter key: (request, future)} for supersede() to cancel later
+    pending = {}
+    for state in states[:limit]:
+        request = Request(state)
+        pending[request.key] = (request, executor().submit(_run, request, computes))
+    return pending
+
+
+def supersede(session, request):
+    # Called once per rerun with the session's state: cancels the previous
+    # rerun's request and prefetches unless they were for these filters
+    previous = session.get('request')
+    if previous is not None and previous.key != request.key:
+        previous.cancel()
+    for key, (pending, future) in session.pop('prefetches', {}).items():
+        if key != request.key:
+            future.cancel()
+            pending.cancel()
+    session['request'] = request
+    return previous
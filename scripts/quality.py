@@ -0,0 +1,158 @@
+import os
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import schema
+import zones
+
+# --- Data-quality checks at load time ---
+# Every chunk coming out of schema.derive_columns() is checked in one
+# vectorized pass before it is inserted. Rows failing any rule go to the
+# trips_quarantine table instead of trips, with the first failed rule as
+# their reason and a bitmask of all failed rules, so KPIs and charts only
+# ever see plausible trips and no dashboard query has to guard against
+# negative fares, infinite speeds, unknown zones or pickups years away from
+# the month the source file covers.
+
+MAX_SPEED_MPH = 100
+MAX_FARE = 1_000
+
+# TLC monthly files carry stray pickups (2002-12-31, 2008, 2088...). Pickups
+# more than PERIOD_TOLERANCE_DAYS outside the month in the file name are
+# rejected; sources without a month in their name are held to the window
+# from FIRST_PICKUP_DATE to PERIOD_TOLERANCE_DAYS from now.
+PERIOD_TOLERANCE_DAYS = 3
+FIRST_PICKUP_DATE = '2009-01-01'  # first month of TLC yellow-taxi records
+SOURCE_MONTH_RE = re.compile(r"(\d{4})-(0[1-9]|1[0-2])(?!\d)")
+
+# Rule -> bit in trips_quarantine.flags; earlier rules win as the reason
+RULES = {
+    'bad_duration': 1,         # dropoff at or before pickup
+    'impossible_speed': 2,     # faster than MAX_SPEED_MPH
+    'negative_fare': 4,        # fare or total below zero (refunds, voids)
+    'absurd_fare': 8,          # fare above MAX_FARE
+    'unknown_zone': 16,        # PU/DO LocationID missing or not in the zone lookup
+    'missing_passengers': 32,  # passenger_count is null
+    'out_of_period': 64,       # pickup outside the source's month (see source_period)
+}
+_REASON_BY_BIT = {bit: name for name, bit in RULES.items()}
+
+QUARANTINE_COLUMNS = ['source', 'reason', 'flags', 'quarantined_at'] + schema.INSERT_COLUMNS
+
+
+def known_zone_ids(db_path=None, lookup_path=zones.LOOKUP_PATH):
+    # Sorted LocationIDs of the zone dimension; None skips the lookup check
+    ids = zones.get(db_path, lookup_path).ids
+    if not len(ids):
+        print(f"⚠️  No zones table or {lookup_path}; LocationIDs are only checked for nulls")
+        return None
+    return ids
+
+
+def source_period(source=None, tolerance_days=PERIOD_TOLERANCE_DAYS):
+    # -> [first, last) pickup_ts (epoch seconds) plausible for a source file,
+    # from the last 'YYYY-MM' in its name
+    months = SOURCE_MONTH_RE.findall(os.path.basename(str(source or '')))
+    tolerance = pd.Timedelta(days=tolerance_days)
+    if months:
+        first = pd.Timestamp(f"{months[-1][0]}-{months[-1][1]}-01")
+        last = first + pd.offsets.MonthBegin(1)
+    else:
+        first = pd.Timestamp(FIRST_PICKUP_DATE)
+        last = pd.Timestamp(datetime.now().date() + timedelta(days=1))
+    epoch = lambda ts: int((ts - pd.Timestamp(0)) // pd.Timedelta(seconds=1))
+    return epoch(first - tolerance), epoch(last + tolerance)
+
+
+def _known(ids, zone_ids):
+    ids = ids.to_numpy(dtype='float64')
+    known = ~np.isnan(ids)
+    if zone_ids is not None:
+        known &= np.isin(ids, zone_ids)
+    return known
+
+
+def rule_masks(trips, zone_ids=None, period=None):
+    # Comparisons with NaN are False, so a null only fails the rules that
+    # are about nulls. period: source_period() of the trips' source.
+    first, last = period or source_period()
+    pickup = trips['pickup_ts'].to_numpy(dtype='float64')
+    duration = trips['trip_duration_mins'].to_numpy(dtype='float64')
+    fare = trips['fare_amount'].to_numpy(dtype='float64')
+    total = trips['total_amount'].to_numpy(dtype='float64')
+    return {
+        'bad_duration': ~(duration > 0),
+        'impossible_speed': trips['speed_mph'].to_numpy(dtype='float64') > MAX_SPEED_MPH,
+        'negative_fare': (fare < 0) | (total < 0),
+        'absurd_fare': fare > MAX_FARE,
+        'unknown_zone': ~(_known(trips['PULocationID'], zone_ids)
+                          & _known(trips['DOLocationID'], zone_ids)),
+        'missing_passengers': np.isnan(trips['passenger_count'].to_numpy(dtype='float64')),
+        'out_of_period': ~((pickup >= first) & (pickup < last)),
+    }
+
+
+def rule_flags(trips, zone_ids=None, period=None):
+    flags = np.zeros(len(trips), dtype='int64')
+    for name, mask in rule_masks(trips, zone_ids, period).items():
+        flags[mask] |= RULES[name]
+    return flags
+
+
+def validate(trips, zone_ids=None, period=None):
+    # -> (clean trips, rejected trips with 'reason' and 'flags' columns)
+    flags = rule_flags(trips, zone_ids, period)
+    bad = flags != 0
+    rejected_flags = flags[bad]
+    # Lowest set bit = first failed rule in RULES order
+    reasons = [_REASON_BY_BIT[bit] for bit in (rejected_flags & -rejected_flags).tolist()]
+    rejected = trips[bad].assign(reason=reasons, flags=rejected_flags)
+    return trips[~bad], rejected
+
+
+def reason_counts(rejected):
+    return rejected['reason'].value_counts().to_dict() if len(rejected) else {}
+
+
+def quarantine(conn, rejected, source=None):
+    # INSERT OR IGNORE on trip_key: re-loading a file quarantines nothing twice
+    if rejected.empty:
+        return 0
+    rows = rejected.assign(source=source,
+                           quarantined_at=datetime.now().isoformat(timespec='seconds'))
+    before = conn.total_changes
+    conn.executemany(
+        f"INSERT OR IGNORE INTO trips_quarantine ({', '.join(QUARANTINE_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(QUARANTINE_COLUMNS))})",
+        zip(*(rows[c].tolist() for c in QUARANTINE_COLUMNS)))
+    return conn.total_changes - before
+
+
+def quarantine_stored(conn, zone_ids=None, batch_rows=200_000):
+    # Applies the rules to trips loaded before validation existed; returns
+    # {reason: rows moved}. Pages by trip_id so deletes never race a cursor.
+    # Their source files are unknown, so pickups get the default window.
+    tables = schema.list_partitions(conn) if schema.is_partitioned(conn) else ['trips']
+    moved = {}
+    columns = ['trip_id'] + schema.INSERT_COLUMNS
+    for table in tables:
+        last_id = 0
+        while True:
+            batch = conn.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE trip_id > ? "
+                                 f"ORDER BY trip_id LIMIT ?", (last_id, batch_rows)).fetchall()
+            if not batch:
+                break
+            frame = pd.DataFrame(batch, columns=columns)
+            last_id = int(frame['trip_id'].iat[-1])
+            _, rejected = validate(frame, zone_ids)
+            if rejected.empty:
+                continue
+            quarantine(conn, rejected, source=table)
+            conn.executemany(f"DELETE FROM {table} WHERE trip_id = ?",
+                             [(i,) for i in rejected['trip_id'].tolist()])
+            for reason, n in reason_counts(rejected).items():
+                moved[reason] = moved.get(reason, 0) + n
+    return moved
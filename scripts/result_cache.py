@@ -0,0 +1,149 @@
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# --- Shared, filter-aware result cache ---
+# Per-chart aggregate results keyed by (chart, canonical filter hash, dataset
+# version). One instance is shared by every Streamlit session; entries are
+# evicted least-recently-used once the byte budget is exceeded. When a newer
+# dataset version is seen, entries whose filter dates overlap the changed
+# dates (or all entries, when the change is not bounded) are dropped and the
+# rest carry over to the new version.
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+
+def filter_key(filters):
+    # Same filter state -> same key, regardless of dict order or date types
+    canonical = json.dumps(filters, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def date_span(filters):
+    # (start_date, end_date) as ISO strings from the first filter dict found
+    if isinstance(filters, dict):
+        if filters.get('start_date') is not None and filters.get('end_date') is not None:
+            return str(filters['start_date']), str(filters['end_date'])
+        return None
+    if isinstance(filters, (list, tuple)):
+        for item in filters:
+            span = date_span(item)
+            if span is not None:
+                return span
+    return None
+
+
+def overlaps(span, ranges):
+    return any(span[0] <= last and first <= span[1] for first, last in ranges)
+
+
+def estimate_bytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v)
+                                          for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.version = None
+        self._entries = OrderedDict()  # key -> (value, size, date span)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> lock held while the value is computed
+        self.hits = self.misses = self.evictions = 0
+
+    def sync_version(self, version, changed=None):
+        # changed: [(first_date, last_date)] modified since self.version, or
+        # None when unknown, which makes every existing entry stale
+        with self._lock:
+            if version == self.version:
+                return
+            kept = OrderedDict()
+            if changed is not None:
+                for (chart, fkey, _), (value, size, span) in self._entries.items():
+                    if span is not None and not overlaps(span, changed):
+                        kept[(chart, fkey, version)] = (value, size, span)
+            self._entries = kept
+            self._bytes = sum(size for _, size, _ in kept.values())
+            self.version = version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key, value, span=None):
+        size = estimate_bytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, span)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, chart, filters, compute, version=None):
+        # Results must be treated as read-only by callers: they are shared
+        if version is not None:
+            self.sync_version(version)
+        key = (chart, filter_key(filters), self.version)
+        value = self.get(key)
+        if value is None:
+            # Charts compute in parallel: callers asking for the same key
+            # wait for the first one instead of repeating the query
+            # (a prefetch of the same filters counts as the first one). A
+            # cancelled compute raises and the next waiter computes instead.
+            with self._lock:
+                flight = self._inflight.setdefault(key, threading.Lock())
+            try:
+                with flight:
+                    value = self._peek(key)
+                    if value is None:
+                        value = compute()
+                        self.put(key, value, date_span(filters))
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is flight:
+                        del self._inflight[key]
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'version': self.version,
+            }
@@ -0,0 +1,198 @@
+from datetime import date, timedelta
+
+import schema
+import sketches
+import timeseries
+
+# --- Pre-aggregated rollup cubes ---
+# trip_rollup holds one row per (date, hour, PULocationID, DOLocationID,
+# passenger_count) with counts and sums; trip_rollup_pu is the same cube with
+# DOLocationID rolled away, which is what most dashboard charts need. Both,
+# and the per-cell sketches in sketches.py, are refreshed per date range when
+# new months are ingested. The zone/hour time series and anomaly flags in
+# timeseries.py are folded forward from the refreshed PU cube.
+
+ROLLUP_TABLE = "trip_rollup"
+PU_ROLLUP_TABLE = "trip_rollup_pu"
+
+# Per-trip tip percentage as the dashboard defines it (0 when fare is 0)
+TIP_PCT_EXPR = ("(CASE WHEN fare_amount != 0 "
+                "THEN COALESCE(tip_amount / fare_amount, 0) ELSE 0 END * 100)")
+
+# Cube measure -> aggregate over raw trips
+MEASURES = {
+    'trips': "COUNT(*)",
+    'fare_sum': "SUM(fare_amount)",
+    'tip_sum': "SUM(tip_amount)",
+    'total_sum': "SUM(total_amount)",
+    'distance_sum': "SUM(trip_distance)",
+    'duration_sum': "SUM(trip_duration_mins)",
+    'no_tip_trips': "SUM(tip_amount = 0)",
+    'tip_pct_sum': f"SUM({TIP_PCT_EXPR})",
+    'speed_sum': "SUM(speed_mph)",
+    'speed_trips': "COUNT(speed_mph)",
+}
+
+# weekday/day_type depend only on the date, so they ride along as attributes
+DIMENSIONS = ['pickup_date', 'hour', 'PULocationID', 'DOLocationID', 'passenger_count']
+PU_DIMENSIONS = ['pickup_date', 'hour', 'PULocationID', 'passenger_count']
+ATTRIBUTES = ['weekday', 'day_type']
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    pickup_date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    PULocationID INTEGER,
+    {extra_dims}passenger_count INTEGER,
+    weekday INTEGER NOT NULL,
+    day_type TEXT NOT NULL,
+    trips INTEGER NOT NULL,
+    fare_sum REAL,
+    tip_sum REAL,
+    total_sum REAL,
+    distance_sum REAL,
+    duration_sum REAL,
+    no_tip_trips INTEGER,
+    tip_pct_sum REAL,
+    speed_sum REAL,
+    speed_trips INTEGER
+)
+"""
+
+
+def create_rollup_tables(conn):
+    conn.execute(ROLLUP_DDL.format(table=ROLLUP_TABLE, extra_dims="DOLocationID INTEGER,\n    "))
+    conn.execute(ROLLUP_DDL.format(table=PU_ROLLUP_TABLE, extra_dims=""))
+    for table in (ROLLUP_TABLE, PU_ROLLUP_TABLE):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_date_hour_pu "
+                     f"ON {table} (pickup_date, hour, PULocationID)")
+
+
+def rollups_ready(conn):
+    try:
+        return schema.get_meta(conn, 'rollups_ready', '0') == '1'
+    except Exception:
+        return False
+
+
+def _date_clause(first_date, last_date):
+    if first_date is None:
+        return "", []
+    return "WHERE pickup_date BETWEEN ? AND ?", [first_date, last_date]
+
+
+def refresh_dates(conn, first_date=None, last_date=None):
+    # Recomputes both cubes for [first_date, last_date]; None means everything
+    where, params = _date_clause(first_date, last_date)
+    dims = ", ".join(DIMENSIONS)
+    pu_dims = ", ".join(PU_DIMENSIONS)
+    attrs = ", ".join(ATTRIBUTES)
+    measures = ", ".join(MEASURES)
+    with schema.transaction(conn):
+        create_rollup_tables(conn)
+        conn.execute(f"DELETE FROM {ROLLUP_TABLE} {where}", params)
+        conn.execute(f"""
+            INSERT INTO {ROLLUP_TABLE} ({dims}, {attrs}, {measures})
+            SELECT {dims}, MIN(weekday), MIN(day_type),
+                   {', '.join(MEASURES.values())}
+            FROM trips {where}
+            GROUP BY {dims}
+        """, params)
+        # The PU cube is a rollup of the rollup, not another pass over trips
+        conn.execute(f"DELETE FROM {PU_ROLLUP_TABLE} {where}", params)
+        conn.execute(f"""
+            INSERT INTO {PU_ROLLUP_TABLE} ({pu_dims}, {attrs}, {measures})
+            SELECT {pu_dims}, MIN(weekday), MIN(day_type),
+                   {', '.join(f'SUM({m})' for m in MEASURES)}
+            FROM {ROLLUP_TABLE} {where}
+            GROUP BY {pu_dims}
+        """, params)
+        # A database built before sketches existed needs them for every date
+        if first_date is None or sketches.sketches_ready(conn):
+            sketches.refresh_sketches(conn, first_date, last_date)
+        else:
+            sketches.refresh_sketches(conn)
+        # Replaying the series can rewrite flags after last_date too
+        flagged = timeseries.refresh_timeseries(conn, first_date)
+        if first_date is not None and flagged is not None:
+            first_date, last_date = min(first_date, flagged[0]), max(last_date, flagged[1])
+        schema.set_meta(conn, 'rollups_ready', 1)
+        schema.bump_dataset_version(conn, first_date, last_date)
+
+
+def build_rollups(conn):
+    refresh_dates(conn)
+    # Also records the sidebar's filter domains for databases loaded before
+    # they were tracked
+    schema.refresh_filter_domains(conn)
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+
+def pending_ranges(conn, pending):
+    # Runs of the dates that received rows from the pending files. Files
+    # loaded before those dates were recorded fall back to their whole span.
+    dates, spans = set(), []
+    for digest, first, last in pending:
+        recorded = [d for (d,) in conn.execute(
+            "SELECT pickup_date FROM ingest_manifest_dates WHERE file_hash = ?", (digest,))]
+        if recorded:
+            dates.update(recorded)
+        elif first is not None:
+            spans.append((first, last))
+    return _merge_ranges(spans + date_runs(dates))
+
+
+def refresh_pending(conn):
+    # Refreshes the dates loaded files added that are not yet in the cubes
+    pending = conn.execute("""
+        SELECT file_hash, first_date, last_date FROM ingest_manifest
+        WHERE status = 'loaded' AND rolled_up = 0
+    """).fetchall()
+    if not pending and rollups_ready(conn):
+        return []
+    digests = [(digest,) for digest, _, _ in pending]
+    with schema.transaction(conn):
+        if not rollups_ready(conn):
+            build_rollups(conn)
+            ranges = [[None, None]]
+        else:
+            ranges = pending_ranges(conn, pending)
+            for first, last in ranges:
+                refresh_dates(conn, first, last)
+        conn.executemany("UPDATE ingest_manifest SET rolled_up = 1 WHERE file_hash = ?", digests)
+        conn.executemany("DELETE FROM ingest_manifest_dates WHERE file_hash = ?", digests)
+    return ranges
+
+
+def date_runs(dates):
+    # Sorted 'YYYY-MM-DD' strings -> [(first, last)] of consecutive days
+    runs = []
+    for day in sorted(date.fromisoformat(d) for d in dates):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [(first.isoformat(), last.isoformat()) for first, last in runs]
+
+
+def refresh_after_load(conn, first_date, last_date, dates=None):
+    # Loaders call this once their rows are committed. With the exact dates
+    # that received rows, only runs of those days are recomputed.
+    if first_date is None:
+        return []
+    if not rollups_ready(conn):
+        build_rollups(conn)
+        return [(None, None)]
+    ranges = date_runs(dates) if dates else [(first_date, last_date)]
+    for first, last in ranges:
+        refresh_dates(conn, first, last)
+    return ranges
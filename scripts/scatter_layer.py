@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+import trip_frames
+
+# --- Bounded scatter plots ---
+# What is sent to the browser depends on how many trips match:
+#   up to EXACT_POINTS        every point
+#   up to DENSITY_ABOVE       a uniform random sample of SAMPLE_POINTS
+#   above that                a DENSITY_BINS x DENSITY_BINS count raster
+# Samples are drawn while streaming two columns from the trip store chunk by
+# chunk and rasters are binned by the store itself (a GROUP BY in SQLite), so
+# neither the server nor the browser ever holds all the points.
+
+EXACT_POINTS = 20_000
+SAMPLE_POINTS = 20_000
+DENSITY_ABOVE = 500_000
+DENSITY_BINS = 200
+
+# Fixed raster extents per column; trips outside are counted, not drawn
+AXIS_RANGES = {
+    'fare_amount': (0, 100),
+    'tip_amount': (0, 25),
+    'trip_distance': (0, 30),
+    'trip_duration_mins': (0, 120),
+}
+
+
+def choose_strategy(n_rows):
+    if n_rows <= EXACT_POINTS:
+        return 'points'
+    if n_rows <= DENSITY_ABOVE:
+        return 'sample'
+    return 'density'
+
+
+def sample_points(chunks, n_rows, size=SAMPLE_POINTS, seed=0):
+    # Bernoulli pass with some headroom, then an exact-size random subset
+    rng = np.random.default_rng(seed)
+    rate = min(1.0, 1.2 * size / max(n_rows, 1))
+    kept = [chunk[rng.random(len(chunk)) < rate] for chunk in chunks]
+    sample = pd.concat(kept, ignore_index=True) if kept else pd.DataFrame()
+    if len(sample) > size:
+        sample = sample.iloc[np.sort(rng.choice(len(sample), size, replace=False))]
+    return sample.reset_index(drop=True)
+
+
+def density_raster(store, filters, x, y, bins=DENSITY_BINS):
+    x_edges = np.linspace(*AXIS_RANGES.get(x, (0, 100)), bins + 1)
+    y_edges = np.linspace(*AXIS_RANGES.get(y, (0, 100)), bins + 1)
+    counts, total = store.histogram2d(x, y, x_edges, y_edges, filters)
+    return {'counts': counts, 'x_edges': x_edges, 'y_edges': y_edges,
+            'total': total, 'outside': total - int(counts.sum())}
+
+
+def scatter_data(store, filters, x, y, n_rows):
+    # n_rows is the number of matching trips (e.g. from the KPI query)
+    strategy = choose_strategy(n_rows)
+    if strategy == 'points':
+        return {'strategy': strategy, 'frame': trip_frames.compact(store.scan([x, y], filters))}
+    if strategy == 'sample':
+        chunks = store.iter_scan([x, y], filters)
+        return {'strategy': strategy, 'frame': trip_frames.compact(sample_points(chunks, n_rows))}
+    return dict(density_raster(store, filters, x, y), strategy=strategy)
+
+
+def scatter_figure(data, x, y, title, labels, opacity=None):
+    import plotly.express as px
+    if data['strategy'] != 'density':
+        if data['strategy'] == 'sample':
+            title = f"{title} (random sample of {len(data['frame']):,})"
+        return px.scatter(data['frame'], x=x, y=y, title=title, labels=labels, opacity=opacity)
+    x_mid = (data['x_edges'][:-1] + data['x_edges'][1:]) / 2
+    y_mid = (data['y_edges'][:-1] + data['y_edges'][1:]) / 2
+    # log1p keeps sparse tails visible next to the dense core
+    fig = px.imshow(np.log1p(data['counts'].T), x=x_mid, y=y_mid, origin='lower',
+                    aspect='auto', color_continuous_scale='Viridis',
+                    labels={'x': labels.get(x, x), 'y': labels.get(y, y), 'color': 'log(1 + trips)'},
+                    title=f"{title} (density of {data['total']:,} trips)")
+    if data['outside']:
+        fig.add_annotation(text=f"{data['outside']:,} trips outside the plotted range",
+                           xref='paper', yref='paper', x=1, y=1.02, showarrow=False)
+    return fig
@@ -0,0 +1,619 @@
+import re
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# --- Trips schema v2 ---
+# Timestamps are stored as integer epoch seconds (the naive TLC local time
+# encoded as if it were UTC) and every column the dashboard derives is
+# materialized once at load time instead of on every cold start.
+
+SCHEMA_VERSION = 2
+
+# Columns written by the loaders, in insert order
+TRIP_COLUMNS = [
+    'pickup_ts',
+    'dropoff_ts',
+    'pickup_date',
+    'hour',
+    'weekday',
+    'day_type',
+    'passenger_count',
+    'trip_distance',
+    'fare_amount',
+    'tip_amount',
+    'total_amount',
+    'PULocationID',
+    'DOLocationID',
+    'trip_duration_mins',
+    'speed_mph',
+    'fare_per_mile',
+]
+
+# Every stored source field of a trip: two loads of the same TLC record get the
+# same trip_key, a 64-bit fingerprint of these, which is unique per table.
+# Collisions between distinct trips are ~n^2/2^65 (about 1 in 3,700 at 100M
+# rows) and would drop one of the two rows.
+KEY_COLUMN = 'trip_key'
+NATURAL_KEY = [
+    'pickup_ts',
+    'dropoff_ts',
+    'PULocationID',
+    'DOLocationID',
+    'passenger_count',
+    'trip_distance',
+    'fare_amount',
+    'tip_amount',
+    'total_amount',
+]
+INSERT_COLUMNS = TRIP_COLUMNS + [KEY_COLUMN]
+
+TRIPS_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    trip_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pickup_ts INTEGER NOT NULL,
+    dropoff_ts INTEGER NOT NULL,
+    pickup_date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    weekday INTEGER NOT NULL,
+    day_type TEXT NOT NULL,
+    passenger_count INTEGER,
+    trip_distance REAL,
+    fare_amount REAL,
+    tip_amount REAL,
+    total_amount REAL,
+    PULocationID INTEGER,
+    DOLocationID INTEGER,
+    trip_duration_mins REAL,
+    speed_mph REAL,
+    fare_per_mile REAL,
+    trip_key INTEGER,
+    FOREIGN KEY(PULocationID) REFERENCES zones(LocationID),
+    FOREIGN KEY(DOLocationID) REFERENCES zones(LocationID)
+)
+"""
+
+ZONES_DDL = """
+CREATE TABLE IF NOT EXISTS zones (
+    LocationID INTEGER PRIMARY KEY,
+    Borough TEXT,
+    Zone TEXT,
+    service_zone TEXT
+)
+"""
+
+META_DDL = """
+CREATE TABLE IF NOT EXISTS dataset_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+)
+"""
+
+# One row per ingested source file; ingest_batches records the trip_id range
+# of every insert so a file that failed mid-load can be rolled back exactly
+MANIFEST_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    file_hash TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    row_count INTEGER,
+    loaded_at TEXT,
+    first_date TEXT,
+    last_date TEXT,
+    rolled_up INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# Columns added to ingest_manifest after it was first released
+MANIFEST_ADDED_COLUMNS = {
+    'first_date': "TEXT",
+    'last_date': "TEXT",
+    'rolled_up': "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Pickup dates that received rows from each loaded file, kept until the file
+# is folded into the rollups so only those dates are refreshed
+MANIFEST_DATES_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_manifest_dates (
+    file_hash TEXT NOT NULL,
+    pickup_date TEXT NOT NULL,
+    PRIMARY KEY (file_hash, pickup_date)
+)
+"""
+
+# Per source file: the latest pickup loaded from it and that trip's key. A
+# re-run of the source skips rows older than max_pickup_ts.
+WATERMARKS_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_watermarks (
+    source TEXT PRIMARY KEY,
+    max_pickup_ts INTEGER NOT NULL,
+    max_trip_key INTEGER NOT NULL,
+    rows_loaded INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+)
+"""
+
+# Date range touched by each dataset version (NULLs: everything), so caches
+# can drop only the entries that overlap a change
+CHANGES_DDL = """
+CREATE TABLE IF NOT EXISTS dataset_changes (
+    version INTEGER PRIMARY KEY,
+    first_date TEXT,
+    last_date TEXT
+)
+"""
+CHANGES_KEPT = 1000
+
+# Trips rejected by quality.validate(), with the first failed rule as reason
+# and every failed rule in the flags bitmask
+QUARANTINE_DDL = """
+CREATE TABLE IF NOT EXISTS trips_quarantine (
+    quarantine_id INTEGER PRIMARY KEY,
+    source TEXT,
+    reason TEXT NOT NULL,
+    flags INTEGER NOT NULL,
+    quarantined_at TEXT,
+    pickup_ts INTEGER,
+    dropoff_ts INTEGER,
+    pickup_date TEXT,
+    hour INTEGER,
+    weekday INTEGER,
+    day_type TEXT,
+    passenger_count INTEGER,
+    trip_distance REAL,
+    fare_amount REAL,
+    tip_amount REAL,
+    total_amount REAL,
+    PULocationID INTEGER,
+    DOLocationID INTEGER,
+    trip_duration_mins REAL,
+    speed_mph REAL,
+    fare_per_mile REAL,
+    trip_key INTEGER UNIQUE
+)
+"""
+
+BATCHES_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_batches (
+    file_hash TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL
+)
+"""
+
+PARTITION_RE = re.compile(r"^trips_(\d{4})_(\d{2})$")
+
+
+# ---------------- Transactions ----------------
+@contextmanager
+def transaction(conn):
+    # Joins the caller's transaction if there is one, otherwise opens its own.
+    # Needs a connection opened with isolation_level=None so DDL inside the
+    # block is rolled back with everything else.
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# ---------------- Metadata ----------------
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM dataset_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO dataset_meta (key, value) VALUES (?, ?)",
+                 (key, str(value)))
+
+
+def dataset_version(conn):
+    # Bumped whenever trips or rollups change; caches key their entries on it
+    try:
+        return int(get_meta(conn, 'dataset_version', 0))
+    except sqlite3.OperationalError:
+        return 0
+
+
+def bump_dataset_version(conn, first_date=None, last_date=None):
+    # first_date/last_date bound the pickup dates that changed; None: unknown
+    version = dataset_version(conn) + 1
+    set_meta(conn, 'dataset_version', version)
+    conn.execute(CHANGES_DDL)
+    conn.execute("INSERT OR REPLACE INTO dataset_changes VALUES (?, ?, ?)",
+                 (version, first_date, last_date))
+    conn.execute("DELETE FROM dataset_changes WHERE version <= ?", (version - CHANGES_KEPT,))
+    return version
+
+
+def changed_ranges(conn, since_version):
+    # [(first_date, last_date)] changed after since_version, or None when any
+    # change in between is unbounded or no longer recorded
+    if since_version is None:
+        return None
+    try:
+        rows = conn.execute("SELECT version, first_date, last_date FROM dataset_changes "
+                            "WHERE version > ? ORDER BY version", (since_version,)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    if len(rows) != dataset_version(conn) - since_version:
+        return None
+    if any(first is None or last is None for _, first, last in rows):
+        return None
+    return [(first, last) for _, first, last in rows]
+
+
+# ---------------- Filter domains ----------------
+# The sidebar's date bounds, passenger maximum and pickup zones are kept in
+# dataset_meta so the dashboard can draw its filters without scanning trips.
+# Inserts only ever widen them; refresh_filter_domains() recomputes them
+# after rows are deleted.
+DOMAIN_KEYS = ('domain_min_date', 'domain_max_date', 'domain_max_passengers', 'domain_zone_ids')
+
+
+def read_filter_domains(conn):
+    # None when the domains were never recorded (databases loaded earlier)
+    try:
+        min_date, max_date, max_passengers, zone_ids = [get_meta(conn, k) for k in DOMAIN_KEYS]
+    except sqlite3.OperationalError:
+        return None
+    if min_date is None or max_date is None:
+        return None
+    return {
+        'min_date': min_date,
+        'max_date': max_date,
+        'max_passengers': int(max_passengers or 0),
+        'zone_ids': [int(z) for z in (zone_ids or '').split(',') if z],
+    }
+
+
+def scan_filter_domains(conn):
+    min_date, max_date, max_passengers = conn.execute(
+        "SELECT MIN(pickup_date), MAX(pickup_date), MAX(passenger_count) FROM trips"
+    ).fetchone()
+    zone_ids = [row[0] for row in conn.execute(
+        "SELECT DISTINCT PULocationID FROM trips WHERE PULocationID IS NOT NULL")]
+    return {
+        'min_date': min_date,
+        'max_date': max_date,
+        'max_passengers': int(max_passengers or 0),
+        'zone_ids': sorted(int(z) for z in zone_ids),
+    }
+
+
+def write_filter_domains(conn, domains):
+    values = [domains['min_date'], domains['max_date'], domains['max_passengers'],
+              ",".join(str(z) for z in sorted(domains['zone_ids']))]
+    for key, value in zip(DOMAIN_KEYS, values):
+        set_meta(conn, key, value)
+
+
+def extend_filter_domains(conn, trips):
+    # Widens the recorded domains by one inserted chunk (derive_columns() output)
+    if trips.empty:
+        return
+    old = read_filter_domains(conn)
+    if old is None:
+        # First insert since domains were tracked: one scan covers earlier
+        # rows and this chunk alike
+        refresh_filter_domains(conn)
+        return
+    passengers = trips['passenger_count'].max()
+    zones = pd.unique(trips['PULocationID'].dropna()).astype(int).tolist()
+    write_filter_domains(conn, {
+        'min_date': min(old['min_date'], trips['pickup_date'].min()),
+        'max_date': max(old['max_date'], trips['pickup_date'].max()),
+        'max_passengers': max(old['max_passengers'], 0 if pd.isna(passengers) else int(passengers)),
+        'zone_ids': set(old['zone_ids']).union(zones),
+    })
+
+
+def refresh_filter_domains(conn):
+    write_filter_domains(conn, scan_filter_domains(conn))
+
+
+def is_partitioned(conn):
+    return get_meta(conn, 'partitioned', '0') == '1'
+
+
+# ---------------- DDL ----------------
+def add_missing_columns(conn, table, columns):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def create_indexes(conn, table='trips'):
+    # Date/hour/zone filters seek on the composite index; dropoff charts on
+    # DOLocationID. Returns the duplicate rows removed by the trip_key index.
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_date_hour_pu "
+                 f"ON {table} (pickup_date, hour, PULocationID)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_do ON {table} (DOLocationID)")
+    return create_key_index(conn, table)
+
+
+def create_key_index(conn, table):
+    # Returns the number of duplicate rows removed to make trip_key unique
+    removed = 0
+    try:
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_key ON {table} (trip_key)")
+    except sqlite3.IntegrityError:
+        removed = conn.execute(f"""
+            DELETE FROM {table} WHERE trip_key IS NOT NULL AND trip_id NOT IN (
+                SELECT MIN(trip_id) FROM {table} GROUP BY trip_key)
+        """).rowcount
+        conn.execute(f"CREATE UNIQUE INDEX idx_{table}_key ON {table} (trip_key)")
+    return removed
+
+
+def add_trip_keys(conn, table, batch_rows=200_000):
+    # Upgrades a table loaded before trip_key existed: fingerprints every row,
+    # then drops duplicates while building the unique index
+    if KEY_COLUMN in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+        return 0
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN trip_key INTEGER")
+    cursor = conn.execute(f"SELECT trip_id, {', '.join(NATURAL_KEY)} FROM {table}")
+    while True:
+        batch = cursor.fetchmany(batch_rows)
+        if not batch:
+            break
+        frame = pd.DataFrame(batch, columns=['trip_id'] + NATURAL_KEY)
+        conn.executemany(f"UPDATE {table} SET trip_key = ? WHERE trip_id = ?",
+                         zip(trip_keys(frame).tolist(), frame['trip_id'].tolist()))
+    return create_key_index(conn, table)
+
+
+def create_schema(conn, partitioned=False, with_indexes=True):
+    # Returns the number of duplicate trips removed while adding trip keys
+    conn.execute(ZONES_DDL)
+    conn.execute(META_DDL)
+    conn.execute(MANIFEST_DDL)
+    add_missing_columns(conn, 'ingest_manifest', MANIFEST_ADDED_COLUMNS)
+    conn.execute(MANIFEST_DATES_DDL)
+    conn.execute(BATCHES_DDL)
+    conn.execute(WATERMARKS_DDL)
+    conn.execute(CHANGES_DDL)
+    conn.execute(QUARANTINE_DDL)
+    if get_meta(conn, 'partitioned') is not None:
+        partitioned = is_partitioned(conn)
+    set_meta(conn, 'schema_version', SCHEMA_VERSION)
+    set_meta(conn, 'partitioned', int(partitioned))
+    removed = 0
+    if partitioned:
+        for table in list_partitions(conn):
+            removed += add_trip_keys(conn, table)
+        rebuild_trips_view(conn)
+    else:
+        conn.execute(TRIPS_DDL.format(table='trips'))
+        removed += add_trip_keys(conn, 'trips')
+        if with_indexes:
+            create_indexes(conn, 'trips')
+    return removed
+
+
+def partition_name(month):
+    # month is 'YYYY-MM'
+    return "trips_" + month.replace('-', '_')
+
+
+def list_partitions(conn):
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'trips\\_%' ESCAPE '\\'"
+    ).fetchall()
+    return sorted(name for (name,) in rows if PARTITION_RE.match(name))
+
+
+def rebuild_trips_view(conn):
+    # `trips` is a UNION ALL view over the monthly tables; SQLite pushes the
+    # WHERE clause into each branch so every partition still uses its index
+    conn.execute("DROP VIEW IF EXISTS trips")
+    partitions = list_partitions(conn)
+    if partitions:
+        conn.execute("DROP TABLE IF EXISTS trips_empty")
+    else:
+        # Empty placeholder with the right columns so queries work before the first load
+        conn.execute(TRIPS_DDL.format(table='trips_empty'))
+        partitions = ['trips_empty']
+    body = "\nUNION ALL\n".join(f"SELECT * FROM {name}" for name in partitions)
+    conn.execute(f"CREATE VIEW trips AS\n{body}")
+
+
+def ensure_partition(conn, month):
+    table = partition_name(month)
+    if table not in list_partitions(conn):
+        conn.execute(TRIPS_DDL.format(table=table))
+        create_indexes(conn, table)
+        rebuild_trips_view(conn)
+    return table
+
+
+# ---------------- Derived columns ----------------
+def derive_columns(df):
+    # Expects pickup_datetime/dropoff_datetime plus the seven raw trip columns
+    pickup = pd.to_datetime(df['pickup_datetime'], errors='coerce')
+    dropoff = pd.to_datetime(df['dropoff_datetime'], errors='coerce')
+    # Rows without both timestamps cannot be placed in time at all
+    keep = (pickup.notna() & dropoff.notna()).to_numpy()
+    df, pickup, dropoff = df[keep], pickup[keep], dropoff[keep]
+
+    duration_mins = (dropoff - pickup).dt.total_seconds() / 60
+    distance = df['trip_distance'].astype('float64')
+    fare = df['fare_amount'].astype('float64')
+    weekday = pickup.dt.weekday
+
+    trips = pd.DataFrame({
+        'pickup_ts': (pickup - pd.Timestamp(0)) // pd.Timedelta(seconds=1),
+        'dropoff_ts': (dropoff - pd.Timestamp(0)) // pd.Timedelta(seconds=1),
+        'pickup_date': pickup.dt.strftime('%Y-%m-%d'),
+        'hour': pickup.dt.hour,
+        'weekday': weekday,
+        'day_type': np.where(weekday >= 5, 'Weekend', 'Weekday'),
+        'passenger_count': df['passenger_count'].astype('float64'),
+        'trip_distance': distance,
+        'fare_amount': fare,
+        'tip_amount': df['tip_amount'].astype('float64'),
+        'total_amount': df['total_amount'].astype('float64'),
+        'PULocationID': df['PULocationID'],
+        'DOLocationID': df['DOLocationID'],
+        'trip_duration_mins': duration_mins,
+        'speed_mph': distance / (duration_mins / 60).where(duration_mins != 0),
+        'fare_per_mile': fare / distance.where(distance != 0),
+    }, index=df.index)
+    trips[KEY_COLUMN] = trip_keys(trips)
+    return trips[INSERT_COLUMNS]
+
+
+def trip_keys(trips):
+    # Same float64 representation whether the values come from a source file
+    # or back out of SQLite, so the fingerprint is stable across both
+    values = trips[NATURAL_KEY].astype('float64')
+    return pd.util.hash_pandas_object(values, index=False).to_numpy().view('int64')
+
+
+def _rows(df, columns):
+    # tolist() hands sqlite3 native Python values; NaN is stored as NULL
+    return zip(*(df[c].tolist() for c in columns))
+
+
+def _last_id(conn, table):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    return row[0] if row else 0
+
+
+def _insert(conn, table, trips, on_insert, dates):
+    # Trips already stored (same trip_key) are skipped; returns rows inserted
+    columns = ", ".join(INSERT_COLUMNS)
+    placeholders = ", ".join("?" * len(INSERT_COLUMNS))
+    first_id = _last_id(conn, table) + 1 if on_insert else None
+    inserted = 0
+    for date, part in trips.groupby('pickup_date', sort=False):
+        before = conn.total_changes
+        conn.executemany(f"INSERT OR IGNORE INTO {table} ({columns}) VALUES ({placeholders})",
+                         _rows(part, INSERT_COLUMNS))
+        added = conn.total_changes - before
+        if added and dates is not None:
+            dates.add(date)
+        inserted += added
+    if on_insert and inserted:
+        # AUTOINCREMENT ids are contiguous because there is only one writer
+        on_insert(table, first_id, _last_id(conn, table))
+    return inserted
+
+
+def insert_trips(conn, trips, on_insert=None, dates=None):
+    # trips is the output of derive_columns(); routes rows to month partitions.
+    # on_insert(table, first_id, last_id) is called after each insert; the
+    # pickup dates that received new rows are added to the dates set.
+    if not is_partitioned(conn):
+        inserted = _insert(conn, 'trips', trips, on_insert, dates)
+    else:
+        inserted = 0
+        for month, part in trips.groupby(trips['pickup_date'].str[:7]):
+            inserted += _insert(conn, ensure_partition(conn, month), part, on_insert, dates)
+    if inserted:
+        extend_filter_domains(conn, trips)
+    return inserted
+
+
+# ---------------- Migration from v1 ----------------
+V1_COLUMNS = [
+    'pickup_datetime',
+    'dropoff_datetime',
+    'passenger_count',
+    'trip_distance',
+    'fare_amount',
+    'tip_amount',
+    'total_amount',
+    'PULocationID',
+    'DOLocationID',
+]
+
+
+# v1 rows whose pickup or dropoff time does not parse, kept by migrate_v1
+# instead of being dropped with trips_v1
+V1_UNPARSED_DDL = """
+CREATE TABLE IF NOT EXISTS trips_v1_unparsed (
+    trip_id INTEGER PRIMARY KEY,
+    pickup_datetime TEXT,
+    dropoff_datetime TEXT,
+    passenger_count INTEGER,
+    trip_distance REAL,
+    fare_amount REAL,
+    tip_amount REAL,
+    total_amount REAL,
+    PULocationID INTEGER,
+    DOLocationID INTEGER
+)
+"""
+
+
+def schema_version(conn):
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+    if 'trips_v1' in tables:
+        # A v1 migration that did not finish: the source rows are still there
+        return 1
+    if 'dataset_meta' in tables and get_meta(conn, 'schema_version') is not None:
+        return int(get_meta(conn, 'schema_version'))
+    if 'trips' in tables:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(trips)")}
+        return 1 if 'pickup_datetime' in columns else SCHEMA_VERSION
+    return 0
+
+
+def migrate_v1(conn, partitioned=False, batch_rows=200_000):
+    # Copies v1 rows into the v2 layout in one transaction, DDL included, so a
+    # failure leaves the v1 table as it was. Indexes are built after the copy
+    # because bulk-loading into an unindexed table is faster. A database left
+    # with trips_v1 by an interrupted migration resumes from it: trip keys keep
+    # rows already copied from being copied twice.
+    # Returns the v1 row count and how many rows were copied, kept in
+    # trips_v1_unparsed (timestamps that do not parse) or merged as duplicates.
+    if conn.isolation_level is not None:
+        raise ValueError("migrate_v1 needs a connection opened with isolation_level=None")
+    with transaction(conn):
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+        if 'trips_v1' not in tables:
+            conn.execute("ALTER TABLE trips RENAME TO trips_v1")
+        create_schema(conn, partitioned=partitioned, with_indexes=False)
+        conn.execute(V1_UNPARSED_DDL)
+        stats = {'source_rows': conn.execute("SELECT COUNT(*) FROM trips_v1").fetchone()[0],
+                 'copied': 0, 'unparsed': 0, 'duplicates': 0}
+        columns = ['trip_id'] + V1_COLUMNS
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM trips_v1 ORDER BY trip_id")
+        while True:
+            batch = cursor.fetchmany(batch_rows)
+            if not batch:
+                break
+            frame = pd.DataFrame(batch, columns=columns)
+            trips = derive_columns(frame[V1_COLUMNS])
+            unparsed = frame[~frame.index.isin(trips.index)]
+            if len(unparsed):
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO trips_v1_unparsed ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    unparsed.astype(object).where(unparsed.notna(), None).itertuples(index=False))
+            copied = insert_trips(conn, trips)
+            stats['copied'] += copied
+            stats['unparsed'] += len(unparsed)
+            # Rows whose trip key is already stored: repeats within v1, or
+            # rows an interrupted run copied before
+            stats['duplicates'] += len(trips) - copied
+        if not is_partitioned(conn):
+            # Unpartitioned, the key index is built after the copy and
+            # removes the repeats then
+            removed = create_indexes(conn, 'trips')
+            stats['copied'] -= removed
+            stats['duplicates'] += removed
+        conn.execute("DROP TABLE trips_v1")
+        bump_dataset_version(conn)
+    return stats
@@ -0,0 +1,196 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+# --- Mergeable quantile sketches and fixed-bin histograms ---
+# Stored per (pickup_date, hour, PULocationID, passenger_count) cell, the same
+# grain as the sidebar filters, so any filter combination is answered by
+# merging cells instead of reading raw trips.
+#
+# Quantile sketches are DDSketch-style log buckets: a value x with
+# |x| >= MIN_VALUE lands in bucket ceil(log_gamma |x|), and every bucket is
+# reported as a value within a relative error ALPHA of everything in it.
+# Merging sketches is adding bucket counts, so a merged quantile is within
+# ALPHA (0.5%) of the exact answer. |x| < MIN_VALUE collapses to 0.
+# Histograms use fixed bin edges plus underflow/overflow bins; merged counts
+# are exact at the bin width.
+
+SKETCH_TABLE = "trip_sketch"
+
+ALPHA = 0.005
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+LOG_GAMMA = math.log(GAMMA)
+MIN_VALUE = 0.01
+MAX_VALUE = 1e6
+_FIRST_INDEX = math.ceil(math.log(MIN_VALUE) / LOG_GAMMA)
+_BUCKETS = math.ceil(math.log(MAX_VALUE) / LOG_GAMMA) - _FIRST_INDEX + 1
+# Slot layout: negative buckets (mirrored), one zero slot, positive buckets
+ZERO_SLOT = _BUCKETS
+QUANTILE_SLOTS = 2 * _BUCKETS + 1
+
+HISTOGRAM_EDGES = {
+    'fare_per_mile': np.arange(0, 30.5, 0.5),
+    'speed_mph': np.arange(0, 81, 1.0),
+}
+
+# Sketch column -> (trips column, kind)
+SKETCHES = {
+    'fare': ('fare_amount', 'quantile'),
+    'fare_per_mile': ('fare_per_mile', 'quantile'),
+    'fare_per_mile_hist': ('fare_per_mile', 'histogram'),
+    'speed_hist': ('speed_mph', 'histogram'),
+}
+
+CELL_KEYS = ['pickup_date', 'hour', 'PULocationID', 'passenger_count']
+
+# Sparse cell encoding: (slot, count) records, 6 bytes each
+SLOT_DTYPE = np.dtype([('slot', '<u2'), ('count', '<u4')])
+
+SKETCH_DDL = """
+CREATE TABLE IF NOT EXISTS trip_sketch (
+    pickup_date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    PULocationID INTEGER,
+    passenger_count INTEGER,
+    fare BLOB,
+    fare_per_mile BLOB,
+    fare_per_mile_hist BLOB,
+    speed_hist BLOB
+)
+"""
+
+
+# ---------------- Slot mapping ----------------
+def quantile_slots(values):
+    # NaN maps to -1 and is dropped by the callers
+    values = np.asarray(values, dtype='float64')
+    magnitude = np.abs(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.ceil(np.log(np.maximum(magnitude, MIN_VALUE)) / LOG_GAMMA) - _FIRST_INDEX
+    index = np.clip(np.nan_to_num(index), 0, _BUCKETS - 1).astype('int64')
+    slots = np.where(values > 0, ZERO_SLOT + 1 + index, ZERO_SLOT - 1 - index)
+    slots = np.where(magnitude < MIN_VALUE, ZERO_SLOT, slots)
+    return np.where(np.isnan(values), -1, slots)
+
+
+def slot_values(slots):
+    # Representative value of each quantile slot (midpoint in log space)
+    slots = np.asarray(slots, dtype='int64')
+    index = np.abs(slots - ZERO_SLOT) - 1 + _FIRST_INDEX
+    magnitude = 2 * np.power(GAMMA, index) / (GAMMA + 1)
+    return np.where(slots == ZERO_SLOT, 0.0, np.sign(slots - ZERO_SLOT) * magnitude)
+
+
+def histogram_slots(values, edges):
+    # 0 = underflow, 1..len(edges)-1 = bins, len(edges) = overflow
+    values = np.asarray(values, dtype='float64')
+    slots = np.searchsorted(edges, values, side='right')
+    return np.where(np.isnan(values), -1, slots)
+
+
+def slot_count(name):
+    column, kind = SKETCHES[name]
+    return QUANTILE_SLOTS if kind == 'quantile' else len(HISTOGRAM_EDGES[column]) + 1
+
+
+def slots_for(name, values):
+    column, kind = SKETCHES[name]
+    if kind == 'quantile':
+        return quantile_slots(values)
+    return histogram_slots(values, HISTOGRAM_EDGES[column])
+
+
+# ---------------- Reading merged sketches ----------------
+def quantile(counts, q):
+    total = counts.sum()
+    if total == 0:
+        return float('nan')
+    slot = int(np.searchsorted(np.cumsum(counts), q * (total - 1), side='right'))
+    return float(slot_values([slot])[0])
+
+
+def histogram_frame(counts, column):
+    edges = HISTOGRAM_EDGES[column]
+    return pd.DataFrame({
+        'bin_start': edges[:-1],
+        'bin_end': edges[1:],
+        'count': counts[1:len(edges)].astype('int64'),
+    })
+
+
+def merge_blobs(blobs, size, groups=None, n_groups=1):
+    # One bincount over every cell's records; groups splits the result by row
+    blobs = [b or b"" for b in blobs]
+    records = np.frombuffer(b"".join(blobs), dtype=SLOT_DTYPE)
+    slots = records['slot'].astype('int64')
+    if groups is not None:
+        lengths = np.fromiter((len(b) // SLOT_DTYPE.itemsize for b in blobs), 'int64', len(blobs))
+        slots = slots + np.repeat(np.asarray(groups, dtype='int64'), lengths) * size
+    merged = np.bincount(slots, weights=records['count'], minlength=size * n_groups)
+    return merged.reshape(n_groups, size) if groups is not None else merged
+
+
+# ---------------- Building ----------------
+def sketches_ready(conn):
+    try:
+        return schema.get_meta(conn, 'sketches_ready', '0') == '1'
+    except Exception:
+        return False
+
+
+def encode_cells(cell_ids, slots, n_cells, size):
+    # Sparse (slot, count) records per cell from per-trip cell ids and slots
+    valid = slots >= 0
+    combined = cell_ids[valid] * size + slots[valid]
+    unique, counts = np.unique(combined, return_counts=True)
+    records = np.empty(len(unique), dtype=SLOT_DTYPE)
+    records['slot'] = unique % size
+    records['count'] = counts
+    bounds = np.searchsorted(unique // size, np.arange(n_cells + 1))
+    return [records[bounds[i]:bounds[i + 1]].tobytes() for i in range(n_cells)]
+
+
+def build_cells(trips):
+    # trips holds CELL_KEYS plus the sketched columns for one or more days
+    cell_ids = trips.groupby(CELL_KEYS, dropna=False, sort=False).ngroup().to_numpy()
+    cells = trips[CELL_KEYS].drop_duplicates().reset_index(drop=True)
+    # drop_duplicates keeps first occurrences, which is ngroup's sort=False order
+    n_cells = len(cells)
+    for name, (column, _) in SKETCHES.items():
+        cells[name] = encode_cells(cell_ids, slots_for(name, trips[column]), n_cells,
+                                   slot_count(name))
+    return cells
+
+
+def create_sketch_table(conn):
+    conn.execute(SKETCH_DDL)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{SKETCH_TABLE}_date_hour_pu "
+                 f"ON {SKETCH_TABLE} (pickup_date, hour, PULocationID)")
+
+
+def refresh_sketches(conn, first_date=None, last_date=None):
+    # Rebuilds [first_date, last_date] one pickup_date at a time so memory stays
+    # bounded. Runs inside the rollup refresh transaction.
+    where, params = "", []
+    if first_date is not None:
+        where, params = "WHERE pickup_date BETWEEN ? AND ?", [first_date, last_date]
+    columns = CELL_KEYS + sorted({column for column, _ in SKETCHES.values()})
+    names = CELL_KEYS + list(SKETCHES)
+    create_sketch_table(conn)
+    conn.execute(f"DELETE FROM {SKETCH_TABLE} {where}", params)
+    dates = [d for (d,) in conn.execute(
+        f"SELECT DISTINCT pickup_date FROM trips {where} ORDER BY 1", params)]
+    for day in dates:
+        trips = pd.read_sql(f"SELECT {', '.join(columns)} FROM trips WHERE pickup_date = ?",
+                            conn, params=[day])
+        cells = build_cells(trips)
+        cells['passenger_count'] = cells['passenger_count'].astype(object).where(
+            cells['passenger_count'].notna(), None)
+        conn.executemany(
+            f"INSERT INTO {SKETCH_TABLE} ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' * len(names))})",
+            zip(*(cells[c].tolist() for c in names)))
+    schema.set_meta(conn, 'sketches_ready', 1)
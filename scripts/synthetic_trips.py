@@ -0,0 +1,132 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import ingest
+import zones
+
+# --- Synthetic TLC-like trip files ---
+# Generates monthly yellow-taxi files with the TLC column names and roughly
+# realistic shapes: pickups/dropoffs concentrated in Manhattan and the
+# airports over the 265 lookup zones, a two-peak weekday hour profile,
+# log-normal distances and speeds, metered fares, and ~30% of trips without
+# a tip. The same seed always produces the same files.
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+BOROUGH_WEIGHTS = {
+    'Manhattan': 30.0, 'Queens': 2.0, 'Brooklyn': 1.5, 'Bronx': 0.4,
+    'Staten Island': 0.05, 'EWR': 1.0, 'Unknown': 0.3, 'N/A': 0.05,
+}
+AIRPORT_WEIGHT = 40.0
+
+# Share of pickups per hour of day (weekday; weekends shift later)
+WEEKDAY_HOURS = np.array([1.5, 0.9, 0.6, 0.4, 0.4, 0.7, 2.0, 3.6, 4.6, 4.6, 4.5, 4.7,
+                          5.0, 5.1, 5.4, 5.7, 5.8, 6.3, 6.9, 6.6, 5.8, 5.5, 4.8, 3.0])
+WEEKEND_HOURS = np.array([3.6, 3.0, 2.3, 1.6, 0.9, 0.6, 0.7, 1.2, 2.1, 3.3, 4.3, 5.0,
+                          5.4, 5.6, 5.7, 5.7, 5.8, 5.9, 6.0, 5.7, 5.3, 5.1, 4.9, 4.6])
+
+PASSENGERS = [0, 1, 2, 3, 4, 5, 6]
+PASSENGER_WEIGHTS = [0.02, 0.72, 0.14, 0.04, 0.02, 0.035, 0.025]
+
+
+def zone_weights(zone_lookup, seed=0):
+    # Borough weight x log-normal jitter, so some zones are much busier
+    rng = np.random.default_rng(seed)
+    weights = zone_lookup['Borough'].map(BOROUGH_WEIGHTS).fillna(0.1).to_numpy()
+    weights = np.where(zone_lookup['service_zone'] == 'Airports', AIRPORT_WEIGHT, weights)
+    weights = weights * rng.lognormal(0, 0.8, len(weights))
+    return zone_lookup['LocationID'].to_numpy(), weights / weights.sum()
+
+
+def generate_trips(rows, month, rng, zone_ids, zone_p):
+    first_day = pd.Timestamp(f"{month}-01")
+    days = first_day.days_in_month
+    day = rng.integers(0, days, rows)
+    weekend = ((first_day.dayofweek + day) % 7) >= 5
+    hour = np.where(weekend,
+                    rng.choice(24, rows, p=WEEKEND_HOURS / WEEKEND_HOURS.sum()),
+                    rng.choice(24, rows, p=WEEKDAY_HOURS / WEEKDAY_HOURS.sum()))
+    pickup_s = day * 86_400 + hour * 3_600 + rng.integers(0, 3_600, rows)
+
+    distance = np.clip(rng.lognormal(np.log(1.8), 0.8, rows), 0, 80).round(2)
+    distance[rng.random(rows) < 0.01] = 0.0
+    speed = np.clip(rng.lognormal(np.log(11), 0.35, rows), 2, 60)
+    duration_s = (distance / speed * 3_600 + rng.integers(60, 240, rows)).astype('int64')
+
+    fare = (3.0 + 2.5 * distance + 0.5 * duration_s / 60).round(2)
+    refunds = rng.random(rows) < 0.005
+    fare[refunds] = -fare[refunds]
+    tip = np.where(rng.random(rows) < 0.3, 0.0, fare * rng.uniform(0.1, 0.3, rows)).round(2)
+    tip = np.maximum(tip, 0)
+
+    passengers = rng.choice(PASSENGERS, rows, p=PASSENGER_WEIGHTS).astype('float64')
+    passengers[rng.random(rows) < 0.01] = np.nan
+
+    pickup = first_day + pd.to_timedelta(pickup_s, unit='s')
+    return pd.DataFrame({
+        'VendorID': rng.integers(1, 3, rows),
+        'tpep_pickup_datetime': pickup,
+        'tpep_dropoff_datetime': pickup + pd.to_timedelta(duration_s, unit='s'),
+        'passenger_count': passengers,
+        'trip_distance': distance,
+        'PULocationID': rng.choice(zone_ids, rows, p=zone_p),
+        'DOLocationID': rng.choice(zone_ids, rows, p=zone_p),
+        'fare_amount': fare,
+        'tip_amount': tip,
+        'total_amount': (fare + tip + np.sign(fare) * 4.0).round(2),
+    })
+
+
+def write_month(path, month, rows, seed=0, zone_lookup=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # Parquet when pyarrow is installed (like the TLC downloads), CSV otherwise
+    zone_lookup = zones.read_lookup() if zone_lookup is None else zone_lookup
+    zone_ids, zone_p = zone_weights(zone_lookup)
+    rng = np.random.default_rng([seed, int(month.replace('-', ''))])
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer = None
+    written = 0
+    try:
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            chunk = generate_trips(n, month, rng, zone_ids, zone_p)
+            if ingest.file_format(path) == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = writer or pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(path, mode='w' if written == 0 else 'a', header=written == 0,
+                             index=False)
+            written += n
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def month_file(raw_dir, month, fmt):
+    return os.path.join(raw_dir, f"yellow_tripdata_{month}.{fmt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic TLC yellow-taxi files")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per month")
+    parser.add_argument("--months", default="2023-01", help="YYYY-MM[:YYYY-MM]")
+    parser.add_argument("--raw-dir", default="data/raw")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    zone_lookup = zones.read_lookup()
+    for month in ingest.month_range(args.months):
+        path = write_month(month_file(args.raw_dir, month, args.format), month, args.rows,
+                           args.seed, zone_lookup)
+        print(f"✅ {path}: {args.rows:,} rows")
+
+
+if __name__ == "__main__":
+    main()
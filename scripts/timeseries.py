@@ -0,0 +1,250 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+import schema
+from zones import ZONE_SLOTS
+
+# --- Rolling series and anomaly flags per pickup zone and hour ---
+# Every (PULocationID, hour-of-day) cell is a daily series of trips, revenue
+# and fare per mile, read from the PU rollup cube. Days are folded in order
+# with O(1) work per cell and day:
+#   - a ROLLING_DAYS running sum of trips (add the new day, drop the oldest)
+#   - EWMAs of trips, revenue and fare per mile (plus an exponentially
+#     weighted variance of fare per mile)
+#   - a seasonal baseline: the same weekday and hour over the previous
+#     SEASON_WEEKS weeks
+# A cell-day is flagged 'volume' when its trips are SCORE_THRESHOLD spreads
+# away from the seasonal baseline, and 'fare' when its fare per mile is that
+# far from the EWMA. Flags land in ts_anomalies, and the EWMA state as of the
+# last folded day in ts_state, so a load that only appends days resumes from
+# there. A load touching days already folded replays the whole series.
+# Days with no trips at all (gaps in the loaded data) are skipped rather than
+# read as zero demand, and are not held in memory: the series only has the
+# days that have trips, read FOLD_DAYS at a time. A replay's memory is
+# therefore bounded whatever the span of stored dates; its time grows with
+# the number of days stored.
+
+SOURCE_TABLE = "trip_rollup_pu"  # rollups.PU_ROLLUP_TABLE
+STATE_TABLE = "ts_state"
+ANOMALY_TABLE = "ts_anomalies"
+
+HOURS = 24
+
+ROLLING_DAYS = 7
+SEASON_WEEKS = 4
+MIN_SEASON_WEEKS = 2      # weeks of history before volume is judged
+EWMA_ALPHA = 0.2
+SCORE_THRESHOLD = 4.0
+MIN_TRIPS = 20            # observed or expected trips for a volume flag
+MIN_FARE_TRIPS = 10       # trips behind a cell-day's fare per mile
+MIN_FARE_DAYS = 7         # fare per mile days folded before fares are judged
+MIN_FARE_SPREAD = 0.05    # spread floor, as a share of the fare-per-mile EWMA
+FOLD_DAYS = 92            # days with trips read and folded per pass
+
+STATE_DDL = """
+CREATE TABLE IF NOT EXISTS ts_state (
+    PULocationID INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    rolling_trips REAL,
+    seasonal_trips REAL,
+    ewma_trips REAL,
+    ewma_revenue REAL,
+    ewma_fare_per_mile REAL,
+    ewvar_fare_per_mile REAL,
+    fare_days INTEGER NOT NULL,
+    PRIMARY KEY (PULocationID, hour)
+)
+"""
+
+ANOMALY_DDL = """
+CREATE TABLE IF NOT EXISTS ts_anomalies (
+    pickup_date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    PULocationID INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    observed REAL,
+    expected REAL,
+    score REAL NOT NULL
+)
+"""
+
+STATE_COLUMNS = ['rolling_trips', 'seasonal_trips', 'ewma_trips', 'ewma_revenue',
+                 'ewma_fare_per_mile', 'ewvar_fare_per_mile', 'fare_days']
+
+
+def create_timeseries_tables(conn):
+    conn.execute(STATE_DDL)
+    conn.execute(ANOMALY_DDL)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{ANOMALY_TABLE}_date_hour_pu "
+                 f"ON {ANOMALY_TABLE} (pickup_date, hour, PULocationID)")
+
+
+def timeseries_ready(conn):
+    try:
+        return bool(schema.get_meta(conn, 'timeseries_through'))
+    except Exception:
+        return False
+
+
+# ---------------- Series ----------------
+def load_series(conn, first_date, last_date):
+    # -> (days, trips, revenue, fare_per_mile): the sorted datetime64[D] days
+    # between first_date and last_date that have trips, and (day, zone, hour)
+    # arrays over those days only
+    # Rows arrive as day offsets and flat (zone, hour) cell numbers and are
+    # summed over passenger_count with bincount: no GROUP BY sort, no date parsing
+    rows = conn.execute(f"""
+        SELECT CAST(julianday(pickup_date) - julianday(?) AS INTEGER),
+               CASE WHEN PULocationID BETWEEN 1 AND {ZONE_SLOTS - 1}
+                    THEN PULocationID ELSE 0 END * {HOURS} + hour,
+               trips, total_sum, fare_sum, distance_sum
+        FROM {SOURCE_TABLE} WHERE pickup_date BETWEEN ? AND ?
+    """, (first_date, first_date, last_date)).fetchall()
+    rows = np.nan_to_num(np.array(rows, dtype='float64').reshape(-1, 6))
+    offsets, day_index = np.unique(rows[:, 0].astype('int64'), return_inverse=True)
+    days = np.datetime64(first_date, 'D') + offsets
+    shape = (len(days), ZONE_SLOTS, HOURS)
+    cell = day_index.reshape(-1) * (ZONE_SLOTS * HOURS) + rows[:, 1].astype('int64')
+    trips, revenue, fares, distance = (
+        np.bincount(cell, weights=rows[:, i], minlength=np.prod(shape))
+        .astype('float64', copy=False).reshape(shape) for i in range(2, 6))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fare_per_mile = np.where((trips >= MIN_FARE_TRIPS) & (distance > 0),
+                                 fares / distance, np.nan)
+    return days, trips, revenue, fare_per_mile
+
+
+def empty_state():
+    state = {c: np.full((ZONE_SLOTS, HOURS), np.nan) for c in STATE_COLUMNS}
+    state['fare_days'] = np.zeros((ZONE_SLOTS, HOURS))
+    return state
+
+
+def load_state(conn):
+    state = empty_state()
+    for zone, hour, *values in conn.execute(
+            f"SELECT PULocationID, hour, {', '.join(STATE_COLUMNS)} FROM {STATE_TABLE}"):
+        for column, value in zip(STATE_COLUMNS, values):
+            state[column][zone, hour] = np.nan if value is None else value
+    return state
+
+
+def save_state(conn, state):
+    conn.execute(f"DELETE FROM {STATE_TABLE}")
+    zones, hours = np.nonzero(~np.isnan(state['ewma_trips']))
+    columns = ['PULocationID', 'hour'] + STATE_COLUMNS
+    conn.executemany(
+        f"INSERT INTO {STATE_TABLE} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})",
+        zip(zones.tolist(), hours.tolist(),
+            *([None if np.isnan(v) else v for v in state[c][zones, hours].tolist()]
+              for c in STATE_COLUMNS)))
+
+
+def _ewma(mean, x, valid):
+    # First observation seeds the average
+    return np.where(valid, np.where(np.isnan(mean), x, mean + EWMA_ALPHA * (x - mean)), mean)
+
+
+def _flags(kind, day, hit, observed, expected, score):
+    zones, hours = np.nonzero(hit)
+    keep = zones > 0
+    zones, hours = zones[keep], hours[keep]
+    return zip([str(day)] * len(zones), hours.tolist(), zones.tolist(), [kind] * len(zones),
+               observed[zones, hours].tolist(), expected[zones, hours].tolist(),
+               score[zones, hours].tolist())
+
+
+def fold(days, trips, revenue, fare_per_mile, start, state):
+    # Folds days[start:] into state (updated in place); returns the flags.
+    # days[:start] are only read as history for the rolling window and the
+    # seasonal baseline.
+    if start >= len(days):
+        return []
+    day_numbers = days.astype('int64')
+    # Index of the oldest day still in the rolling window
+    oldest = int(np.searchsorted(day_numbers, day_numbers[start] - ROLLING_DAYS + 1))
+    rolling_sum = trips[oldest:start].sum(axis=0)
+    flags = []
+    for i in range(start, len(days)):
+        while day_numbers[oldest] <= day_numbers[i] - ROLLING_DAYS:
+            rolling_sum -= trips[oldest]
+            oldest += 1
+        x = trips[i]
+        rolling_sum += x
+        rolling_days = i + 1 - oldest
+
+        # Same weekday in each of the previous SEASON_WEEKS weeks, if it has trips
+        same_weekday = day_numbers[i] - 7 * np.arange(1, SEASON_WEEKS + 1)
+        found = np.searchsorted(day_numbers, same_weekday)
+        weeks = found[day_numbers[found] == same_weekday]
+        if len(weeks) >= MIN_SEASON_WEEKS:
+            past = trips[weeks]
+            expected = past.mean(axis=0)
+            # Poisson floor: quiet cells with identical past weeks still get a spread
+            spread = np.sqrt(np.maximum(np.maximum(past.var(axis=0), expected), 1.0))
+            score = (x - expected) / spread
+            hit = (np.abs(score) >= SCORE_THRESHOLD) & (np.maximum(x, expected) >= MIN_TRIPS)
+            flags.extend(_flags('volume', days[i], hit, x, expected, score))
+            state['seasonal_trips'] = expected
+
+        fpm = fare_per_mile[i]
+        valid = ~np.isnan(fpm)
+        mean, var = state['ewma_fare_per_mile'], state['ewvar_fare_per_mile']
+        with np.errstate(invalid='ignore'):
+            spread = np.maximum(np.sqrt(var), MIN_FARE_SPREAD * np.abs(mean))
+            score = (fpm - mean) / spread
+            hit = (valid & (state['fare_days'] >= MIN_FARE_DAYS)
+                   & (np.abs(score) >= SCORE_THRESHOLD))
+        flags.extend(_flags('fare', days[i], hit, fpm, mean, score))
+
+        # Incremental exponentially weighted mean and variance
+        seeded = valid & ~np.isnan(mean)
+        diff = np.where(seeded, fpm - mean, 0.0)
+        state['ewvar_fare_per_mile'] = np.where(
+            seeded, (1 - EWMA_ALPHA) * (var + EWMA_ALPHA * diff * diff),
+            np.where(valid & np.isnan(mean), 0.0, var))
+        state['ewma_fare_per_mile'] = _ewma(mean, fpm, valid)
+        state['fare_days'] = state['fare_days'] + valid
+        state['ewma_trips'] = _ewma(state['ewma_trips'], x, True)
+        state['ewma_revenue'] = _ewma(state['ewma_revenue'], revenue[i], True)
+        state['rolling_trips'] = rolling_sum / rolling_days
+    return flags
+
+
+# ---------------- Refresh ----------------
+def refresh_timeseries(conn, first_date=None):
+    # Runs inside the rollup refresh after the PU cube is rebuilt for the
+    # dates from first_date on (None: everything). Returns the (first, last)
+    # pickup dates whose flags were rewritten, or None.
+    create_timeseries_tables(conn)
+    lo, hi = conn.execute(f"SELECT MIN(pickup_date), MAX(pickup_date) FROM {SOURCE_TABLE}").fetchone()
+    through = schema.get_meta(conn, 'timeseries_through') or None
+    replay = first_date is None or through is None or first_date <= through
+    if lo is None or replay:
+        conn.execute(f"DELETE FROM {STATE_TABLE}")
+        conn.execute(f"DELETE FROM {ANOMALY_TABLE}")
+        schema.set_meta(conn, 'timeseries_through', '')
+    if lo is None:
+        return None
+    start = lo if replay else (date.fromisoformat(through) + timedelta(days=1)).isoformat()
+    if start > hi:
+        return None
+    days = [d for (d,) in conn.execute(
+        f"SELECT DISTINCT pickup_date FROM {SOURCE_TABLE} WHERE pickup_date >= ? "
+        f"ORDER BY pickup_date", (start,))]
+    state = empty_state() if replay else load_state(conn)
+    conn.execute(f"DELETE FROM {ANOMALY_TABLE} WHERE pickup_date >= ?", (start,))
+    for i in range(0, len(days), FOLD_DAYS):
+        batch = days[i:i + FOLD_DAYS]
+        # Each pass also reads the weeks before it for the seasonal baseline
+        lookback = (date.fromisoformat(batch[0]) - timedelta(days=7 * SEASON_WEEKS)).isoformat()
+        series = load_series(conn, lookback, batch[-1])
+        first = int(np.searchsorted(series[0], np.datetime64(batch[0], 'D')))
+        conn.executemany(
+            f"INSERT INTO {ANOMALY_TABLE} (pickup_date, hour, PULocationID, kind, observed, "
+            f"expected, score) VALUES (?, ?, ?, ?, ?, ?, ?)", fold(*series, first, state))
+    save_state(conn, state)
+    schema.set_meta(conn, 'timeseries_through', hi)
+    return start, hi
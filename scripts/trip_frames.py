@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# --- Compact in-memory trip frames ---
+# Row-level frames from a trip store are downcast before they are kept
+# around (cached chart samples, EDA sessions): small integers become int8,
+# money/distance float32, epoch seconds uint32, zones categoricals of their
+# LocationIDs (names are joined per category, not per row), and day_type
+# becomes a boolean weekend flag.
+
+INT8_COLUMNS = ['hour', 'weekday', 'passenger_count']
+FLOAT32_COLUMNS = ['trip_distance', 'fare_amount', 'tip_amount', 'total_amount',
+                   'trip_duration_mins', 'speed_mph', 'fare_per_mile']
+EPOCH_COLUMNS = ['pickup_ts', 'dropoff_ts']
+ZONE_COLUMNS = ['PULocationID', 'DOLocationID']
+
+
+def _int8(series):
+    # Nullable Int8 only when there is something missing
+    if series.isna().any():
+        return series.astype('Int8')
+    return series.astype('int8')
+
+
+def compact(df):
+    out = {}
+    for column in df.columns:
+        series = df[column]
+        if column in INT8_COLUMNS:
+            out[column] = _int8(series)
+        elif column in FLOAT32_COLUMNS:
+            out[column] = series.astype('float32')
+        elif column in EPOCH_COLUMNS and not series.isna().any():
+            # Epoch seconds fit uint32 until 2106
+            out[column] = series.astype('uint32')
+        elif column in ZONE_COLUMNS:
+            out[column] = series.astype('category')
+        elif column == 'pickup_date':
+            out[column] = pd.to_datetime(series)
+        elif column == 'day_type':
+            out['is_weekend'] = series.to_numpy() == 'Weekend'
+        else:
+            out[column] = series
+    if 'weekday' in df.columns and 'day_type' not in df.columns:
+        out['is_weekend'] = df['weekday'].to_numpy() >= 5
+    return pd.DataFrame(out, index=df.index)
+
+
+def day_type(frame):
+    # Reverse of the weekend flag, for charts that still color by day type
+    return pd.Series(np.where(frame['is_weekend'], 'Weekend', 'Weekday'), index=frame.index)
+
+
+def with_zone_names(frame, zone_dim, column='PULocationID'):
+    # Renames the categories only: ~265 gathers instead of one per row
+    zones = frame[column].astype('category')
+    labels = zone_dim.name(zones.cat.categories).tolist()
+    if len(set(labels)) == len(labels):
+        zones = zones.cat.rename_categories(labels)
+    else:
+        # Duplicate names (e.g. shared "Outside of NYC") cannot be categories
+        zones = zones.map(dict(zip(zones.cat.categories, labels))).astype('category')
+    return frame.assign(**{column: zones})
+
+
+def memory_report(before, after):
+    # Deep bytes per column and per row, before and after compaction
+    b = before.memory_usage(index=False, deep=True)
+    a = after.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({'before_bytes': b, 'after_bytes': a}).fillna(0).astype('int64')
+    report.loc['TOTAL'] = report.sum()
+    rows = max(len(before), 1)
+    report['before_per_row'] = report['before_bytes'] / rows
+    report['after_per_row'] = report['after_bytes'] / rows
+    return report
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from zones import ZONE_SLOTS
+
+# --- Posting-list index over in-memory trips ---
+# Rows are kept sorted by (pickup date, PULocationID, hour), so every
+# (date, zone, hour) cell is one contiguous run of row ids and the index is
+# just the run offsets: offsets[c] .. offsets[c + 1] are the rows of cell c.
+# A sidebar filter becomes the list of cells it covers (date range x
+# selected zones x hour range); their runs are concatenated into a sorted
+# row-id array, so the work is proportional to the cells and rows that
+# match, not to the table. The minimum passenger count is checked on those
+# rows only. A date range with every zone and hour is a single run and is
+# returned as a slice, which pandas serves as a view.
+
+HOURS = 24
+
+
+class TripIndex:
+
+    def __init__(self, days, offsets, passenger_count):
+        self.days = days                        # sorted datetime64[D] of every pickup date
+        self.offsets = offsets                  # len(days) * ZONE_SLOTS * HOURS + 1
+        self.passenger_count = passenger_count  # float64, in index order
+        self.rows = int(offsets[-1])
+
+    @classmethod
+    def build(cls, pickup_date, zone, hour, passenger_count):
+        # -> (index, order): order sorts the source rows into index order
+        dates = pd.to_datetime(pickup_date).to_numpy().astype('datetime64[D]')
+        days, day_codes = np.unique(dates, return_inverse=True)
+        zones = np.nan_to_num(np.asarray(zone, dtype='float64')).astype('int64')
+        zones[(zones < 0) | (zones >= ZONE_SLOTS)] = 0
+        cells = (day_codes * ZONE_SLOTS + zones) * HOURS + np.asarray(hour, dtype='int64')
+        order = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=len(days) * ZONE_SLOTS * HOURS)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        passengers = np.asarray(passenger_count, dtype='float64')[order]
+        return cls(days, offsets, passengers), order
+
+    def _day_range(self, filters):
+        start, end = filters.get('start_date'), filters.get('end_date')
+        first = 0 if start is None else np.searchsorted(self.days, np.datetime64(start, 'D'))
+        last = (len(self.days) if end is None
+                else np.searchsorted(self.days, np.datetime64(end, 'D'), side='right'))
+        return int(first), int(last)
+
+    def select(self, filters):
+        # A slice or a sorted int64 array of row ids matching filters
+        first_day, last_day = self._day_range(filters or {})
+        if first_day >= last_day:
+            return np.empty(0, dtype='int64')
+        hour_lo, hour_hi = (filters or {}).get('hour_range', (0, HOURS - 1))
+        zone_ids = (filters or {}).get('zone_ids')
+        if zone_ids is None and (hour_lo, hour_hi) == (0, HOURS - 1):
+            cell_span = ZONE_SLOTS * HOURS
+            rows = slice(int(self.offsets[first_day * cell_span]),
+                         int(self.offsets[last_day * cell_span]))
+        else:
+            zones = (np.arange(ZONE_SLOTS) if zone_ids is None
+                     else np.array(sorted(z for z in zone_ids if 0 < z < ZONE_SLOTS), dtype='int64'))
+            cells = ((np.arange(first_day, last_day)[:, None, None] * ZONE_SLOTS
+                      + zones[None, :, None]) * HOURS
+                     + np.arange(hour_lo, hour_hi + 1)[None, None, :]).ravel()
+            rows = runs_to_ids(self.offsets[cells], self.offsets[cells + 1])
+        return self._min_passengers(rows, (filters or {}).get('min_passengers', 0))
+
+    def _min_passengers(self, rows, min_passengers):
+        if not min_passengers:
+            return rows
+        if isinstance(rows, slice):
+            keep = self.passenger_count[rows] >= min_passengers
+            return np.flatnonzero(keep) + rows.start
+        return rows[self.passenger_count[rows] >= min_passengers]
+
+    def count(self, filters):
+        rows = self.select(filters)
+        return rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+
+
+def runs_to_ids(starts, ends):
+    # Concatenated aranges [starts[i], ends[i]) without a Python loop
+    lengths = ends - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype='int64')
+    # Each run's ids are its start plus a position counter that restarts per run
+    run_first = np.cumsum(lengths) - lengths
+    return np.repeat(starts - run_first, lengths) + np.arange(total, dtype='int64')
@@ -0,0 +1,416 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import db
+import rollups
+import schema
+import sketches
+import timeseries
+
+# --- SQL query layer for the dashboard ---
+# Sidebar filters are turned into a parameterized WHERE clause and every chart
+# is answered by a GROUP BY, so only small aggregated frames come back to
+# Python. Grouped charts read the rollup cubes when they are built and fall
+# back to the full `trips` table otherwise; quantiles and histograms likewise
+# merge the per-cell sketches (sketches.py) when they exist.
+
+DB_PATH = db.DB_PATH
+
+# Derived columns are materialized by the loaders (schema v2)
+DATE_EXPR = "pickup_date"
+HOUR_EXPR = "hour"
+DAY_TYPE_EXPR = "day_type"
+DURATION_EXPR = "trip_duration_mins"
+FARE_PER_MILE_EXPR = "fare_per_mile"
+SPEED_EXPR = "speed_mph"
+PICKUP_DATETIME_EXPR = "datetime(pickup_ts, 'unixepoch')"
+DROPOFF_DATETIME_EXPR = "datetime(dropoff_ts, 'unixepoch')"
+
+# The same measures over raw trips and over a rollup cube
+RAW_MEASURES = {
+    'trips': "COUNT(*)",
+    'revenue': "SUM(total_amount)",
+    'tips': "SUM(tip_amount)",
+    'tip_pct_sum': f"SUM({rollups.TIP_PCT_EXPR})",
+    'no_tip_trips': "SUM(tip_amount = 0)",
+    'speed_sum': "SUM(speed_mph)",
+    'speed_trips': "COUNT(speed_mph)",
+}
+CUBE_MEASURES = {
+    'trips': "SUM(trips)",
+    'revenue': "SUM(total_sum)",
+    'tips': "SUM(tip_sum)",
+    'tip_pct_sum': "SUM(tip_pct_sum)",
+    'no_tip_trips': "SUM(no_tip_trips)",
+    'speed_sum': "SUM(speed_sum)",
+    'speed_trips': "SUM(speed_trips)",
+}
+
+# Raw column -> sketch column answering its quantiles / fixed-bin histogram
+QUANTILE_SKETCHES = {'fare_amount': 'fare', FARE_PER_MILE_EXPR: 'fare_per_mile'}
+HISTOGRAM_SKETCHES = {FARE_PER_MILE_EXPR: 'fare_per_mile_hist', SPEED_EXPR: 'speed_hist'}
+
+# Raw rows read for box plots when no sketches are built
+BOX_SAMPLE_ROWS = 20000
+
+
+def connect(db_path=DB_PATH):
+    # Read-only and tuned for scans; see db.py (the app uses the pool instead)
+    return db.connect_readonly(db_path)
+
+
+def make_filters(start_date, end_date, hour_range, min_passengers, zone_ids=None):
+    # zone_ids=None means "all zones" and adds no predicate at all
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'hour_range': (int(hour_range[0]), int(hour_range[1])),
+        'min_passengers': int(min_passengers),
+        'zone_ids': None if zone_ids is None else sorted(int(z) for z in zone_ids),
+    }
+
+
+def grouped_source(conn, by_dropoff=False):
+    # Smallest table that can answer a grouped query, plus its measure SQL
+    if rollups.rollups_ready(conn):
+        table = rollups.ROLLUP_TABLE if by_dropoff else rollups.PU_ROLLUP_TABLE
+        return table, CUBE_MEASURES
+    return "trips", RAW_MEASURES
+
+
+def build_where(filters):
+    clauses, params = [], []
+    # pickup_date and hour lead the composite index, so these are index seeks
+    if filters.get('start_date') is not None:
+        clauses.append("pickup_date >= ?")
+        params.append(filters['start_date'].isoformat())
+    if filters.get('end_date') is not None:
+        clauses.append("pickup_date <= ?")
+        params.append(filters['end_date'].isoformat())
+    hour_lo, hour_hi = filters.get('hour_range', (0, 23))
+    if (hour_lo, hour_hi) != (0, 23):
+        clauses.append(f"{HOUR_EXPR} BETWEEN ? AND ?")
+        params.extend([hour_lo, hour_hi])
+    if filters.get('min_passengers', 0) > 0:
+        clauses.append("passenger_count >= ?")
+        params.append(filters['min_passengers'])
+    zone_ids = filters.get('zone_ids')
+    if zone_ids is not None:
+        if zone_ids:
+            clauses.append(f"PULocationID IN ({', '.join('?' * len(zone_ids))})")
+            params.extend(zone_ids)
+        else:
+            clauses.append("0")
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+
+def _read(conn, sql, params=()):
+    return pd.read_sql(sql, conn, params=list(params))
+
+
+def _scalar(conn, sql, params=()):
+    return conn.execute(sql, list(params)).fetchone()[0]
+
+
+# ---------------- Filter domains ----------------
+def filter_domains(conn):
+    # Recorded by the loaders; databases loaded before that are scanned
+    domains = schema.read_filter_domains(conn) or schema.scan_filter_domains(conn)
+    return dict(domains,
+                min_date=pd.Timestamp(domains['min_date']).date(),
+                max_date=pd.Timestamp(domains['max_date']).date())
+
+
+# ---------------- KPIs ----------------
+def count_trips(conn, filters):
+    table, m = grouped_source(conn)
+    where, params = build_where(filters)
+    return _scalar(conn, f"SELECT COALESCE({m['trips']}, 0) FROM {table} {where}", params)
+
+
+# Sums behind the KPI row, in Kpis field order
+KPI_MEASURES = ['trips', 'revenue', 'tips', 'tip_pct_sum', 'no_tip_trips',
+                'speed_sum', 'speed_trips']
+
+
+@dataclass(frozen=True)
+class Kpis:
+    # Additive sums plus the median fare; the ratios shown on the KPI row are
+    # derived from the sums, so cube cells and raw trips agree exactly
+    total_trips: int = 0
+    total_revenue: float = 0.0
+    total_tips: float = 0.0
+    tip_pct_sum: float = 0.0
+    no_tip_trips: int = 0
+    speed_sum: float = 0.0
+    speed_trips: int = 0
+    median_fare: float = float('nan')
+
+    @property
+    def avg_tip_pct(self):
+        return self.tip_pct_sum / self.total_trips if self.total_trips else 0.0
+
+    @property
+    def no_tip_pct(self):
+        return self.no_tip_trips * 100 / self.total_trips if self.total_trips else 0.0
+
+    @property
+    def avg_speed(self):
+        return self.speed_sum / self.speed_trips if self.speed_trips else float('nan')
+
+
+def _kpis_from_sums(sums, median_fare):
+    trips, revenue, tips, tip_pct_sum, no_tip_trips, speed_sum, speed_trips = (
+        0 if s is None else s for s in sums)
+    return Kpis(int(trips), float(revenue), float(tips), float(tip_pct_sum),
+                int(no_tip_trips), float(speed_sum), int(speed_trips), median_fare)
+
+
+def kpis(conn, filters):
+    # Cubes and sketches: one aggregate over cells plus a sketch merge.
+    # Otherwise a single fused pass over trips (see fused_kpis).
+    if not (rollups.rollups_ready(conn) and sketches.sketches_ready(conn)):
+        return fused_kpis(conn, filters)
+    where, params = build_where(filters)
+    select = ", ".join(CUBE_MEASURES[name] for name in KPI_MEASURES)
+    sums = conn.execute(f"SELECT {select} FROM {rollups.PU_ROLLUP_TABLE} {where}",
+                        params).fetchone()
+    median = sketches.quantile(merged_sketch(conn, filters, QUANTILE_SKETCHES['fare_amount']), 0.5)
+    return _kpis_from_sums(sums, median)
+
+
+def fused_kpis(conn, filters):
+    # Every KPI in one scan of trips: grouping by fare (a few thousand
+    # distinct cent values) carries the sums and the exact fare distribution
+    # at once, so the median needs no second counting or sorting pass.
+    where, params = build_where(filters)
+    select = ", ".join(RAW_MEASURES[name] for name in KPI_MEASURES)
+    rows = conn.execute(f"SELECT fare_amount, {select} FROM trips {where} GROUP BY fare_amount",
+                        params).fetchall()
+    if not rows:
+        return Kpis()
+    # None (SQL NULL) becomes NaN; a group's SUM is NULL only when all its values are
+    grouped = np.array(rows, dtype='float64')
+    sums = np.nansum(grouped[:, 1:], axis=0).tolist()
+    fares, counts = grouped[:, 0], grouped[:, 1]
+    known = ~np.isnan(fares)
+    return _kpis_from_sums(sums, grouped_quantile(fares[known], counts[known], 0.5))
+
+
+def grouped_quantile(values, counts, q):
+    # Same order statistic as exact_quantile(), from (value, count) pairs
+    n = counts.sum()
+    if not n:
+        return float('nan')
+    order = np.argsort(values)
+    position = np.searchsorted(np.cumsum(counts[order]), int(q * (n - 1)), side='right')
+    return float(values[order][position])
+
+
+def quantile(conn, filters, expr, q):
+    # Sketched columns are answered within sketches.ALPHA relative error
+    if expr in QUANTILE_SKETCHES and sketches.sketches_ready(conn):
+        return sketches.quantile(merged_sketch(conn, filters, QUANTILE_SKETCHES[expr]), q)
+    return exact_quantile(conn, filters, expr, q)
+
+
+def exact_quantile(conn, filters, expr, q):
+    # Exact order statistic computed by SQLite's sorter, not in pandas
+    where, params = build_where(filters)
+    not_null = f"{expr} IS NOT NULL"
+    where = f"{where} AND {not_null}" if where else f"WHERE {not_null}"
+    n = _scalar(conn, f"SELECT COUNT(*) FROM trips {where}", params)
+    if not n:
+        return float('nan')
+    offset = int(q * (n - 1))
+    return _scalar(conn, f"SELECT {expr} FROM trips {where} ORDER BY 1 LIMIT 1 OFFSET ?",
+                   list(params) + [offset])
+
+
+def correlation(conn, filters, x_expr, y_expr):
+    where, params = build_where(filters)
+    not_null = f"{x_expr} IS NOT NULL AND {y_expr} IS NOT NULL"
+    where = f"{where} AND {not_null}" if where else f"WHERE {not_null}"
+    n, sx, sy, sxx, syy, sxy = conn.execute(f"""
+        SELECT COUNT(*), SUM(x), SUM(y), SUM(x * x), SUM(y * y), SUM(x * y)
+        FROM (SELECT {x_expr} AS x, {y_expr} AS y FROM trips {where})
+    """, params).fetchone()
+    if not n or n < 2:
+        return float('nan')
+    var_x = sxx - sx * sx / n
+    var_y = syy - sy * sy / n
+    if var_x <= 0 or var_y <= 0:
+        return float('nan')
+    return (sxy - sx * sy / n) / (var_x * var_y) ** 0.5
+
+
+# ---------------- Grouped aggregates ----------------
+def _grouped(conn, filters, select, group_by, order_by="1", limit=None, by_dropoff=False):
+    # select may reference measures as {trips}, {revenue}, ...
+    table, m = grouped_source(conn, by_dropoff)
+    where, params = build_where(filters)
+    sql = f"SELECT {select.format(**m)} FROM {table} {where} GROUP BY {group_by} ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params = list(params) + [limit]
+    return _read(conn, sql, params)
+
+
+def daily_counts(conn, filters):
+    return _grouped(conn, filters, f"{DATE_EXPR} AS trip_date, {{trips}} AS trip_count", "1")
+
+
+def hour_daytype_counts(conn, filters):
+    return _grouped(conn, filters,
+                    f"{HOUR_EXPR} AS hour, {DAY_TYPE_EXPR} AS day_type, {{trips}} AS count",
+                    "1, 2", "1, 2")
+
+
+def revenue_by_hour(conn, filters):
+    return _grouped(conn, filters, f"{HOUR_EXPR} AS hour, {{revenue}} AS total_amount", "1")
+
+
+def passenger_counts(conn, filters):
+    return _grouped(conn, filters, "passenger_count, {trips} AS trips", "1")
+
+
+def top_zones(conn, filters, column='PULocationID', limit=10):
+    return _grouped(conn, filters, f"{column} AS location_id, {{trips}} AS trip_count",
+                    "1", "2 DESC", limit, by_dropoff=(column == 'DOLocationID'))
+
+
+def avg_revenue_by_zone(conn, filters, limit=10):
+    return _grouped(conn, filters,
+                    "PULocationID AS location_id, 1.0 * {revenue} / {trips} AS avg_revenue",
+                    "1", "2 DESC", limit)
+
+
+def grouped_totals(conn, filters, dims):
+    # Trips and revenue per combination of dims (used by matrices.py)
+    cols = ", ".join(dims)
+    return _grouped(conn, filters, f"{cols}, {{trips}} AS trips, {{revenue}} AS revenue",
+                    cols, cols, by_dropoff=('DOLocationID' in dims))
+
+
+def day_type_summary(conn, filters):
+    return _grouped(conn, filters,
+                    f"{DAY_TYPE_EXPR} AS day_type, {{revenue}} AS revenue, {{trips}} AS trips", "1")
+
+
+# ---------------- Distributions ----------------
+def merged_sketch(conn, filters, name, group_by=None):
+    # Adds up the sketch of every matching cell; with group_by, one row per
+    # group value (returned alongside the sorted group values)
+    where, params = build_where(filters)
+    size = sketches.slot_count(name)
+    if group_by is None:
+        blobs = [b for (b,) in conn.execute(
+            f"SELECT {name} FROM {sketches.SKETCH_TABLE} {where}", params)]
+        return sketches.merge_blobs(blobs, size)
+    not_null = f"{group_by} IS NOT NULL"
+    where = f"{where} AND {not_null}" if where else f"WHERE {not_null}"
+    rows = conn.execute(f"SELECT {group_by}, {name} FROM {sketches.SKETCH_TABLE} {where}",
+                        params).fetchall()
+    groups, codes = np.unique([key for key, _ in rows], return_inverse=True)
+    merged = sketches.merge_blobs([blob for _, blob in rows], size, codes, max(len(groups), 1))
+    return groups.tolist(), merged
+
+
+def _box_row(counts):
+    # Quartiles plus Tukey whiskers (furthest bucket within 1.5 IQR)
+    q1, median, q3 = (sketches.quantile(counts, q) for q in (0.25, 0.5, 0.75))
+    values = sketches.slot_values(np.flatnonzero(counts))
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': inside.min(), 'upperfence': inside.max()}
+
+
+def box_stats(conn, filters, group_by, expr):
+    # Box-plot statistics per group, merged from quantile sketches when built
+    if expr in QUANTILE_SKETCHES and sketches.sketches_ready(conn):
+        groups, merged = merged_sketch(conn, filters, QUANTILE_SKETCHES[expr], group_by)
+    else:
+        sample = sample_rows(conn, filters, [group_by, expr], BOX_SAMPLE_ROWS).dropna()
+        groups, codes = np.unique(sample[group_by], return_inverse=True)
+        slots = sketches.quantile_slots(sample[expr]) + codes * sketches.QUANTILE_SLOTS
+        merged = np.bincount(slots, minlength=max(len(groups), 1) * sketches.QUANTILE_SLOTS)
+        merged = merged.reshape(-1, sketches.QUANTILE_SLOTS)
+        groups = groups.tolist()
+    rows = [dict(_box_row(counts), **{group_by: group})
+            for group, counts in zip(groups, merged) if counts.sum()]
+    return pd.DataFrame(rows, columns=[group_by, 'q1', 'median', 'q3', 'lowerfence', 'upperfence'])
+
+
+def histogram(conn, filters, expr, nbins):
+    # Sketched columns come back in their fixed bins and ignore nbins
+    if expr in HISTOGRAM_SKETCHES and sketches.sketches_ready(conn):
+        return sketches.histogram_frame(merged_sketch(conn, filters, HISTOGRAM_SKETCHES[expr]),
+                                        expr)
+    # Equal-width bins over [min, max] computed in one pass per bound
+    where, params = build_where(filters)
+    not_null = f"{expr} IS NOT NULL"
+    where = f"{where} AND {not_null}" if where else f"WHERE {not_null}"
+    lo, hi = conn.execute(f"SELECT MIN({expr}), MAX({expr}) FROM trips {where}",
+                          params).fetchone()
+    if lo is None:
+        return pd.DataFrame({'bin_start': [], 'bin_end': [], 'count': []})
+    width = (hi - lo) / nbins if hi > lo else 1.0
+    counts = _read(conn, f"""
+        SELECT MIN(CAST(({expr} - ?) / ? AS INTEGER), ? - 1) AS bin, COUNT(*) AS count
+        FROM trips {where}
+        GROUP BY 1 ORDER BY 1
+    """, [lo, width, nbins] + list(params))
+    counts['bin_start'] = lo + counts['bin'] * width
+    counts['bin_end'] = counts['bin_start'] + width
+    return counts[['bin_start', 'bin_end', 'count']]
+
+
+# ---------------- Row-level reads ----------------
+def sample_rows(conn, filters, columns, limit):
+    where, params = build_where(filters)
+    return _read(conn, f"SELECT {', '.join(columns)} FROM trips {where} LIMIT ?",
+                 list(params) + [limit])
+
+
+def fare_anomalies(conn, filters, threshold, limit=10):
+    where, params = build_where(filters)
+    above = f"{FARE_PER_MILE_EXPR} > ?"
+    where = f"{where} AND {above}" if where else f"WHERE {above}"
+    return _read(conn, f"""
+        SELECT {PICKUP_DATETIME_EXPR} AS pickup_datetime, PULocationID, trip_distance, fare_amount,
+               {FARE_PER_MILE_EXPR} AS fare_per_mile
+        FROM trips {where}
+        LIMIT ?
+    """, list(params) + [threshold, limit])
+
+
+# ---------------- Time-series anomalies ----------------
+# Flags are per (date, hour, zone) over all passengers, so the passenger
+# filter does not apply
+ANOMALY_COLUMNS = ['pickup_date', 'hour', 'PULocationID', 'kind', 'observed', 'expected', 'score']
+
+
+def anomaly_cells(conn, filters):
+    # Flagged days per (zone, hour, kind) with the strongest score
+    if not timeseries.timeseries_ready(conn):
+        return pd.DataFrame(columns=['PULocationID', 'hour', 'kind', 'days', 'max_score'])
+    where, params = build_where(dict(filters, min_passengers=0))
+    return _read(conn, f"""
+        SELECT PULocationID, hour, kind, COUNT(*) AS days, MAX(ABS(score)) AS max_score
+        FROM {timeseries.ANOMALY_TABLE} {where}
+        GROUP BY 1, 2, 3
+    """, params)
+
+
+def top_anomalies(conn, filters, limit=20):
+    if not timeseries.timeseries_ready(conn):
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    where, params = build_where(dict(filters, min_passengers=0))
+    return _read(conn, f"""
+        SELECT {', '.join(ANOMALY_COLUMNS)} FROM {timeseries.ANOMALY_TABLE} {where}
+        ORDER BY ABS(score) DESC LIMIT ?
+    """, list(params) + [limit])
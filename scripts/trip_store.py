@@ -0,0 +1,422 @@
+import copy
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import db
+import schema
+import trip_index
+import trip_queries as tq
+
+# --- Row-level trip storage backends ---
+# Aggregates always come from SQLite (trip_queries.py), but anything that
+# reads raw trip rows -- chart samples, exports, EDA scripts -- goes through
+# a store:
+#   store.scan(columns=None, filters=None, limit=None) -> DataFrame
+#   store.iter_scan(columns=None, filters=None, chunk_rows=...) -> DataFrames
+#   store.histogram2d(x, y, x_edges, y_edges, filters) -> (counts, rows)
+#   store.using(connection) -> the store reading SQLite through connection(),
+#       e.g. prefetch.Request.connection, so its scans can be interrupted
+# SqliteStore reads the trips table. ColumnarStore reads month-partitioned
+# Parquet files under db/columnar/ (written by export_columnar.py) through
+# memory-mapped files, reading only the requested columns and skipping
+# months and row groups whose pickup_date / PULocationID statistics cannot
+# match the filters. Each month's copy records the dataset version it was
+# written at; while the database has changed those months since (or added
+# months never exported), ColumnarStore warns and reads SQLite instead, so
+# samples and exports never disagree with the SQLite-backed KPIs. MemoryStore keeps every trip in RAM behind a
+# posting-list index (trip_index.py), so a filter costs time proportional to
+# the rows it matches. Choose the backend with TRIP_STORE=sqlite|columnar|memory.
+
+COLUMNAR_ROOT = "db/columnar"
+# Per month directory; pyarrow datasets skip files starting with '_'
+VERSION_FILE = "_dataset_version"
+ROW_GROUP_ROWS = 32_768
+SCAN_CHUNK_ROWS = 100_000
+
+# Computed on read in both backends
+DATETIME_COLUMNS = {
+    'pickup_datetime': ('pickup_ts', tq.PICKUP_DATETIME_EXPR),
+    'dropoff_datetime': ('dropoff_ts', tq.DROPOFF_DATETIME_EXPR),
+}
+EXPORT_COLUMNS = list(DATETIME_COLUMNS) + schema.TRIP_COLUMNS
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("The columnar trip store requires pyarrow (pip install pyarrow)") from e
+
+
+def arrow_schema():
+    import pyarrow as pa
+    types = {
+        'pickup_ts': pa.int64(), 'dropoff_ts': pa.int64(), 'pickup_date': pa.date32(),
+        'hour': pa.int8(), 'weekday': pa.int8(), 'day_type': pa.string(),
+        'passenger_count': pa.int8(), 'PULocationID': pa.int16(), 'DOLocationID': pa.int16(),
+    }
+    return pa.schema([(c, types.get(c, pa.float64())) for c in schema.TRIP_COLUMNS])
+
+
+class SqliteStore:
+    backend = 'sqlite'
+
+    def __init__(self, db_path=tq.DB_PATH, connection=None):
+        self.db_path = db_path
+        self.connection = connection or (lambda: db.read_connection(self.db_path))
+
+    def using(self, connection):
+        return SqliteStore(self.db_path, connection)
+
+    def _query(self, columns, filters, limit=None):
+        columns = columns or schema.TRIP_COLUMNS
+        select = ", ".join(f"{DATETIME_COLUMNS[c][1]} AS {c}" if c in DATETIME_COLUMNS else c
+                           for c in columns)
+        where, params = tq.build_where(filters or {})
+        sql = f"SELECT {select} FROM trips {where}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = list(params) + [limit]
+        return sql, params
+
+    def _finish(self, df):
+        for column in DATETIME_COLUMNS:
+            if column in df:
+                df[column] = pd.to_datetime(df[column])
+        if 'pickup_date' in df:
+            df['pickup_date'] = pd.to_datetime(df['pickup_date'])
+        return df
+
+    def scan(self, columns=None, filters=None, limit=None):
+        sql, params = self._query(columns, filters, limit)
+        with self.connection() as conn:
+            return self._finish(pd.read_sql(sql, conn, params=params))
+
+    def iter_scan(self, columns=None, filters=None, chunk_rows=SCAN_CHUNK_ROWS):
+        sql, params = self._query(columns, filters)
+        with self.connection() as conn:
+            for chunk in pd.read_sql(sql, conn, params=params, chunksize=chunk_rows):
+                yield self._finish(chunk)
+
+    def histogram2d(self, x, y, x_edges, y_edges, filters=None):
+        # Binned inside SQLite: only the non-empty cells come back
+        where, params = tq.build_where(filters or {})
+        not_null = f"{x} IS NOT NULL AND {y} IS NOT NULL"
+        where = f"{where} AND {not_null}" if where else f"WHERE {not_null}"
+        nx, ny = len(x_edges) - 1, len(y_edges) - 1
+        inside = f"{x} BETWEEN ? AND ? AND {y} BETWEEN ? AND ?"
+        bounds = [x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]]
+        sql = f"""
+            SELECT CASE WHEN {inside} THEN MIN(CAST(({x} - ?) / ? AS INTEGER), ?) END AS bx,
+                   CASE WHEN {inside} THEN MIN(CAST(({y} - ?) / ? AS INTEGER), ?) END AS by,
+                   COUNT(*) AS n
+            FROM trips {where}
+            GROUP BY 1, 2
+        """
+        params = (bounds + [x_edges[0], x_edges[1] - x_edges[0], nx - 1]
+                  + bounds + [y_edges[0], y_edges[1] - y_edges[0], ny - 1] + list(params))
+        with self.connection() as conn:
+            rows = pd.read_sql(sql, conn, params=params)
+        counts = np.zeros((nx, ny), dtype='int64')
+        cells = rows.dropna()
+        counts[cells['bx'].astype(int), cells['by'].astype(int)] = cells['n']
+        return counts, int(rows['n'].sum())
+
+
+class ColumnarStore:
+    backend = 'columnar'
+
+    def __init__(self, root=COLUMNAR_ROOT, db_path=tq.DB_PATH):
+        _require_pyarrow()
+        self.root = root
+        self.sqlite = SqliteStore(db_path)
+        self.checked = None
+        self.stale = []
+        self._lock = threading.Lock()
+
+    def using(self, connection):
+        # Parquet reads cannot be interrupted, but the SQLite fallback can
+        store = copy.copy(self)
+        store.sqlite = self.sqlite.using(connection)
+        return store
+
+    def months(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name.split("=", 1)[1] for name in os.listdir(self.root)
+                      if name.startswith("month="))
+
+    def month_versions(self):
+        # month -> dataset version its file was written at (None: not recorded)
+        versions = {}
+        for month in self.months():
+            try:
+                with open(os.path.join(self.root, f"month={month}", VERSION_FILE)) as f:
+                    versions[month] = int(f.read())
+            except (OSError, ValueError):
+                versions[month] = None
+        return versions
+
+    def stale_months(self, conn, versions=None):
+        # Months the database changed after their copy was written (months
+        # never exported count from the oldest copy); None when unknown
+        versions = self.month_versions() if versions is None else versions
+        if None in versions.values():
+            return None
+        current = schema.dataset_version(conn)
+        oldest = min(versions.values(), default=0)
+        stale = set()
+        for version in set(versions.values()) | {oldest}:
+            if version == current:
+                continue
+            ranges = schema.changed_ranges(conn, version)
+            if ranges is None:
+                return None
+            touched = {str(m) for first, last in ranges
+                       for m in pd.period_range(first[:7], last[:7], freq='M')}
+            stale |= {m for m in touched if versions.get(m, oldest) == version}
+        return sorted(stale)
+
+    def _fallback(self):
+        # The SQLite store while the Parquet copy lags the database, else None.
+        # Checked again whenever the database or a month's copy moves on.
+        versions = self.month_versions()
+        with db.read_connection(self.sqlite.db_path) as conn:
+            checked = (schema.dataset_version(conn), sorted(versions.items()))
+            with self._lock:
+                if checked != self.checked:
+                    self.stale = self.stale_months(conn, versions)
+                    self.checked = checked
+                    if self.stale != []:
+                        months = ", ".join(self.stale or []) or "unknown months"
+                        print(f"⚠️  The columnar copy in {self.root} is behind the database "
+                              f"({months}); reading SQLite until export_columnar.py is re-run")
+                return self.sqlite if self.stale != [] else None
+
+    def dataset(self):
+        import pyarrow.dataset as ds
+        import pyarrow.fs as pafs
+        return ds.dataset(self.root, format="parquet", partitioning="hive",
+                          filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+    def arrow_filter(self, filters):
+        # The month predicate prunes whole files before any footer is read
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        terms = []
+        if filters.get('start_date') is not None:
+            terms.append(ds.field('month') >= filters['start_date'].strftime('%Y-%m'))
+            terms.append(ds.field('pickup_date') >= pa.scalar(filters['start_date'], pa.date32()))
+        if filters.get('end_date') is not None:
+            terms.append(ds.field('month') <= filters['end_date'].strftime('%Y-%m'))
+            terms.append(ds.field('pickup_date') <= pa.scalar(filters['end_date'], pa.date32()))
+        hour_lo, hour_hi = filters.get('hour_range', (0, 23))
+        if (hour_lo, hour_hi) != (0, 23):
+            terms.append((ds.field('hour') >= hour_lo) & (ds.field('hour') <= hour_hi))
+        if filters.get('min_passengers', 0) > 0:
+            terms.append(ds.field('passenger_count') >= filters['min_passengers'])
+        if filters.get('zone_ids') is not None:
+            terms.append(ds.field('PULocationID').isin(filters['zone_ids']))
+        expression = None
+        for term in terms:
+            expression = term if expression is None else expression & term
+        return expression
+
+    def _scanner(self, columns, filters, batch_size=None):
+        # None when there is nothing to read yet
+        if not self.months():
+            return None
+        read = list(dict.fromkeys(DATETIME_COLUMNS[c][0] if c in DATETIME_COLUMNS else c
+                                  for c in columns))
+        options = {} if batch_size is None else {'batch_size': batch_size}
+        return self.dataset().scanner(columns=read, filter=self.arrow_filter(filters or {}),
+                                      **options)
+
+    def _finish(self, table, columns):
+        import pyarrow as pa
+        for column in columns:
+            if column in DATETIME_COLUMNS:
+                seconds = table.column(DATETIME_COLUMNS[column][0])
+                table = table.append_column(column, seconds.cast(pa.timestamp('s')))
+        return table.select(columns)
+
+    def _empty(self, columns):
+        import pyarrow as pa
+        fields = {**{f.name: f.type for f in arrow_schema()},
+                  **{c: pa.timestamp('s') for c in DATETIME_COLUMNS}}
+        return pa.schema([(c, fields[c]) for c in columns]).empty_table()
+
+    def scan_arrow(self, columns=None, filters=None, limit=None):
+        columns = columns or schema.TRIP_COLUMNS
+        scanner = self._scanner(columns, filters)
+        if scanner is None:
+            return self._empty(columns)
+        table = scanner.head(limit) if limit is not None else scanner.to_table()
+        return self._finish(table, columns)
+
+    def scan(self, columns=None, filters=None, limit=None):
+        fallback = self._fallback()
+        if fallback is not None:
+            return fallback.scan(columns, filters, limit)
+        # split_blocks + self_destruct keep peak RAM near one copy of the data
+        table = self.scan_arrow(columns, filters, limit)
+        return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
+    def iter_scan(self, columns=None, filters=None, chunk_rows=SCAN_CHUNK_ROWS):
+        import pyarrow as pa
+        fallback = self._fallback()
+        if fallback is not None:
+            yield from fallback.iter_scan(columns, filters, chunk_rows)
+            return
+        columns = columns or schema.TRIP_COLUMNS
+        scanner = self._scanner(columns, filters, batch_size=chunk_rows)
+        if scanner is None:
+            return
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                table = self._finish(pa.Table.from_batches([batch]), columns)
+                yield table.to_pandas(date_as_object=False)
+
+    def histogram2d(self, x, y, x_edges, y_edges, filters=None):
+        fallback = self._fallback()
+        if fallback is not None:
+            return fallback.histogram2d(x, y, x_edges, y_edges, filters)
+        counts = np.zeros((len(x_edges) - 1, len(y_edges) - 1), dtype='int64')
+        rows = 0
+        for chunk in self.iter_scan([x, y], filters):
+            chunk = chunk.dropna()
+            rows += len(chunk)
+            counts += np.histogram2d(chunk[x].to_numpy(), chunk[y].to_numpy(),
+                                     bins=[x_edges, y_edges])[0].astype('int64')
+        return counts, rows
+
+
+class MemoryStore:
+    backend = 'memory'
+
+    def __init__(self, db_path=tq.DB_PATH):
+        self.db_path = db_path
+        self.version = None
+        self.frame = None
+        self.index = None
+        self._lock = threading.Lock()
+
+    def using(self, connection):
+        # Answers from RAM; only the reload on a version change reads SQLite
+        return self
+
+    def _current(self):
+        # (frame, index), reloaded from SQLite whenever the dataset version moves
+        with db.read_connection(self.db_path) as conn:
+            version = schema.dataset_version(conn)
+        with self._lock:
+            if version != self.version:
+                self.frame, self.index = self._load()
+                self.version = version
+            return self.frame, self.index
+
+    def _load(self):
+        frame = SqliteStore(self.db_path).scan(schema.TRIP_COLUMNS)
+        index, order = trip_index.TripIndex.build(frame['pickup_date'], frame['PULocationID'],
+                                                  frame['hour'], frame['passenger_count'])
+        return frame.take(order).reset_index(drop=True), index
+
+    def _rows(self, filters, limit=None):
+        frame, index = self._current()
+        rows = index.select(filters or {})
+        if limit is not None:
+            rows = slice(rows.start, min(rows.stop, rows.start + limit)) \
+                if isinstance(rows, slice) else rows[:limit]
+        return frame, rows
+
+    def _take(self, frame, rows, columns):
+        stored = [c for c in columns if c not in DATETIME_COLUMNS]
+        stored += [DATETIME_COLUMNS[c][0] for c in columns
+                   if c in DATETIME_COLUMNS and DATETIME_COLUMNS[c][0] not in stored]
+        # A slice is a view of the stored frame; row ids gather only matches
+        out = frame.iloc[rows][stored] if isinstance(rows, slice) else frame[stored].take(rows)
+        out = out.reset_index(drop=True)
+        for column in columns:
+            if column in DATETIME_COLUMNS:
+                out[column] = pd.to_datetime(out[DATETIME_COLUMNS[column][0]], unit='s')
+        return out[columns]
+
+    def select(self, filters=None):
+        # Matching row positions in the stored frame: a slice or sorted ids
+        return self._rows(filters)[1]
+
+    def scan(self, columns=None, filters=None, limit=None):
+        frame, rows = self._rows(filters, limit)
+        return self._take(frame, rows, columns or schema.TRIP_COLUMNS)
+
+    def iter_scan(self, columns=None, filters=None, chunk_rows=SCAN_CHUNK_ROWS):
+        columns = columns or schema.TRIP_COLUMNS
+        frame, rows = self._rows(filters)
+        ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+        for start in range(0, len(ids), chunk_rows):
+            yield self._take(frame, ids[start:start + chunk_rows], columns)
+
+    def histogram2d(self, x, y, x_edges, y_edges, filters=None):
+        frame, rows = self._rows(filters)
+        xs = frame[x].to_numpy(dtype='float64')[rows]
+        ys = frame[y].to_numpy(dtype='float64')[rows]
+        keep = ~(np.isnan(xs) | np.isnan(ys))
+        counts = np.histogram2d(xs[keep], ys[keep], bins=[x_edges, y_edges])[0].astype('int64')
+        return counts, int(keep.sum())
+
+
+def open_store(backend=None, db_path=tq.DB_PATH, root=COLUMNAR_ROOT):
+    backend = backend or os.environ.get("TRIP_STORE", "sqlite")
+    if backend == "sqlite":
+        return SqliteStore(db_path)
+    if backend == "columnar":
+        return ColumnarStore(root, db_path)
+    if backend == "memory":
+        return MemoryStore(db_path)
+    raise ValueError(f"Unknown trip store backend: {backend!r} "
+                     f"(expected sqlite, columnar or memory)")
+
+
+# ---------------- Writing the columnar copy ----------------
+def sqlite_months(conn):
+    return [m for (m,) in conn.execute(
+        "SELECT DISTINCT substr(pickup_date, 1, 7) FROM trips ORDER BY 1")]
+
+
+def write_month(conn, month, root=COLUMNAR_ROOT, row_group_rows=ROW_GROUP_ROWS):
+    # Rows are written a day at a time sorted by (PULocationID, pickup_ts), so
+    # each row group covers one day and a narrow band of pickup zones. The
+    # version is read first: a load committed during the export leaves the
+    # month marked stale rather than claiming rows it may have missed.
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    target_dir = os.path.join(root, f"month={month}")
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, "trips.parquet")
+    tmp = target + ".tmp"
+    version = schema.dataset_version(conn)
+    table_schema = arrow_schema()
+    columns = ", ".join(schema.TRIP_COLUMNS)
+    days = [d for (d,) in conn.execute(
+        "SELECT DISTINCT pickup_date FROM trips WHERE pickup_date BETWEEN ? AND ? ORDER BY 1",
+        [f"{month}-01", f"{month}-31"])]
+    rows = 0
+    with pq.ParquetWriter(tmp, table_schema) as writer:
+        for day in days:
+            df = pd.read_sql(f"SELECT {columns} FROM trips WHERE pickup_date = ?", conn,
+                             params=[day])
+            df['pickup_date'] = pd.to_datetime(df['pickup_date']).dt.date
+            table = pa.Table.from_pandas(df, schema=table_schema, preserve_index=False)
+            table = table.sort_by([('PULocationID', 'ascending'), ('pickup_ts', 'ascending')])
+            writer.write_table(table, row_group_size=row_group_rows)
+            rows += len(df)
+    os.replace(tmp, target)
+    version_path = os.path.join(target_dir, VERSION_FILE)
+    with open(version_path + ".tmp", "w") as f:
+        f.write(str(version))
+    os.replace(version_path + ".tmp", version_path)
+    return rows
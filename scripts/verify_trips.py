@@ -1,7 +1,7 @@
-import sqlite3
+import db
 
-# ✅ Connect to the SQLite DB
-conn = sqlite3.connect(r"C:\Users\Ashwini\urban-mobility-dashboard\db\nyc_mobility.db")
+# ✅ Connect to the SQLite DB (read-only; path from db.DB_PATH / NYC_MOBILITY_DB)
+conn = db.connect_readonly()
 cursor = conn.cursor()
 
 # 1. Count total trips
@@ -1,5 +1,5 @@
-import sqlite3
-conn = sqlite3.connect("db/nyc_mobility.db")
+import db
+conn = db.connect_readonly()
 cursor = conn.cursor()
 cursor.execute("SELECT * FROM zones LIMIT 5")
 print(cursor.fetchall())
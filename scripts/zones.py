@@ -0,0 +1,128 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import db
+import schema
+
+# --- Zone dimension ---
+# The TLC zone lookup (LocationID -> Borough, Zone, service_zone) held as
+# arrays indexed directly by LocationID. Queries aggregate on the integer IDs
+# and results are labelled afterwards with one gather per column
+# (names[ids]), never with a DataFrame merge, and per-zone results roll up to
+# boroughs with a bincount over borough codes. The lookup is read once per
+# process from the `zones` table (filled by load_zones.py) or, when that is
+# still empty, from the CSV.
+
+LOOKUP_PATH = "data/lookup/taxi_zone_lookup.csv"
+ZONE_SLOTS = 266  # LocationIDs 1..265; slot 0 collects missing/unknown IDs
+COLUMNS = ['LocationID', 'Borough', 'Zone', 'service_zone']
+UNKNOWN = "Unknown"
+
+_dimensions = {}
+_lock = threading.Lock()
+
+
+def slots(ids):
+    # Missing or out-of-range IDs map to slot 0
+    ids = np.nan_to_num(np.asarray(ids, dtype='float64')).astype('int64')
+    return np.where((ids > 0) & (ids < ZONE_SLOTS), ids, 0)
+
+
+class ZoneDimension:
+
+    def __init__(self, lookup):
+        ids = pd.to_numeric(lookup['LocationID'], errors='coerce').to_numpy(dtype='float64')
+        inside = (ids > 0) & (ids < ZONE_SLOTS)
+        lookup, ids = lookup[inside], ids[inside].astype('int64')
+        self.ids = np.unique(ids)  # sorted LocationIDs present in the lookup
+        # Zones the lookup does not name keep their LocationID as the name
+        self.names = np.array([str(i) for i in range(ZONE_SLOTS)], dtype=object)
+        self.names[0] = UNKNOWN
+        self.boroughs = np.full(ZONE_SLOTS, UNKNOWN, dtype=object)
+        self.service_zones = np.full(ZONE_SLOTS, UNKNOWN, dtype=object)
+        for target, column in ((self.names, 'Zone'), (self.boroughs, 'Borough'),
+                               (self.service_zones, 'service_zone')):
+            if column in lookup:
+                values = lookup[column].to_numpy(dtype=object)
+                named = pd.notna(values)
+                target[ids[named]] = values[named]
+        self.borough_list, self.borough_codes = np.unique(self.boroughs.astype(str),
+                                                          return_inverse=True)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def name(self, ids):
+        return self.names[slots(ids)]
+
+    def borough(self, ids):
+        return self.boroughs[slots(ids)]
+
+    def service_zone(self, ids):
+        return self.service_zones[slots(ids)]
+
+    def ids_named(self, names, candidates):
+        # The candidate IDs whose zone name is in names
+        candidates = np.asarray(candidates, dtype='int64')
+        return candidates[np.isin(self.name(candidates), list(names))].tolist()
+
+    def borough_mask(self, boroughs):
+        # LocationID-indexed: True for zones in any of the boroughs
+        return np.isin(self.boroughs, list(boroughs))
+
+    def borough_totals(self, ids, values):
+        # Sums per-zone values into a Series indexed by borough
+        totals = np.bincount(self.borough_codes[slots(ids)],
+                             weights=np.asarray(values, dtype='float64'),
+                             minlength=len(self.borough_list))
+        return pd.Series(totals, index=self.borough_list)
+
+
+# ---------------- Loading ----------------
+def read_lookup(lookup_path=LOOKUP_PATH):
+    return pd.read_csv(lookup_path)
+
+
+def read_zone_table(conn):
+    return pd.read_sql(f"SELECT {', '.join(COLUMNS)} FROM zones ORDER BY LocationID", conn)
+
+
+def load_zone_table(conn, lookup):
+    # Replaces the zones table with the lookup; returns the rows written
+    conn.execute(schema.ZONES_DDL)
+    conn.execute("DELETE FROM zones")
+    rows = lookup[COLUMNS].dropna(subset=['LocationID']).astype(object)
+    rows = rows.where(rows.notna(), None)
+    conn.executemany(f"INSERT INTO zones ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?)",
+                     rows.itertuples(index=False, name=None))
+    return len(rows)
+
+
+def load(db_path=None, lookup_path=LOOKUP_PATH):
+    # zones table, then the CSV; with neither, an empty dimension that
+    # labels zones by ID
+    lookup = None
+    try:
+        # A short-lived connection: loaders call this next to their writer
+        conn = db.connect_readonly(db_path)
+        try:
+            lookup = read_zone_table(conn)
+        finally:
+            conn.close()
+    except Exception:
+        pass
+    if (lookup is None or lookup.empty) and os.path.exists(lookup_path):
+        lookup = read_lookup(lookup_path)
+    return ZoneDimension(lookup if lookup is not None else pd.DataFrame(columns=COLUMNS))
+
+
+def get(db_path=None, lookup_path=LOOKUP_PATH):
+    # One dimension per process (and database)
+    key = (db_path or db.DB_PATH, lookup_path)
+    with _lock:
+        if key not in _dimensions:
+            _dimensions[key] = load(db_path, lookup_path)
+        return _dimensions[key]
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import ingest  # noqa: E402
+import synthetic_trips  # noqa: E402
+import zones  # noqa: E402
+
+LOOKUP_PATH = os.path.join(ROOT, "data", "lookup", "taxi_zone_lookup.csv")
+
+
+@pytest.fixture(scope="session")
+def zone_lookup():
+    return zones.read_lookup(LOOKUP_PATH)
+
+
+@pytest.fixture
+def trip_file(tmp_path, zone_lookup):
+    # trip_file(month, rows) -> path of a synthetic TLC-style CSV for that month
+    def write(month="2024-01", rows=5_000, seed=1):
+        path = tmp_path / "raw" / f"yellow_tripdata_{month}.csv"
+        return synthetic_trips.write_month(str(path), month, rows, seed=seed,
+                                           zone_lookup=zone_lookup)
+    return write
+
+
+@pytest.fixture
+def trips_db(tmp_path, zone_lookup):
+    # A schema v2 database; trips_db.load(path, **kwargs) runs ingest.load_file
+    db_path = str(tmp_path / "trips.db")
+    zone_ids = zones.ZoneDimension(zone_lookup).ids
+
+    class TripsDb:
+        path = db_path
+
+        def load(self, path, **kwargs):
+            conn = ingest.open_for_load(db_path)
+            try:
+                return ingest.load_file(conn, path, progress=None, zone_ids=zone_ids, **kwargs)
+            finally:
+                conn.close()
+
+        def connect(self):
+            return sqlite3.connect(db_path, isolation_level=None)
+
+    return TripsDb()
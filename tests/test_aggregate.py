@@ -0,0 +1,87 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregate
+import sketches
+import trip_queries as tq
+
+MONTHS = ("2024-01", "2024-02", "2024-03")
+
+
+@pytest.fixture
+def three_months(trips_db, trip_file):
+    for i, month in enumerate(MONTHS):
+        trips_db.load(trip_file(month, rows=3_000, seed=i))
+    return trips_db
+
+
+def stored(trips_db, sql):
+    conn = trips_db.connect()
+    try:
+        return pd.read_sql(sql, conn)
+    finally:
+        conn.close()
+
+
+def test_scalar_metrics_match_sql(three_months):
+    result = aggregate.aggregate(
+        ['hour', 'passenger_count'],
+        ['count', 'sum(fare_amount)', 'mean(tip_amount)', 'min(trip_distance)',
+         'max(total_amount)'], db_path=three_months.path, workers=1)
+    expected = stored(three_months, """
+        SELECT hour, passenger_count, COUNT(*) AS count, SUM(fare_amount) AS sum_fare_amount,
+               AVG(tip_amount) AS mean_tip_amount, MIN(trip_distance) AS min_trip_distance,
+               MAX(total_amount) AS max_total_amount
+        FROM trips GROUP BY hour, passenger_count ORDER BY hour, passenger_count""")
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_quantiles_within_alpha(three_months):
+    result = aggregate.aggregate(['weekday'], ['median(fare_amount)', 'p90(fare_amount)'],
+                                 db_path=three_months.path, workers=1)
+    trips = stored(three_months, "SELECT weekday, fare_amount FROM trips")
+    for row in result.itertuples():
+        fares = trips.loc[trips['weekday'] == row.weekday, 'fare_amount'].to_numpy()
+        for q, estimate in ((0.5, row.median_fare_amount), (0.9, row.p90_fare_amount)):
+            # sketches.quantile() reports the bucket of the floor(q * (n - 1))-th value
+            exact = np.quantile(fares, q, method='lower')
+            assert abs(estimate - exact) <= sketches.ALPHA * abs(exact) + 1e-9
+
+
+def test_workers_give_the_same_result(three_months):
+    metrics = ['count', 'mean(fare_amount)', 'max(trip_distance)', 'p99(fare_per_mile)']
+    serial = aggregate.aggregate(['PULocationID'], metrics, db_path=three_months.path, workers=1)
+    parallel = aggregate.aggregate(['PULocationID'], metrics, db_path=three_months.path,
+                                   workers=3)
+    assert serial['count'].sum() == stored(three_months, "SELECT COUNT(*) AS n FROM trips")['n'][0]
+    # Partial sums are merged in the same month order, so even means match exactly
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_ungrouped_totals(three_months):
+    result = aggregate.aggregate([], ['count', 'mean(fare_amount)', 'median(fare_amount)'],
+                                 db_path=three_months.path, workers=2)
+    expected = stored(three_months, "SELECT COUNT(*) AS n, AVG(fare_amount) AS mean FROM trips")
+    assert len(result) == 1
+    assert result['count'][0] == expected['n'][0]
+    assert result['mean_fare_amount'][0] == pytest.approx(expected['mean'][0])
+    fares = stored(three_months, "SELECT fare_amount FROM trips")['fare_amount'].to_numpy()
+    exact = np.quantile(fares, 0.5, method='lower')
+    assert abs(result['median_fare_amount'][0] - exact) <= sketches.ALPHA * abs(exact) + 1e-9
+
+    outside = tq.make_filters(date(2023, 1, 1), date(2023, 1, 31), (0, 23), 0)
+    empty = aggregate.aggregate([], ['count', 'median(fare_amount)'], outside,
+                                db_path=three_months.path)
+    assert empty['count'].tolist() == [0] and np.isnan(empty['median_fare_amount'][0])
+
+
+def test_iso_string_dates(three_months):
+    filters = {'start_date': '2024-02-01', 'end_date': '2024-02-29', 'hour_range': (0, 23)}
+    result = aggregate.aggregate(['day_type'], ['count'], filters, db_path=three_months.path,
+                                 workers=1)
+    expected = stored(three_months, "SELECT COUNT(*) AS n FROM trips "
+                                    "WHERE pickup_date BETWEEN '2024-02-01' AND '2024-02-29'")
+    assert result['count'].sum() == expected['n'][0]
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+import trip_store
+
+pytest.importorskip("pyarrow")
+
+
+def count(store):
+    return len(store.scan(['fare_amount']))
+
+
+def test_stale_months_fall_back_to_sqlite(trips_db, trip_file, tmp_path):
+    root = str(tmp_path / "columnar")
+    trips_db.load(trip_file("2024-01"))
+    conn = trips_db.connect()
+    trip_store.write_month(conn, "2024-01", root)
+    store = trip_store.ColumnarStore(root, trips_db.path)
+    sqlite = trip_store.SqliteStore(trips_db.path)
+    assert store.stale_months(conn) == []
+    assert store._fallback() is None
+    assert count(store) == count(sqlite)
+
+    # A new month makes the copy lag: rows come from SQLite until it is exported
+    trips_db.load(trip_file("2024-02"))
+    assert store.stale_months(conn) == ["2024-02"]
+    assert store._fallback() is not None
+    assert count(store) == count(sqlite)
+    assert store.using(lambda: None).sqlite is not sqlite
+
+    trip_store.write_month(conn, "2024-02", root)
+    assert store.stale_months(conn) == []
+    assert store._fallback() is None
+    assert count(store) == count(sqlite)
+
+
+def test_copies_without_a_version_are_stale(trips_db, trip_file, tmp_path):
+    root = str(tmp_path / "columnar")
+    trips_db.load(trip_file("2024-01"))
+    conn = trips_db.connect()
+    trip_store.write_month(conn, "2024-01", root)
+    os.remove(os.path.join(root, "month=2024-01", trip_store.VERSION_FILE))
+    assert trip_store.ColumnarStore(root, trips_db.path).stale_months(conn) is None
@@ -0,0 +1,57 @@
+import pandas as pd
+
+import schema
+
+
+def trip_count(trips_db):
+    conn = trips_db.connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_loading_a_file_twice_inserts_nothing_new(trips_db, trip_file):
+    path = trip_file()
+    first = trips_db.load(path)
+    assert first['rows_loaded'] > 0
+    stored = trip_count(trips_db)
+
+    # The watermark skips every row before it reaches SQLite
+    again = trips_db.load(path)
+    assert again['rows_loaded'] == 0
+    assert again['dates'] == []
+    assert again['rows_skipped'] > 0
+
+    # Without it, trip keys and INSERT OR IGNORE still reject every row
+    forced = trips_db.load(path, use_watermark=False)
+    assert forced['rows_loaded'] == 0
+    assert forced['rows_duplicate'] == first['rows_loaded']
+    assert trip_count(trips_db) == stored
+
+
+def test_late_rows_are_loaded_once(trips_db, trip_file, tmp_path):
+    path = trip_file()
+    trips_db.load(path)
+    stored = trip_count(trips_db)
+
+    # A revised file: the original rows plus late records from the same month
+    original = pd.read_csv(path)
+    late = original.head(50).copy()
+    late['trip_distance'] = late['trip_distance'] + 0.01
+    revised = tmp_path / "revised" / "yellow_tripdata_2024-01.csv"
+    revised.parent.mkdir()
+    pd.concat([original, late]).to_csv(revised, index=False)
+
+    stats = trips_db.load(str(revised), use_watermark=False)
+    assert stats['rows_loaded'] == trip_count(trips_db) - stored
+    assert 0 < stats['rows_loaded'] <= len(late)
+    assert trips_db.load(str(revised), use_watermark=False)['rows_loaded'] == 0
+
+
+def test_dataset_version_records_the_loaded_dates(trips_db, trip_file):
+    stats = trips_db.load(trip_file())
+    conn = trips_db.connect()
+    version = schema.dataset_version(conn)
+    ranges = schema.changed_ranges(conn, version - 1)
+    assert ranges == [(stats['first_date'], stats['last_date'])]
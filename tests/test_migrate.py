@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+import schema
+
+V1_DDL = """
+CREATE TABLE trips (
+    trip_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pickup_datetime TEXT,
+    dropoff_datetime TEXT,
+    passenger_count INTEGER,
+    trip_distance REAL,
+    fare_amount REAL,
+    tip_amount REAL,
+    total_amount REAL,
+    PULocationID INTEGER,
+    DOLocationID INTEGER
+)
+"""
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_migration_keeps_unparsed_rows_and_counts_duplicates(tmp_path, partitioned):
+    conn = sqlite3.connect(str(tmp_path / "v1.db"), isolation_level=None)
+    conn.execute(V1_DDL)
+    trip = ('2024-01-05 08:00:00', '2024-01-05 08:20:00', 1, 3.2, 14.0, 3.0, 20.5, 161, 236)
+    rows = [trip, trip,
+            ('2024-01-05 09:00:00', '2024-01-05 09:10:00', 2, 1.1, 7.5, 0.0, 10.0, 142, 43),
+            ('not a time', '2024-01-05 09:10:00', 1, 1.0, 6.0, 1.0, 9.0, 142, 43)]
+    conn.executemany(f"INSERT INTO trips ({', '.join(schema.V1_COLUMNS)}) "
+                     f"VALUES ({', '.join('?' * len(schema.V1_COLUMNS))})", rows)
+
+    stats = schema.migrate_v1(conn, partitioned=partitioned)
+
+    assert stats == {'source_rows': 4, 'copied': 2, 'unparsed': 1, 'duplicates': 1}
+    assert conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0] == 2
+    assert conn.execute("SELECT trip_id, pickup_datetime, PULocationID "
+                        "FROM trips_v1_unparsed").fetchall() == [(4, 'not a time', 142)]
+    assert schema.schema_version(conn) == schema.SCHEMA_VERSION
@@ -0,0 +1,36 @@
+import pandas as pd
+
+import quality
+
+
+def stray_copy(path, out, pickups):
+    # The file at path with its first rows moved to the given pickup times
+    trips = pd.read_csv(path)
+    for i, pickup in enumerate(pickups):
+        trips.loc[i, 'tpep_pickup_datetime'] = pickup
+        trips.loc[i, 'tpep_dropoff_datetime'] = str(pd.Timestamp(pickup) + pd.Timedelta(minutes=12))
+    out.parent.mkdir(exist_ok=True)
+    trips.to_csv(out, index=False)
+    return str(out)
+
+
+def test_pickups_outside_the_file_month_are_quarantined(trips_db, trip_file, tmp_path):
+    path = stray_copy(trip_file(), tmp_path / "stray" / "yellow_tripdata_2024-01.csv",
+                      ["2002-12-31 23:50:00", "2088-01-04 08:00:00", "2024-02-02 10:00:00"])
+    stats = trips_db.load(path)
+    # 2024-02-02 is within PERIOD_TOLERANCE_DAYS of January
+    assert stats['last_date'] == '2024-02-02'
+    assert stats['first_date'] >= '2024-01-01'
+    conn = trips_db.connect()
+    flagged = conn.execute("SELECT pickup_date FROM trips_quarantine WHERE flags & ? ORDER BY 1",
+                           (quality.RULES['out_of_period'],)).fetchall()
+    assert flagged == [('2002-12-31',), ('2088-01-04',)]
+
+
+def test_sources_without_a_month_get_the_default_window():
+    first, last = quality.source_period("uploads/trips.csv")
+    assert pd.Timestamp(first, unit='s') < pd.Timestamp(quality.FIRST_PICKUP_DATE)
+    assert pd.Timestamp(last, unit='s') > pd.Timestamp.now()
+    first, last = quality.source_period("data/raw/yellow_tripdata_2023-03.parquet")
+    assert pd.Timestamp(first, unit='s') == pd.Timestamp("2023-02-26")
+    assert pd.Timestamp(last, unit='s') == pd.Timestamp("2023-04-04")
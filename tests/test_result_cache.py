@@ -0,0 +1,88 @@
+import threading
+from datetime import date
+
+import pandas as pd
+
+import result_cache as rc
+import trip_queries as tq
+
+
+def january(first, last):
+    return tq.make_filters(date(2024, 1, first), date(2024, 1, last), (0, 23), 0)
+
+
+def fill(cache, version, spans):
+    cache.sync_version(version)
+    for first, last in spans:
+        cache.get_or_compute('chart', [january(first, last)], lambda: f"{first}-{last}")
+
+
+def cached(cache, first, last):
+    return cache.get(('chart', rc.filter_key([january(first, last)]), cache.version))
+
+
+def test_sync_version_drops_only_entries_overlapping_the_change():
+    cache = rc.ResultCache()
+    fill(cache, 1, [(1, 5), (10, 12), (20, 31)])
+    cache.sync_version(2, changed=[('2024-01-11', '2024-01-11')])
+    assert cached(cache, 1, 5) == "1-5"
+    assert cached(cache, 10, 12) is None
+    assert cached(cache, 20, 31) == "20-31"
+
+    # Range ends count as overlapping
+    cache.sync_version(3, changed=[('2023-12-25', '2024-01-01')])
+    assert cached(cache, 1, 5) is None
+    assert cached(cache, 20, 31) == "20-31"
+
+
+def test_unbounded_change_drops_everything():
+    cache = rc.ResultCache()
+    fill(cache, 1, [(1, 5), (20, 31)])
+    cache.sync_version(2, changed=None)
+    assert cache.stats()['entries'] == 0
+
+
+def test_entries_without_dates_do_not_survive_a_change():
+    cache = rc.ResultCache()
+    cache.sync_version(1)
+    cache.get_or_compute('all', [{'hour_range': (0, 23)}], lambda: "all")
+    cache.sync_version(2, changed=[('2024-06-01', '2024-06-01')])
+    assert cache.stats()['entries'] == 0
+
+
+def test_same_filters_in_another_order_share_an_entry():
+    a = {'start_date': date(2024, 1, 1), 'end_date': date(2024, 1, 2), 'hour_range': (0, 23)}
+    b = {'hour_range': (0, 23), 'end_date': date(2024, 1, 2), 'start_date': date(2024, 1, 1)}
+    assert rc.filter_key(a) == rc.filter_key(b)
+
+
+def test_lru_eviction_keeps_the_byte_budget():
+    frame = pd.DataFrame({'x': range(1_000)})
+    size = rc.estimate_bytes(frame)
+    cache = rc.ResultCache(max_bytes=int(size * 2.5))
+    cache.sync_version(1)
+    for day in (1, 2, 3):
+        cache.get_or_compute('chart', [january(day, day)], lambda: frame)
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert cached(cache, 1, 1) is None
+
+
+def test_concurrent_misses_compute_once():
+    cache = rc.ResultCache()
+    cache.sync_version(1)
+    calls, release = [], threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    threads = [threading.Thread(target=cache.get_or_compute,
+                                args=('chart', [january(1, 2)], compute)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
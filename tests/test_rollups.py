@@ -0,0 +1,66 @@
+import queue
+
+import pandas as pd
+
+import ingest
+import quality
+import rollups
+
+MEASURES = ", ".join(rollups.MEASURES)
+
+
+def cube_rows(conn, table):
+    dims = ", ".join(rollups.DIMENSIONS if table == rollups.ROLLUP_TABLE
+                     else rollups.PU_DIMENSIONS)
+    rows = conn.execute(f"SELECT {dims}, {MEASURES} FROM {table}").fetchall()
+    # Sums are compared rounded: the same values may be added in another order
+    return sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                  for row in rows)
+
+
+def test_refresh_after_each_load_matches_a_full_build(trips_db, trip_file):
+    for month in ("2024-01", "2024-02"):
+        stats = trips_db.load(trip_file(month))
+        conn = trips_db.connect()
+        rollups.refresh_after_load(conn, stats['first_date'], stats['last_date'], stats['dates'])
+        conn.close()
+
+    conn = trips_db.connect()
+    incremental = {t: cube_rows(conn, t) for t in (rollups.ROLLUP_TABLE, rollups.PU_ROLLUP_TABLE)}
+    rollups.build_rollups(conn)
+    for table, rows in incremental.items():
+        assert rows == cube_rows(conn, table)
+
+
+def test_cube_counts_every_stored_trip(trips_db, trip_file):
+    stats = trips_db.load(trip_file())
+    conn = trips_db.connect()
+    rollups.refresh_after_load(conn, stats['first_date'], stats['last_date'], stats['dates'])
+    stored = conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+    for table in (rollups.ROLLUP_TABLE, rollups.PU_ROLLUP_TABLE):
+        assert conn.execute(f"SELECT SUM(trips) FROM {table}").fetchone()[0] == stored
+
+
+def test_parallel_ingest_refreshes_only_the_dates_it_loaded(trips_db, trip_file):
+    trips_db.load(trip_file("2024-01"))
+    conn = trips_db.connect()
+    rollups.build_rollups(conn)
+
+    # The writer gets a February file with rows on three days; the refresh
+    # covers those two runs of days, not the span from the 3rd to the 11th
+    path = trip_file("2024-02", rows=2_000)
+    trips = ingest.coerce_chunk(pd.read_csv(path))
+    trips = trips[trips['pickup_date'].isin(['2024-02-03', '2024-02-10', '2024-02-11'])]
+    clean, rejected = quality.validate(trips, period=quality.source_period(path))
+    messages = queue.Queue()
+    for message in [('start', 'feb', path, None), ('rows', 'feb', path, (clean, rejected)),
+                    ('done', 'feb', path, len(trips))]:
+        messages.put(message)
+    ingest.writer_main(messages, trips_db.path, ingest.DEFAULT_COMMIT_ROWS, expected_files=1)
+
+    assert rollups.refresh_pending(conn) == [['2024-02-03', '2024-02-03'],
+                                             ['2024-02-10', '2024-02-11']]
+    assert conn.execute("SELECT COUNT(*) FROM ingest_manifest_dates").fetchone()[0] == 0
+    incremental = cube_rows(conn, rollups.PU_ROLLUP_TABLE)
+    rollups.build_rollups(conn)
+    assert incremental == cube_rows(conn, rollups.PU_ROLLUP_TABLE)
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import rollups
+import sketches
+
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def fares(n=50_000, seed=0):
+    # Fare-like values with a few refunds; all at least MIN_VALUE in magnitude
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(np.log(15), 0.7, n) + sketches.MIN_VALUE
+    refunds = rng.random(n) < 0.01
+    values[refunds] = -values[refunds]
+    return values
+
+
+def sketch(values):
+    slots = sketches.quantile_slots(values)
+    return np.bincount(slots, minlength=sketches.QUANTILE_SLOTS)
+
+
+def assert_within_alpha(counts, values):
+    for q in QUANTILES:
+        # quantile() reports the bucket holding the floor(q * (n - 1))-th value
+        exact = np.quantile(values, q, method='lower')
+        estimate = sketches.quantile(counts, q)
+        assert abs(estimate - exact) <= sketches.ALPHA * abs(exact) + 1e-9, q
+
+
+def test_quantiles_within_alpha_of_numpy():
+    values = fares()
+    assert_within_alpha(sketch(values), values)
+
+
+def test_merged_cells_answer_like_one_sketch():
+    values = fares(seed=1)
+    rng = np.random.default_rng(2)
+    cell_ids = rng.integers(0, 40, len(values))
+    blobs = sketches.encode_cells(cell_ids, sketches.quantile_slots(values), 40,
+                                  sketches.QUANTILE_SLOTS)
+    merged = sketches.merge_blobs(blobs, sketches.QUANTILE_SLOTS)
+    np.testing.assert_array_equal(merged, sketch(values))
+
+    # Any subset of cells is within ALPHA of the exact quantiles of its trips
+    chosen = np.arange(0, 40, 3)
+    subset = sketches.merge_blobs([blobs[i] for i in chosen], sketches.QUANTILE_SLOTS)
+    assert_within_alpha(subset, values[np.isin(cell_ids, chosen)])
+
+
+def test_grouped_merge_splits_by_group():
+    values = fares(n=5_000, seed=3)
+    cell_ids = np.arange(len(values)) % 4
+    blobs = sketches.encode_cells(cell_ids, sketches.quantile_slots(values), 4,
+                                  sketches.QUANTILE_SLOTS)
+    grouped = sketches.merge_blobs(blobs, sketches.QUANTILE_SLOTS, groups=[0, 1, 0, 1],
+                                   n_groups=2)
+    np.testing.assert_array_equal(grouped[0], sketch(values[cell_ids % 2 == 0]))
+    np.testing.assert_array_equal(grouped[1], sketch(values[cell_ids % 2 == 1]))
+
+
+def test_tiny_values_and_nan():
+    slots = sketches.quantile_slots([0.0, sketches.MIN_VALUE / 2, -sketches.MIN_VALUE / 2, np.nan])
+    assert slots.tolist() == [sketches.ZERO_SLOT] * 3 + [-1]
+    assert np.isnan(sketches.quantile(np.zeros(sketches.QUANTILE_SLOTS), 0.5))
+
+
+@pytest.mark.parametrize('column', sorted(sketches.HISTOGRAM_EDGES))
+def test_histograms_are_exact_at_bin_width(column):
+    edges = sketches.HISTOGRAM_EDGES[column]
+    rng = np.random.default_rng(4)
+    values = rng.uniform(-5, edges[-1] + 5, 20_000)
+    slots = sketches.histogram_slots(values, edges)
+    counts = np.bincount(slots, minlength=len(edges) + 1)
+    frame = sketches.histogram_frame(counts, column)
+    expected = [np.count_nonzero((values >= lo) & (values < hi))
+                for lo, hi in zip(edges[:-1], edges[1:])]
+    assert frame['count'].tolist() == expected
+    assert counts[0] == np.count_nonzero(values < edges[0])
+    assert counts[-1] == np.count_nonzero(values >= edges[-1])
+
+
+def test_stored_sketches_match_the_trips(trips_db, trip_file):
+    stats = trips_db.load(trip_file())
+    conn = trips_db.connect()
+    rollups.refresh_after_load(conn, stats['first_date'], stats['last_date'], stats['dates'])
+    blobs = [b for (b,) in conn.execute(f"SELECT fare FROM {sketches.SKETCH_TABLE}")]
+    stored = np.array([f for (f,) in conn.execute("SELECT fare_amount FROM trips")], dtype='float64')
+    merged = sketches.merge_blobs(blobs, sketches.QUANTILE_SLOTS)
+    np.testing.assert_array_equal(merged, sketch(stored[~np.isnan(stored)]))
@@ -0,0 +1,127 @@
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import rollups
+import schema
+import timeseries
+
+FIRST_DAY = date(2024, 1, 1)
+DAYS = 70
+ZONES = range(100, 110)
+GAP_DAY = 30      # no trips at all that day
+SPLIT_DAY = 50    # the incremental run starts here
+VOLUME_SPIKE = (45, 101, 8)   # (day, zone, hour): three times the usual trips
+FARE_SPIKE = (60, 103, 18)    # fare per mile up 60%
+
+
+def rollup_rows(days):
+    # trip_rollup_pu rows for the given day numbers: Poisson trips, ~$5/mile
+    rng = np.random.default_rng(7)
+    base = rng.uniform(30, 80, (len(ZONES), 24))
+    rows = []
+    for day in range(DAYS):
+        noise = rng.poisson(base * (0.8 if (FIRST_DAY.weekday() + day) % 7 >= 5 else 1.0))
+        fare_noise = rng.normal(5.0, 0.05, base.shape)
+        if day not in days or day == GAP_DAY:
+            continue
+        pickup = FIRST_DAY + timedelta(days=day)
+        for z, zone in enumerate(ZONES):
+            for hour in range(24):
+                trips = int(noise[z, hour]) * (3 if (day, zone, hour) == VOLUME_SPIKE else 1)
+                fare_per_mile = fare_noise[z, hour] * (1.6 if (day, zone, hour) == FARE_SPIKE else 1)
+                distance = 2.5 * trips
+                rows.append((pickup.isoformat(), hour, zone, 1, pickup.weekday(),
+                             'Weekend' if pickup.weekday() >= 5 else 'Weekday', trips,
+                             fare_per_mile * distance, 1.2 * fare_per_mile * distance, distance))
+    return rows
+
+
+def insert(conn, days):
+    conn.executemany(
+        f"INSERT INTO {rollups.PU_ROLLUP_TABLE} (pickup_date, hour, PULocationID, passenger_count, "
+        f"weekday, day_type, trips, fare_sum, total_sum, distance_sum) "
+        f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rollup_rows(set(days)))
+
+
+def database():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute(schema.META_DDL)
+    rollups.create_rollup_tables(conn)
+    return conn
+
+
+def results(conn):
+    anomalies = sorted(
+        (day, hour, zone, kind, round(observed, 6), round(expected, 6), round(score, 6))
+        for day, hour, zone, kind, observed, expected, score in conn.execute(
+            f"SELECT pickup_date, hour, PULocationID, kind, observed, expected, score "
+            f"FROM {timeseries.ANOMALY_TABLE}"))
+    state = sorted(tuple(None if v is None else round(v, 6) for v in row) for row in conn.execute(
+        f"SELECT PULocationID, hour, {', '.join(timeseries.STATE_COLUMNS)} "
+        f"FROM {timeseries.STATE_TABLE}"))
+    return anomalies, state
+
+
+@pytest.fixture(scope="module")
+def replayed():
+    conn = database()
+    insert(conn, range(DAYS))
+    assert timeseries.refresh_timeseries(conn) == (FIRST_DAY.isoformat(),
+                                                   (FIRST_DAY + timedelta(DAYS - 1)).isoformat())
+    return results(conn)
+
+
+def test_incremental_refresh_matches_a_full_replay(replayed):
+    conn = database()
+    insert(conn, range(SPLIT_DAY))
+    timeseries.refresh_timeseries(conn)
+    insert(conn, range(SPLIT_DAY, DAYS))
+    split = (FIRST_DAY + timedelta(SPLIT_DAY)).isoformat()
+    # Only the appended days are folded, from the stored state
+    first, _ = timeseries.refresh_timeseries(conn, split)
+    assert first == split
+    assert results(conn) == replayed
+
+
+def test_refresh_of_folded_days_replays(replayed):
+    conn = database()
+    insert(conn, range(DAYS))
+    timeseries.refresh_timeseries(conn)
+    first, _ = timeseries.refresh_timeseries(conn, (FIRST_DAY + timedelta(10)).isoformat())
+    assert first == FIRST_DAY.isoformat()
+    assert results(conn) == replayed
+
+
+def test_injected_spikes_are_flagged(replayed):
+    anomalies, _ = replayed
+    flagged = {(d, z, h, kind) for d, h, z, kind, *_ in anomalies}
+    for (day, zone, hour), kind in ((VOLUME_SPIKE, 'volume'), (FARE_SPIKE, 'fare')):
+        assert ((FIRST_DAY + timedelta(day)).isoformat(), zone, hour, kind) in flagged
+    # Gap days are skipped, not read as a collapse in demand
+    gap = (FIRST_DAY + timedelta(GAP_DAY)).isoformat()
+    assert not any(d == gap for d, *_ in anomalies)
+    assert len(anomalies) < 20
+
+
+def test_folding_in_small_batches_matches(replayed, monkeypatch):
+    monkeypatch.setattr(timeseries, 'FOLD_DAYS', 9)
+    conn = database()
+    insert(conn, range(DAYS))
+    timeseries.refresh_timeseries(conn)
+    assert results(conn) == replayed
+
+
+def test_stray_dates_do_not_size_the_series():
+    conn = database()
+    insert(conn, range(DAYS))
+    conn.execute(f"INSERT INTO {rollups.PU_ROLLUP_TABLE} (pickup_date, hour, PULocationID, "
+                 f"passenger_count, weekday, day_type, trips) "
+                 f"VALUES ('1990-06-01', 3, 100, 1, 4, 'Weekday', 1)")
+    days, trips, _, _ = timeseries.load_series(conn, '1990-01-01', '2099-12-31')
+    # One array slot per day with trips, not one per calendar day
+    assert len(days) == DAYS and trips.shape[0] == DAYS
+    assert str(days[0]) == '1990-06-01' and trips[0].sum() == 1
+    assert timeseries.refresh_timeseries(conn)[0] == '1990-06-01'
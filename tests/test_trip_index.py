@@ -0,0 +1,93 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import trip_index
+import trip_queries as tq
+import trip_store
+
+
+@pytest.fixture(scope="module")
+def indexed():
+    # Random trips over ten days (with a gap), in index order
+    rng = np.random.default_rng(0)
+    n = 20_000
+    days = pd.to_datetime("2024-03-01") + pd.to_timedelta(
+        rng.choice([0, 1, 2, 3, 5, 6, 7, 8, 9], n), unit='D')
+    trips = pd.DataFrame({
+        'pickup_date': days,
+        'PULocationID': rng.integers(1, 266, n).astype('float64'),
+        'hour': rng.integers(0, 24, n),
+        'passenger_count': rng.choice([0, 1, 2, 3, 5, np.nan], n),
+    })
+    trips.loc[::500, 'PULocationID'] = np.nan
+    index, order = trip_index.TripIndex.build(trips['pickup_date'], trips['PULocationID'],
+                                              trips['hour'], trips['passenger_count'])
+    return index, trips.take(order).reset_index(drop=True)
+
+
+def mask(trips, filters):
+    # The same predicate trip_queries.build_where() gives SQLite
+    keep = np.ones(len(trips), dtype=bool)
+    if filters.get('start_date') is not None:
+        keep &= trips['pickup_date'] >= pd.Timestamp(filters['start_date'])
+    if filters.get('end_date') is not None:
+        keep &= trips['pickup_date'] <= pd.Timestamp(filters['end_date'])
+    lo, hi = filters.get('hour_range', (0, 23))
+    keep &= trips['hour'].between(lo, hi)
+    if filters.get('min_passengers'):
+        keep &= trips['passenger_count'] >= filters['min_passengers']
+    if filters.get('zone_ids') is not None:
+        keep &= trips['PULocationID'].isin(filters['zone_ids'])
+    return np.flatnonzero(keep)
+
+
+CASES = [
+    tq.make_filters(date(2024, 3, 1), date(2024, 3, 10), (0, 23), 0),
+    tq.make_filters(date(2024, 3, 2), date(2024, 3, 7), (0, 23), 0),
+    tq.make_filters(date(2024, 3, 2), date(2024, 3, 7), (0, 23), 2),
+    tq.make_filters(date(2024, 3, 1), date(2024, 3, 10), (7, 9), 0),
+    tq.make_filters(date(2024, 3, 3), date(2024, 3, 8), (22, 23), 1, [132, 138, 161]),
+    tq.make_filters(date(2024, 3, 1), date(2024, 3, 10), (0, 0), 0, [1]),
+    tq.make_filters(date(2024, 3, 5), date(2024, 3, 5), (0, 23), 0),
+    tq.make_filters(date(2024, 2, 1), date(2024, 2, 28), (0, 23), 0),
+    tq.make_filters(date(2024, 3, 1), date(2024, 3, 10), (0, 23), 0, []),
+    {},
+]
+
+
+@pytest.mark.parametrize('filters', CASES)
+def test_select_matches_a_pandas_mask(indexed, filters):
+    index, trips = indexed
+    rows = index.select(filters)
+    ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+    np.testing.assert_array_equal(ids, mask(trips, filters))
+    assert index.count(filters) == len(ids)
+
+
+def test_full_day_range_is_a_slice(indexed):
+    index, _ = indexed
+    rows = index.select(tq.make_filters(date(2024, 3, 2), date(2024, 3, 7), (0, 23), 0))
+    assert isinstance(rows, slice)
+
+
+def test_runs_to_ids():
+    starts = np.array([0, 5, 5, 9])
+    ends = np.array([2, 5, 8, 10])
+    assert trip_index.runs_to_ids(starts, ends).tolist() == [0, 1, 5, 6, 7, 9]
+    assert trip_index.runs_to_ids(starts[:0], ends[:0]).size == 0
+
+
+def test_memory_store_matches_sqlite(trips_db, trip_file):
+    trips_db.load(trip_file())
+    filters = tq.make_filters(date(2024, 1, 3), date(2024, 1, 20), (6, 18), 1, [132, 161, 237])
+    columns = ['pickup_datetime', 'PULocationID', 'hour', 'passenger_count', 'fare_amount']
+    key = ['pickup_datetime', 'PULocationID', 'fare_amount']
+    sqlite = trip_store.SqliteStore(trips_db.path).scan(columns, filters)
+    memory = trip_store.MemoryStore(trips_db.path).scan(columns, filters)
+    assert len(sqlite) > 0
+    pd.testing.assert_frame_equal(
+        sqlite.sort_values(key).reset_index(drop=True),
+        memory.sort_values(key).reset_index(drop=True), check_dtype=False)